@@ -1,19 +1,146 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from import_export.admin import ImportExportModelAdmin
 from import_export import resources
-from .models import Player, Team, Comment
+from django.views.decorators.http import require_POST
+from .imports import create_job, resume_if_stale
+from .loaders import load_comments_csv
+from .models import ImportJob, Player, Team, Comment
 
 # インポート・エクスポートのルール設定
 class PlayerResource(resources.ModelResource):
     class Meta:
         model = Player
         # CSVの列名とモデルのフィールド名を一致させる
-        fields = ('id', 'name', 'category', 'position', 'team', 'bats_throws', 'height', 'weight', 'introduction', 'scout_comment')
+        fields = ('id', 'name', 'category', 'position', 'team', 'bats_throws', 'height', 'weight', 'introduction', 'scout_comment', 'reading')
+
+class BackgroundImportForm(forms.Form):
+    csv_file = forms.FileField(label='CSVファイル', help_text='列は選手CSVと同じ（名前 + 所属が同じ選手は上書き）')
+    dry_run = forms.BooleanField(label='登録せずに差分だけを確認する', required=False, initial=True)
+
 
 @admin.register(Player)
 class PlayerAdmin(ImportExportModelAdmin):
     resource_class = PlayerResource
     list_display = ('name', 'category', 'position', 'team')  # 一覧で見やすく
+    # 大きなCSVはリクエストの中で1行ずつ取り込むと時間切れになるので、別プロセスで取り込む（imports.py）
+    change_list_template = 'admin/draft/player/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('background-import/', self.admin_site.admin_view(self.background_import_view),
+                 name='draft_player_background_import'),
+            path('import-jobs/<int:job_id>/', self.admin_site.admin_view(self.import_job_view),
+                 name='draft_player_import_job'),
+            path('import-jobs/<int:job_id>/apply/', self.admin_site.admin_view(require_POST(self.apply_import_job_view)),
+                 name='draft_player_import_job_apply'),
+        ]
+        return urls + super().get_urls()
+
+    def _context(self, request, **extra):
+        return {**self.admin_site.each_context(request), 'opts': self.model._meta, **extra}
+
+    def background_import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:draft_player_changelist')
+        form = BackgroundImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['csv_file']
+            try:
+                data = upload.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                form.add_error('csv_file', 'UTF-8 のCSVを指定してください。')
+            else:
+                job = create_job(data, filename=upload.name, dry_run=form.cleaned_data['dry_run'], owner=request.user)
+                return redirect('admin:draft_player_import_job', job_id=job.pk)
+        return TemplateResponse(request, 'admin/draft/player/background_import.html', self._context(
+            request, form=form, title='選手CSVの取り込み（バックグラウンド）',
+            jobs=ImportJob.objects.defer('data')[:10],
+        ))
+
+    def import_job_view(self, request, job_id):
+        """取り込みの進捗・行ごとのエラー・（dry run なら）差分。処理中は数秒ごとに読み直す"""
+        job = get_object_or_404(ImportJob.objects.defer('data'), pk=job_id)
+        if job.is_active and resume_if_stale(job):
+            messages.warning(request, '進捗が止まっていたので、取り込みをやり直します。')
+        return TemplateResponse(request, 'admin/draft/player/import_job.html', self._context(
+            request, job=job, title=f'取り込みジョブ {job.pk}', can_apply=self._can_apply(request),
+        ))
+
+    def _can_apply(self, request):
+        # 取り込みは選手の追加と上書きの両方をする
+        return self.has_add_permission(request) and self.has_change_permission(request)
+
+    def apply_import_job_view(self, request, job_id):
+        """dry run で確認したCSVを、そのまま本番の取り込みとして実行する"""
+        source = get_object_or_404(ImportJob, pk=job_id, dry_run=True)
+        if not self._can_apply(request):
+            messages.error(request, '選手の追加・変更の権限がありません。')
+            return redirect('admin:draft_player_import_job', job_id=source.pk)
+        if source.status != 'done':
+            messages.error(request, '差分の確認が終わっていないCSVは取り込めません。')
+            return redirect('admin:draft_player_import_job', job_id=source.pk)
+        job = create_job(source.data, filename=source.filename, owner=request.user, chunk_size=source.chunk_size)
+        return redirect('admin:draft_player_import_job', job_id=job.pk)
 
 admin.site.register(Team)
-admin.site.register(Comment)
\ No newline at end of file
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'dry_run', 'status', 'processed_rows', 'total_rows', 'rejected_count', 'created_at')
+    list_filter = ('status', 'dry_run')
+    exclude = ('data',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        # 詳細は進捗の画面で見る
+        return redirect('admin:draft_player_import_job', job_id=object_id)
+
+
+class CommentUploadForm(forms.Form):
+    csv_file = forms.FileField(label='CSVファイル', help_text='列は player_id（または name・team）と text・rank・各評価項目')
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('player', 'rank', 'created_at')
+    list_select_related = ('player',)
+    change_list_template = 'admin/draft/comment/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('bulk-upload/', self.admin_site.admin_view(self.bulk_upload_view), name='draft_comment_bulk_upload'),
+        ]
+        return urls + super().get_urls()
+
+    def bulk_upload_view(self, request):
+        """大会後などにまとめて届いたコメントのCSVを一括登録する"""
+        if not self.has_add_permission(request):
+            return redirect('admin:draft_comment_changelist')
+        form = CommentUploadForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            f = io.TextIOWrapper(form.cleaned_data['csv_file'], encoding='utf-8-sig', newline='')
+            stats = load_comments_csv(f)
+            self.message_user(request, f'{stats.created} 件のコメントを登録しました。', messages.SUCCESS)
+            for line, message in stats.errors[:20]:
+                self.message_user(request, f'{line} 行目: {message}', messages.WARNING)
+            if stats.rejected:
+                self.message_user(request, f'{stats.rejected} 行を除外しました。', messages.WARNING)
+            return redirect('admin:draft_comment_changelist')
+        return TemplateResponse(request, 'admin/draft/comment/bulk_upload.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'コメントの一括登録',
+        })
\ No newline at end of file
@@ -0,0 +1,129 @@
+# draft/adp.py
+"""選手ごとの予想指名順位（ADP）と「何巡目まで残っているか」の集計
+
+終わったドラフトの指名を、ドラフト形式ごとの PlayerADP に足し込む。
+1回の指名は（巡目, 全体順位）の組で記録し、全体順位は histogram（{全体順位: 回数}）、
+巡目は rounds（{巡目: 回数}）に数える。平均（ADP）と 10/50/90% 点もその場で計算して保存しておく。
+    ・指名画面のドラフトは、終わった時点で DraftManager が record_draft() を呼ぶ
+    ・模擬ドラフトは simulate_drafts --record-adp で record_summary() を呼ぶ
+巡目は実際に指名された巡目なので、パスした球団があっても「何巡目まで残っているか」はずれない。
+形式ごとに巡目の数も1巡あたりの指名数も違うので、別の形式の結果は混ぜない。
+過去のドラフトを読み直すことはなく、足し込むのは指名された選手の行だけ
+（指名されなかった選手は drafts を1クエリでまとめて増やす）。
+画面では保存済みの値をそのまま表示する。
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
+
+from .engine import get_format
+from .models import Player, PlayerADP
+
+PERCENTILES = {'p10': 0.1, 'p50': 0.5, 'p90': 0.9}
+
+
+def percentile_pick(histogram, picked, q):
+    """指名された回のうち、q の割合までに入る全体順位"""
+    if not picked:
+        return None
+    need = q * picked
+    total = 0
+    for pick in sorted(histogram, key=int):
+        total += histogram[pick]
+        if total >= need:
+            return int(pick)
+    return None
+
+
+def _refresh(row):
+    row.adp = row.pick_sum / row.picked if row.picked else None
+    for field, q in PERCENTILES.items():
+        setattr(row, field, percentile_pick(row.histogram, row.picked, q))
+
+
+@transaction.atomic(savepoint=False)  # 呼び出し元（DraftManager）のトランザクションにそのまま入る
+def record_drafts(draft_format, drafts, picks):
+    """draft_format の形式で drafts 回分のドラフトの結果を足し込む
+
+    picks は {player_id: {(巡目, 全体順位): 回数}}。載っていない選手は、その回は指名されなかったものとする。
+    """
+    if drafts <= 0:
+        return
+    missing = Player.objects.exclude(adp_rows__draft_format=draft_format).values_list('id', flat=True)
+    PlayerADP.objects.bulk_create(
+        [PlayerADP(player_id=p_id, draft_format=draft_format) for p_id in missing],
+        batch_size=500, ignore_conflicts=True,
+    )
+    rows = PlayerADP.objects.filter(draft_format=draft_format)
+    rows.update(drafts=F('drafts') + drafts)
+
+    rows = list(rows.select_for_update().filter(player_id__in=list(picks)))
+    for row in rows:
+        histogram = Counter({int(k): n for k, n in row.histogram.items()})
+        rounds = Counter({int(k): n for k, n in row.rounds.items()})
+        for (rnd, pick), n in picks[row.player_id].items():
+            histogram[pick] += n
+            rounds[rnd] += n
+            row.picked += n
+            row.pick_sum += pick * n
+        row.histogram = {str(k): n for k, n in sorted(histogram.items())}
+        row.rounds = {str(k): n for k, n in sorted(rounds.items())}
+        _refresh(row)
+    PlayerADP.objects.bulk_update(
+        rows, ['picked', 'pick_sum', 'histogram', 'rounds', 'adp', *PERCENTILES], batch_size=500
+    )
+
+
+def record_draft(draft):
+    """指名画面で終わったドラフト1回分を足し込む"""
+    picks = draft.picks.order_by('id').values_list('round', 'player_id')
+    record_drafts(draft.draft_format, 1, {
+        p_id: {(rnd, pick): 1} for pick, (rnd, p_id) in enumerate(picks, start=1)
+    })
+
+
+def record_summary(summary, draft_format):
+    """engine.run_drafts() の集計（DraftSummary.positions）を、形式の名前 draft_format の分として足し込む"""
+    record_drafts(draft_format, summary.drafts, summary.positions)
+
+
+def with_adp(players, draft_format):
+    """選手の QuerySet に draft_format の形式の ADP を付ける（LEFT JOIN 1つ。集計がない選手は None）"""
+    return players.alias(
+        format_adp=FilteredRelation('adp_rows', condition=Q(adp_rows__draft_format=draft_format)),
+    ).annotate(
+        adp_drafts=F('format_adp__drafts'), adp_value=F('format_adp__adp'),
+        adp_p10=F('format_adp__p10'), adp_p90=F('format_adp__p90'),
+    )
+
+
+def round_name(draft_format, rnd):
+    """巡目の表示名（育成指名の巡目は「育成N巡目」）"""
+    main_rounds = get_format(draft_format).rounds
+    return f'{rnd}巡目' if rnd <= main_rounds else f'育成{rnd - main_rounds}巡目'
+
+
+def _round_count(draft_format):
+    fmt = get_format(draft_format)
+    return fmt.rounds + fmt.development_rounds
+
+
+def availability_by_round(adp):
+    """[(巡目の表示名, その巡目が始まる時点で残っている確率), ...]（巡目の数は adp の形式のもの）"""
+    if adp is None or not adp.drafts:
+        return []
+    return [
+        (round_name(adp.draft_format, rnd), adp.available_in_round(rnd))
+        for rnd in range(1, _round_count(adp.draft_format) + 1)
+    ]
+
+
+def likely_gone_round(adp, threshold=0.5):
+    """その巡目が終わるまでに、残っている確率が threshold を下回る最初の巡目の表示名（なければ None）"""
+    if adp is None or not adp.drafts:
+        return None
+    for rnd in range(1, _round_count(adp.draft_format) + 1):
+        if adp.available_in_round(rnd + 1) < threshold:
+            return round_name(adp.draft_format, rnd)
+    return None
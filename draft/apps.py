@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DraftConfig(AppConfig):
     name = "draft"
+
+    def ready(self):
+        from . import signals  # noqa: F401  Comment の保存時に集計を更新する
@@ -0,0 +1,270 @@
+# draft/benchmark.py
+"""性能計測（manage.py benchmark から使う）
+
+generate() で規模を指定した架空のデータ（選手・コメント・球団）を作り、
+run_benchmarks() で主な画面とドラフトの処理を何回か実行して、所要時間と
+クエリ数を記録する。結果は JSON にして保存し、compare() で2つの結果
+（たとえば変更前と変更後のコミット）を比べる。
+
+データは必ず空のDBに作ること（コマンドはテスト用のDBを作ってその中で動かす）。
+"""
+import platform
+import random
+import statistics
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+
+import django
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import views
+from .engine import get_policy, load_pool, run_drafts
+from .models import Comment, Draft, Player, Team
+from .ratings import RATING_FIELDS, rebuild_ratings
+from .search import index_players
+from .simulation import DraftManager
+
+FAMILY_NAMES = ['佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '山本', '中村', '小林', '加藤']
+GIVEN_NAMES = ['翔太', '大輝', '蓮', '悠真', '陽翔', '湊', '颯太', '大和', '拓海', '隼人']
+SCHOOLS = ['高校', '大学', 'クラブ']
+TEAM_COLORS = ['#ff0000', '#0000ff', '#008000', '#ffa500', '#800080', '#000000']
+# 2巡目以降の計測で、何巡目まで進めた状態を「終盤」とするか
+LATE_ROUND = 8
+
+
+@dataclass(frozen=True)
+class Scale:
+    """架空データの規模"""
+    players: int = 2000
+    comments: int = 5  # 1選手あたり
+    teams: int = 12
+    seed: int = 0
+
+
+def generate(scale):
+    """架空の球団・選手・コメントを作り、検索索引と評価の集計まで済ませる"""
+    rng = random.Random(scale.seed)
+    Team.objects.bulk_create(
+        Team(name=f"球団{i + 1}", order=i + 1,
+             first_color=TEAM_COLORS[i % len(TEAM_COLORS)], second_color='#ffffff')
+        for i in range(scale.teams)
+    )
+    categories = [c for c, _ in Player.CATEGORY_CHOICES]
+    positions = [p for p, _ in Player.POSITION_CHOICES]
+    bats = [b for b, _ in Player.BATS_CHOICES]
+    players = Player.objects.bulk_create(
+        (
+            Player(
+                name=f"{rng.choice(FAMILY_NAMES)}{rng.choice(GIVEN_NAMES)}{i}",
+                category=rng.choice(categories),
+                position=rng.choice(positions),
+                team=f"第{i % 300 + 1}{rng.choice(SCHOOLS)}",
+                bats_throws=rng.choice(bats),
+                height=rng.randint(165, 195),
+                weight=rng.randint(60, 100),
+            )
+            for i in range(scale.players)
+        ),
+        batch_size=500,
+    )
+    # bulk_create ではシグナルが飛ばないので、索引と集計はまとめて作る
+    index_players(players)
+
+    ranks = [r for r, _ in Comment.RANK_CHOICES]
+    Comment.objects.bulk_create(
+        (
+            Comment(
+                player=player,
+                text="架空のコメント",
+                rank=rng.choice(ranks),
+                **{field: rng.choice([None, 1, 2, 3, 4, 5]) for field in RATING_FIELDS},
+            )
+            for player in players
+            for _ in range(scale.comments)
+        ),
+        batch_size=1000,
+    )
+    rebuild_ratings()
+    return players
+
+
+# --- 計測する処理 ---
+# 各ケースは setup(bench) で状態を用意し、返した関数の実行時間だけを測る
+
+class Bench:
+    """計測中に共有するもの（クライアントや作成済みの選手など）"""
+
+    def __init__(self, players):
+        self.players = players
+        self.client = Client()
+        self.factory = RequestFactory()
+        # 模擬ドラフト・自動指名用の選手プール
+        self.pool, self.pool_teams = load_pool()
+
+    def use_draft(self, draft):
+        """クライアントのセッションをこのドラフトに切り替える"""
+        session = self.client.session
+        session["draft_id"] = draft.id
+        session.save()
+        return draft
+
+    def new_draft(self, rounds=1):
+        """rounds 巡目の先頭まで進めたドラフト（1巡目は重複のない入札で進める）"""
+        manager = DraftManager.start()
+        draft = manager.draft
+        taken = set(draft.picks.values_list("player_id", flat=True))
+        candidates = (p.id for p in self.players if p.id not in taken)
+        while not draft.is_finished and draft.current_round < rounds:
+            manager.submit(next(candidates))
+        return self.use_draft(draft)
+
+
+def _get(bench, url, **params):
+    return lambda: bench.client.get(url, params)
+
+
+def case_index(bench):
+    return _get(bench, reverse("draft:index"))
+
+
+def case_index_search(bench):
+    return _get(bench, reverse("draft:index"), q="佐藤")
+
+
+def case_detail(bench):
+    return _get(bench, reverse("draft:detail", args=[bench.players[len(bench.players) // 2].id]))
+
+
+def case_simulation_play_early(bench):
+    bench.new_draft()
+    return _get(bench, reverse("draft:simulation_play"))
+
+
+def case_simulation_play_late(bench):
+    bench.new_draft(rounds=LATE_ROUND)
+    return _get(bench, reverse("draft:simulation_play"))
+
+
+def case_pick_player(bench):
+    draft = bench.new_draft(rounds=2)
+    taken = set(draft.picks.values_list("player_id", flat=True))
+    player_id = next(p.id for p in bench.players if p.id not in taken)
+    return lambda: bench.client.post(reverse("draft:pick_player"), {"player_id": player_id})
+
+
+def case_resolve_lottery(bench):
+    # 全球団が入札済みで、上位の数人に入札が集中している状態
+    t_ids = list(Team.objects.order_by("-order").values_list("id", flat=True))
+    targets = [p.id for p in bench.players[:3]]
+    bench.use_draft(Draft.objects.create(
+        team_ids=t_ids,
+        pending_teams=t_ids,
+        current_bids={str(t_id): targets[i % len(targets)] for i, t_id in enumerate(t_ids)},
+    ))
+    # resolve_lottery は URL を持たないので、ビューを直接呼ぶ
+    request = bench.factory.post("/")
+    request.session = bench.client.session
+    request.user = AnonymousUser()
+    return lambda: views.resolve_lottery(request)
+
+
+def case_simulation_result(bench):
+    draft = bench.new_draft()
+    DraftManager(draft).auto_draft(players=bench.pool, max_picks=LATE_ROUND)
+    return _get(bench, reverse("draft:simulation_result"))
+
+
+def case_engine_run_drafts(bench):
+    players, teams = bench.pool, bench.pool_teams
+    policy = get_policy("weighted")
+    return lambda: run_drafts(players, teams, 20, policy, workers=1, seed=0)
+
+
+CASES = {
+    "index": case_index,
+    "index_search": case_index_search,
+    "detail": case_detail,
+    "simulation_play_early": case_simulation_play_early,
+    "simulation_play_late": case_simulation_play_late,
+    "pick_player": case_pick_player,
+    "resolve_lottery": case_resolve_lottery,
+    "simulation_result": case_simulation_result,
+    "engine_run_drafts": case_engine_run_drafts,
+}
+
+
+def measure(bench, setup, repeat):
+    """setup してから1回実行、を repeat 回繰り返し、時間（ミリ秒）とクエリ数をまとめる
+
+    キャッシュは最初に空にするので、1回目はキャッシュなしの時間になる。
+    """
+    cache.clear()
+    times, queries = [], []
+    for _ in range(repeat):
+        run = setup(bench)
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            run()
+            times.append((time.perf_counter() - started) * 1000)
+        queries.append(len(ctx.captured_queries))
+    return {
+        "first_ms": round(times[0], 3),
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "max_ms": round(max(times), 3),
+        "queries": queries[-1],
+        "runs": repeat,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scale=Scale(), repeat=5, cases=None, players=None):
+    """ケースごとの計測結果を、環境の情報と一緒に辞書で返す
+
+    players を渡さなければ generate(scale) でデータを作る。
+    """
+    if players is None:
+        players = generate(scale)
+    bench = Bench(players)
+    results = {}
+    for name in cases or CASES:
+        results[name] = measure(bench, CASES[name], repeat)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "scale": asdict(scale),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(base, new):
+    """2つの結果を比べた行のリスト [(ケース名, 前の中央値, 後の中央値, 比, クエリ数の差), ...]"""
+    rows = []
+    for name, result in new["results"].items():
+        before = base["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else None
+        rows.append((name, before["median_ms"], result["median_ms"], ratio, result["queries"] - before["queries"]))
+    return rows
@@ -0,0 +1,171 @@
+# draft/consumers.py
+"""ドラフトルームの WebSocket（/ws/draft/<draft_id>/）
+
+Channels などは使わず、ASGI の websocket スコープをそのまま扱う（asgi.py から呼ぶ）。
+接続すると現在の状態（snapshot）を1回送り、以降はブロードキャスタから届いた
+変化分をそのまま流す。クライアントからは
+    {"action": "pick", "player_id": 123}
+    {"action": "skip"}
+を送る。操作できるのはセッションで席に着いている球団だけで、席のない接続は観戦のみ。
+エラーは送った本人にだけ返す。待機中はキューを待っているだけなので、
+つなぎっぱなしの観戦者が増えてもほとんど負荷にならない。
+"""
+import asyncio
+import json
+import logging
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .models import Draft
+from .realtime import SubscriptionClosed, draft_channel, get_broadcaster
+from .simulation import DraftError, DraftManager
+
+ROOM_PATH = re.compile(r"^/ws/draft/(?P<draft_id>\d+)/$")
+MAX_ID = 2 ** 63 - 1  # DB の整数の上限（これを超える ID は SQLite で OverflowError になる）
+
+logger = logging.getLogger(__name__)
+
+
+def seat_key(draft_id):
+    return str(draft_id)
+
+
+def _headers(scope):
+    return {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+
+
+def same_origin(headers):
+    """ブラウザからの接続は同じホストのページからのものだけ受け付ける"""
+    origin = headers.get("origin")
+    if origin is None:
+        return True
+    return urlsplit(origin).netloc == headers.get("host")
+
+
+def seat_team_id(headers, draft_id):
+    """セッション Cookie から、このドラフトで担当している球団のIDを取り出す（席がなければ None）"""
+    cookie = SimpleCookie(headers.get("cookie", ""))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    return session.get("room_seats", {}).get(seat_key(draft_id))
+
+
+def room_snapshot(draft_id):
+    draft = Draft.objects.filter(id=draft_id).first()
+    return None if draft is None else DraftManager(draft).snapshot()
+
+
+def apply_action(draft_id, team_id, payload):
+    """クライアントからの操作を実行する。変化分の配信は DraftManager がコミット後に行う"""
+    if team_id is None:
+        raise DraftError("観戦中は操作できません。")
+    action = payload.get("action")
+    if action == "pick":
+        try:
+            player_id = int(payload.get("player_id"))
+        except (TypeError, ValueError, OverflowError):  # 1e400 のような値は inf になり OverflowError
+            raise DraftError("player_id が不正です。")
+        if not 0 < player_id <= MAX_ID:
+            raise DraftError("player_id が不正です。")
+    with transaction.atomic():
+        # 同じドラフトへの操作は1件ずつ（行ロックで直列にする）
+        try:
+            draft = Draft.objects.select_for_update().get(id=draft_id)
+        except Draft.DoesNotExist:
+            raise DraftError("ドラフトが見つかりません。")
+        manager = DraftManager(draft)
+        if action == "pick":
+            return manager.submit(player_id, team_id=team_id)
+        if action == "skip":
+            return manager.skip(team_id=team_id)
+    raise DraftError("不明な操作です。")
+
+
+async def _send_json(send, data):
+    await send({"type": "websocket.send", "text": json.dumps(data, ensure_ascii=False)})
+
+
+async def _handle(send, draft_id, team_id, text):
+    try:
+        payload = json.loads(text or "")
+        if not isinstance(payload, dict):
+            raise ValueError
+    except ValueError:
+        await _send_json(send, {"event": "error", "error": "JSON の形式が不正です。"})
+        return
+    try:
+        await sync_to_async(apply_action)(draft_id, team_id, payload)
+    except DraftError as e:
+        await _send_json(send, {"event": "error", "error": str(e)})
+    except Exception:
+        # 想定外の失敗でも接続は切らず、本人にだけエラーを返す
+        logger.exception("ドラフト %s の操作を処理できませんでした", draft_id)
+        await _send_json(send, {"event": "error", "error": "操作を処理できませんでした。"})
+
+
+async def draft_room(scope, receive, send):
+    """1接続ぶんの処理"""
+    match = ROOM_PATH.match(scope["path"])
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+    headers = _headers(scope)
+    if match is None or not same_origin(headers):
+        await send({"type": "websocket.close", "code": 4403})
+        return
+    draft_id = int(match.group("draft_id"))
+    team_id = await sync_to_async(seat_team_id)(headers, draft_id)
+
+    # 先に購読してから状態を取るので、その間の変化も取りこぼさない（重複は画面側で無視する）
+    async with get_broadcaster().subscribe(draft_channel(draft_id)) as subscription:
+        snapshot = await sync_to_async(room_snapshot)(draft_id)
+        if snapshot is None:
+            await send({"type": "websocket.close", "code": 4404})
+            return
+        await send({"type": "websocket.accept"})
+        await _send_json(send, dict(snapshot, seat_team_id=team_id))
+
+        receive_task = asyncio.ensure_future(receive())
+        message_task = asyncio.ensure_future(subscription.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {receive_task, message_task}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if message_task in done:
+                    try:
+                        event = message_task.result()
+                    except SubscriptionClosed:
+                        # 受信が追いつかなかった。再接続すれば snapshot から復帰できる
+                        await send({"type": "websocket.close", "code": 4408})
+                        return
+                    # JSON への変換はイベントごとに1回だけ（全接続で共有）
+                    await send({"type": "websocket.send", "text": event.json})
+                    message_task = asyncio.ensure_future(subscription.get())
+                if receive_task in done:
+                    event = receive_task.result()
+                    if event["type"] == "websocket.disconnect":
+                        return
+                    if event["type"] == "websocket.receive":
+                        await _handle(send, draft_id, team_id, event.get("text"))
+                    receive_task = asyncio.ensure_future(receive())
+        finally:
+            receive_task.cancel()
+            message_task.cancel()
+
+
+async def websocket_application(scope, receive, send):
+    """websocket スコープの入口（パスが合わなければ接続を断る）"""
+    if ROOM_PATH.match(scope["path"]):
+        await draft_room(scope, receive, send)
+        return
+    await receive()
+    await send({"type": "websocket.close", "code": 4404})
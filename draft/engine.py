@@ -0,0 +1,521 @@
+# draft/engine.py
+"""セッションやORMに依存しない、メモリ上だけで完結するドラフト実行エンジン
+
+Webの指名画面（DraftManager）と同じルールで、1巡目の入札・抽選と
+2巡目以降の蛇行指名を最後まで自動で進める。大量の模擬ドラフトを
+プロセスプールで並列に回し、結果を集計して返す。
+"""
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from .results import ResultWriter
+
+MAX_ROUNDS = 12
+
+
+@dataclass(frozen=True)
+class PoolPlayer:
+    """シミュレーション用の軽量な選手データ"""
+    id: int
+    name: str
+    position: str = ""
+    category: str = ""
+    score: float = 0.0  # 評価値（大きいほど上位。ランク平均 S=5〜D=1 など）
+    ratings: tuple = ()  # 能力評価の平均（PlayerRating.RATING_FIELDS の順。評価がなければ None）
+
+
+@dataclass(frozen=True)
+class PoolTeam:
+    """シミュレーション用の軽量な球団データ（order は Team.order と同じ意味）"""
+    id: int
+    name: str
+    order: int = 0
+
+
+# --- 1. 指名ルール（Web版と共通の純粋関数） ---
+
+def draw_lottery(bids, rng=random):
+    """入札 {team_id: player_id} を抽選し、[(player_id, [team_ids], winner_id), ...] を返す
+
+    入札順（辞書の挿入順）を保ったまま選手ごとにまとめる。単独指名なら winner はその球団。
+    """
+    player_to_teams = {}
+    for t_id, p_id in bids.items():
+        player_to_teams.setdefault(int(p_id), []).append(int(t_id))
+
+    results = []
+    for p_id, t_ids in player_to_teams.items():
+        winner_id = rng.choice(t_ids) if len(t_ids) > 1 else t_ids[0]
+        results.append((p_id, t_ids, winner_id))
+    return results
+
+
+SNAKE = "snake"  # 巡目ごとに折り返す（12位 -> 1位、1位 -> 12位、…）
+FIXED = "fixed"  # 毎巡 12位 -> 1位
+
+
+class PickSchedule:
+    """抽選のない巡目（既定は2巡目以降の蛇行指名）の指名枠を、1回だけ組み立てたもの
+
+    slots は (巡目, 球団の位置) を指名順に並べた配列。指名を終えた球団は位置 i のビットを
+    立てたビットマスクで表し、次の指名枠と残りの指名数をループなしで求める。
+    球団の位置は Draft.team_ids の添字（0 が12位、末尾が1位）。
+    """
+
+    def __init__(self, n_teams, max_rounds=MAX_ROUNDS, first_round=2, order=SNAKE):
+        self.n_teams = n_teams
+        self.max_rounds = max_rounds
+        self.first_round = first_round
+        self.order = order
+        self.all_mask = (1 << n_teams) - 1
+        self.slots = tuple(
+            (rnd, idx)
+            for rnd in range(first_round, max_rounds + 1)
+            for idx in (range(n_teams) if self.direction(rnd) == 1 else reversed(range(n_teams)))
+        )
+
+    def direction(self, rnd):
+        """巡目ごとの進む向き（最初の巡目は 12位 -> 1位）"""
+        if self.order == FIXED:
+            return 1
+        return 1 if (rnd - self.first_round) % 2 == 0 else -1
+
+    def _after(self, rnd, idx, active):
+        """この巡目で idx より後（進む向きで）に残っている球団のビット"""
+        if self.direction(rnd) == 1:
+            return active & ~((1 << (idx + 1)) - 1)
+        return active & ((1 << idx) - 1)
+
+    def next_slot(self, rnd, idx, finished_mask):
+        """(rnd, idx) の次に指名する (巡目, 球団の位置)。もう指名枠がなければ None"""
+        active = self.all_mask & ~finished_mask
+        if not active or rnd > self.max_rounds:
+            return None
+        after = self._after(rnd, idx, active)
+        if after:
+            # 進む向きで最も近い球団（上向きなら最下位ビット、下向きなら最上位ビット）
+            return rnd, ((after & -after).bit_length() - 1 if self.direction(rnd) == 1 else after.bit_length() - 1)
+        rnd += 1
+        if rnd > self.max_rounds:
+            return None
+        # 折り返し：次の巡目は端から（端の球団は2回続けて指名する）
+        return rnd, ((active & -active).bit_length() - 1 if self.direction(rnd) == 1 else active.bit_length() - 1)
+
+    def remaining(self, rnd, idx, finished_mask, include_current=True):
+        """(rnd, idx) 以降の指名数（この後パスする球団がなければ、残りすべて）"""
+        active = self.all_mask & ~finished_mask
+        if rnd > self.max_rounds:
+            return 0
+        count = self._after(rnd, idx, active).bit_count() + (self.max_rounds - rnd) * active.bit_count()
+        if include_current and active >> idx & 1:
+            count += 1
+        return count
+
+
+@dataclass(frozen=True)
+class DraftFormat:
+    """ドラフトの形式。FORMATS に登録しておき、名前で選ぶ"""
+    label: str = ""
+    lottery_rounds: int = 1         # 1巡目から何巡目までを入札・抽選で決めるか
+    rounds: int = MAX_ROUNDS        # 本指名の最終巡目
+    order: str = SNAKE              # 抽選のない巡目の順番
+    development_rounds: int = 0     # 本指名の後の育成指名の巡目数（0 ならなし）
+    development_order: str = SNAKE
+
+
+FORMATS = {
+    "npb": DraftFormat("NPB（1巡目入札・2巡目以降ウェーバー）"),
+    "npb_development": DraftFormat("NPB＋育成指名", development_rounds=8),
+    "double_lottery": DraftFormat("1・2巡目とも入札", lottery_rounds=2, rounds=10),
+    "fixed": DraftFormat("毎巡同じ順番（折り返しなし）", rounds=10, order=FIXED),
+}
+DEFAULT_FORMAT = "npb"
+
+
+def get_format(name):
+    """名前からドラフト形式を返す"""
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError(f"不明なドラフト形式です: {name}（{', '.join(FORMATS)} から選択）")
+
+
+class CompiledFormat:
+    """球団数を決めて指名枠まで組み立てた形式（compile_format() でキャッシュして使い回す）
+
+    進行は 入札・抽選（lottery_rounds 巡） -> 本指名（main） -> 育成指名（development）。
+    Draft.phase では 1st_round / waiver / development に当たる。
+    """
+
+    def __init__(self, draft_format, n_teams):
+        self.format = draft_format
+        self.n_teams = n_teams
+        self.lottery_rounds = draft_format.lottery_rounds
+        self.main = PickSchedule(
+            n_teams, draft_format.rounds, draft_format.lottery_rounds + 1, draft_format.order
+        )
+        self.development = PickSchedule(
+            n_teams, draft_format.rounds + draft_format.development_rounds,
+            draft_format.rounds + 1, draft_format.development_order,
+        )
+
+    def stages(self):
+        """抽選のない段階を順に [(phase, schedule), ...]（指名枠のない段階は除く）"""
+        return [(phase, s) for phase, s in (("waiver", self.main), ("development", self.development)) if s.slots]
+
+    def schedule(self, phase):
+        return self.development if phase == "development" else self.main
+
+    def round_label(self, phase, rnd):
+        """画面の見出し"""
+        if phase == "1st_round":
+            return f"第{rnd}巡 選択希望選手 (入札方式)"
+        if phase == "development":
+            return f"育成 第 {rnd - self.format.rounds} 巡目 指名開始"
+        if phase == "finished":
+            return "ドラフト終了"
+        return f"第 {rnd} 巡目 指名開始"
+
+
+@lru_cache(maxsize=None)
+def compile_format(draft_format, n_teams):
+    """形式と球団数ごとに1回だけ組み立てる（DraftFormat は frozen なのでキーにできる）"""
+    return CompiledFormat(draft_format, n_teams)
+
+
+def team_mask(team_ids, finished_teams):
+    """指名を終えた球団のビットマスク（team_ids の位置 i のビット）"""
+    finished = set(finished_teams)
+    mask = 0
+    for i, t_id in enumerate(team_ids):
+        if t_id in finished:
+            mask |= 1 << i
+    return mask
+
+
+# --- 2. 指名方針（差し替え可能なポリシー） ---
+
+class PickPolicy:
+    """指名方針の基底クラス
+
+    choose() は残っている選手（評価の高い順）から1人を選んで id を返す。
+    None を返すとそのチームは指名終了（パス）になる。プロセスプールへ渡すため、
+    サブクラスはモジュールの直下に定義して pickle できるようにしておく。
+    """
+
+    def __init__(self, max_picks=None):
+        self.max_picks = max_picks
+
+    def reset(self, players):
+        """ドラフトの開始時に、選手プール全体（評価の高い順）を受け取る"""
+
+    def taken(self, player_id):
+        """いずれかの球団が選手を指名（抽選で獲得）したときに呼ばれる"""
+
+    def bid(self, team_id, available, picks, rng):
+        """1巡目の入札。1巡目はパスできないので、None なら最上位の選手に入札する"""
+        choice = self.select(team_id, available, picks, rng)
+        return choice if choice is not None else available[0].id
+
+    def choose(self, team_id, available, picks, rng):
+        """2巡目以降の指名"""
+        if self.max_picks is not None and len(picks) >= self.max_picks:
+            return None
+        return self.select(team_id, available, picks, rng)
+
+    def select(self, team_id, available, picks, rng):
+        raise NotImplementedError
+
+
+class BestAvailablePolicy(PickPolicy):
+    """常に評価が最も高い選手を指名する"""
+
+    def select(self, team_id, available, picks, rng):
+        return available[0].id
+
+
+class RandomPolicy(PickPolicy):
+    """残っている選手から一様にランダムに指名する"""
+
+    def select(self, team_id, available, picks, rng):
+        return rng.choice(available).id
+
+
+class WeightedPolicy(PickPolicy):
+    """上位 top_k 人から評価値に応じた重みでランダムに指名する（模擬ドラフトの既定）"""
+
+    def __init__(self, top_k=8, temperature=0.5, max_picks=None):
+        super().__init__(max_picks=max_picks)
+        self.top_k = top_k
+        self.temperature = temperature
+
+    def select(self, team_id, available, picks, rng):
+        candidates = available[:self.top_k]
+        best = candidates[0].score
+        # 評価差が temperature 広がるごとに選ばれにくくなる
+        weights = [2.0 ** ((p.score - best) / self.temperature) for p in candidates]
+        return rng.choices(candidates, weights=weights)[0].id
+
+
+def _auto_policy(**kwargs):
+    # NumPy を使うので、この方針を選んだときだけ読み込む
+    from .autopick import AutoPickPolicy
+    return AutoPickPolicy(**kwargs)
+
+
+POLICIES = {
+    "best": BestAvailablePolicy,
+    "random": RandomPolicy,
+    "weighted": WeightedPolicy,
+    "auto": _auto_policy,
+}
+
+
+def get_policy(name, **kwargs):
+    """名前からポリシーを生成する"""
+    try:
+        return POLICIES[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"不明な指名方針です: {name}（{', '.join(POLICIES)} から選択）")
+
+
+# --- 3. 1回分のドラフト ---
+
+@dataclass
+class DraftResult:
+    """1回分のドラフト結果"""
+    picks: dict                                   # team_id -> [player_id, ...]（指名順）
+    order: list = field(default_factory=list)     # [(round, team_id, player_id), ...] 全体の指名順
+    lotteries: list = field(default_factory=list)  # [(player_id, [team_ids], winner_id), ...]
+
+
+class DraftEngine:
+    """選手・球団リストをメモリ上に持ち、ドラフトを最後まで実行する"""
+
+    def __init__(self, players, teams, policy=None, team_policies=None, max_rounds=MAX_ROUNDS,
+                 draft_format=None):
+        # 評価の高い順（同点は名前順）に並べておくと、ポリシーは先頭から見るだけで済む
+        self.players = sorted(players, key=lambda p: (-p.score, p.name, p.id))
+        # simulation_start と同じく order の降順が指名順
+        self.team_ids = [t.id for t in sorted(teams, key=lambda t: -t.order)]
+        self.policy = policy or WeightedPolicy()
+        self.team_policies = team_policies or {}
+        # 形式の指定がなければ、NPB 形式で max_rounds 巡まで
+        self.draft_format = draft_format or DraftFormat(rounds=max_rounds)
+
+    def policy_for(self, team_id):
+        return self.team_policies.get(team_id, self.policy)
+
+    def run(self, rng=None):
+        rng = rng or random.Random()
+        team_ids = self.team_ids
+        available = list(self.players)
+        picks = {t_id: [] for t_id in team_ids}
+        result = DraftResult(picks=picks)
+        compiled = compile_format(self.draft_format, len(team_ids))
+        policies = {id(p): p for p in [self.policy, *self.team_policies.values()]}.values()
+        for policy in policies:
+            policy.reset(self.players)
+
+        def take(player_id):
+            for i, p in enumerate(available):
+                if p.id == player_id:
+                    del available[i]
+                    for policy in policies:
+                        policy.taken(player_id)
+                    return
+            raise ValueError(f"指名済み、または存在しない選手です: {player_id}")
+
+        # 入札の巡目：全チームが入札 → 抽選。外れたチームだけで再入札を繰り返す
+        for rnd in range(1, compiled.lottery_rounds + 1):
+            pending = list(team_ids)
+            while pending and available:
+                bids = {}
+                for t_id in pending:
+                    bids[t_id] = self.policy_for(t_id).bid(t_id, available, picks[t_id], rng)
+
+                pending = []
+                for p_id, t_ids, winner_id in draw_lottery(bids, rng):
+                    take(p_id)
+                    picks[winner_id].append(p_id)
+                    result.order.append((rnd, winner_id, p_id))
+                    if len(t_ids) > 1:
+                        result.lotteries.append((p_id, t_ids, winner_id))
+                    pending.extend(t_id for t_id in t_ids if t_id != winner_id)
+
+        # 抽選のない巡目（本指名 -> 育成指名）。指名終了は段階ごとにリセットする
+        for _, schedule in compiled.stages():
+            finished_mask = 0
+            slot = schedule.slots[0]
+            while slot is not None and available:
+                rnd, idx = slot
+                t_id = team_ids[idx]
+                p_id = self.policy_for(t_id).choose(t_id, available, picks[t_id], rng)
+                if p_id is None:
+                    finished_mask |= 1 << idx
+                else:
+                    take(p_id)
+                    picks[t_id].append(p_id)
+                    result.order.append((rnd, t_id, p_id))
+                slot = schedule.next_slot(rnd, idx, finished_mask)
+        return result
+
+
+# --- 4. 集計とモンテカルロ実行 ---
+
+@dataclass
+class DraftSummary:
+    """複数回のドラフト結果の集計"""
+    drafts: int = 0
+    drafted: Counter = field(default_factory=Counter)        # player_id -> 指名された回数
+    pick_sum: Counter = field(default_factory=Counter)       # player_id -> 全体指名順位の合計
+    first_round: Counter = field(default_factory=Counter)    # player_id -> 1巡目で指名された回数
+    bids_lost: Counter = field(default_factory=Counter)      # team_id -> 抽選に外れた回数
+    team_picks: dict = field(default_factory=dict)           # team_id -> Counter(player_id)
+    positions: dict = field(default_factory=dict)            # player_id -> Counter((巡目, 全体指名順位))（ADP 用）
+
+    def add(self, result):
+        self.drafts += 1
+        for overall, (rnd, t_id, p_id) in enumerate(result.order, start=1):
+            self.drafted[p_id] += 1
+            self.pick_sum[p_id] += overall
+            if rnd == 1:
+                self.first_round[p_id] += 1
+            self.team_picks.setdefault(t_id, Counter())[p_id] += 1
+            self.positions.setdefault(p_id, Counter())[rnd, overall] += 1
+        for _, t_ids, winner_id in result.lotteries:
+            self.bids_lost.update(t_id for t_id in t_ids if t_id != winner_id)
+
+    def merge(self, other):
+        self.drafts += other.drafts
+        self.drafted.update(other.drafted)
+        self.pick_sum.update(other.pick_sum)
+        self.first_round.update(other.first_round)
+        self.bids_lost.update(other.bids_lost)
+        for t_id, counter in other.team_picks.items():
+            self.team_picks.setdefault(t_id, Counter()).update(counter)
+        for p_id, counter in other.positions.items():
+            self.positions.setdefault(p_id, Counter()).update(counter)
+        return self
+
+    def player_rows(self, players=None):
+        """選手ごとの指名率・平均指名順位を、指名率の高い順に返す"""
+        names = {p.id: p.name for p in players or []}
+        rows = []
+        for p_id, count in self.drafted.items():
+            rows.append({
+                "player_id": p_id,
+                "name": names.get(p_id, ""),
+                "drafted_rate": count / self.drafts,
+                "first_round_rate": self.first_round[p_id] / self.drafts,
+                "avg_pick": self.pick_sum[p_id] / count,
+            })
+        rows.sort(key=lambda r: (-r["drafted_rate"], r["avg_pick"]))
+        return rows
+
+    def to_dict(self, players=None, teams=None):
+        team_names = {t.id: t.name for t in teams or []}
+        return {
+            "drafts": self.drafts,
+            "players": self.player_rows(players),
+            "teams": [
+                {
+                    "team_id": t_id,
+                    "name": team_names.get(t_id, ""),
+                    "lottery_losses": self.bids_lost[t_id],
+                    "top_picks": [
+                        {"player_id": p_id, "rate": n / self.drafts}
+                        for p_id, n in counter.most_common(5)
+                    ],
+                }
+                for t_id, counter in sorted(self.team_picks.items())
+            ],
+        }
+
+
+def _run_chunk(engine, count, seed, results_path=None, first_draft=0):
+    """ワーカープロセスで count 回ドラフトを行い、集計だけを返す
+
+    results_path があれば、全指名を first_draft からの番号で結果ファイルに追記する。
+    """
+    rng = random.Random(seed)
+    summary = DraftSummary()
+    writer = ResultWriter(results_path) if results_path else None
+    for i in range(count):
+        result = engine.run(rng)
+        summary.add(result)
+        if writer is not None:
+            writer.add_draft(first_draft + i, result.order)
+    if writer is not None:
+        writer.close()
+    return summary
+
+
+def run_drafts(players, teams, n, policy=None, team_policies=None, workers=None,
+               seed=None, chunk_size=250, max_rounds=MAX_ROUNDS, draft_format=None, results_path=None):
+    """n 回の模擬ドラフトを実行して DraftSummary を返す
+
+    n 回を chunk_size ごとに分けてプロセスプールに配る。各チャンクは seed と
+    チャンク番号から作った乱数で回すため、seed を固定すればワーカー数に関係なく同じ結果になる。
+    workers=1 のときはプールを使わず、このプロセスで実行する。
+    results_path を渡すと、全指名を結果ファイル（results.py）に書き出す（既存のファイルには追記）。
+    """
+    engine = DraftEngine(players, teams, policy, team_policies, max_rounds, draft_format)
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    first_draft = 0
+    if results_path:
+        # ヘッダはワーカーを起動する前にここで作っておく。ドラフト番号は n 回分をまとめて
+        # 払い出してもらい（同じファイルに同時に追記する実行とも重ならない）、チャンクごとに割り振る
+        writer = ResultWriter.create(results_path, [p.id for p in engine.players], engine.team_ids, meta={"seed": seed})
+        first_draft = writer.reserve(n)
+
+    chunks = []
+    for i, start in enumerate(range(0, n, chunk_size)):
+        chunks.append((min(chunk_size, n - start), f"{seed}:{i}", results_path, first_draft + start))
+
+    summary = DraftSummary()
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            summary.merge(_run_chunk(engine, *chunk))
+        return summary
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_chunk, engine, *chunk) for chunk in chunks]
+        for future in futures:
+            summary.merge(future.result())
+    return summary
+
+
+def load_pool():
+    """DBから選手と球団を読み込んで (players, teams) を返す（Django 設定済みの環境で使う）"""
+    from .models import Player, PlayerRating, Team
+
+    fields = ['rating__avg_rank']
+    for f in PlayerRating.RATING_FIELDS:
+        fields += [f'rating__{f}_sum', f'rating__{f}_count']
+    players = []
+    for p_id, name, position, category, avg_rank, *totals in Player.objects.values_list(
+        'id', 'name', 'position', 'category', *fields
+    ):
+        ratings = tuple(
+            float(total) / count if count else None
+            for total, count in zip(totals[::2], totals[1::2])
+        )
+        players.append(PoolPlayer(p_id, name, position, category, avg_rank or 0.0, ratings))
+    teams = [PoolTeam(t.id, t.name, t.order) for t in Team.objects.all()]
+    return players, teams
+
+
+def simulate(n=1000, policy="weighted", workers=None, seed=None, draft_format=DEFAULT_FORMAT, **policy_kwargs):
+    """DBの選手・球団で n 回の模擬ドラフトを行い、集計結果を辞書で返す"""
+    players, teams = load_pool()
+    summary = run_drafts(
+        players, teams, n, get_policy(policy, **policy_kwargs), workers=workers, seed=seed,
+        draft_format=get_format(draft_format),
+    )
+    return summary.to_dict(players, teams)
@@ -0,0 +1,168 @@
+# draft/exports.py
+"""終わったドラフトの指名・選手（集計つき）・コメントの書き出し（CSV / JSON、gzip も可）
+
+どのデータも QuerySet.iterator() でチャンクごとに読み、行を文字列にして少しずつ返すジェネレータにする。
+ファイル全体をメモリに作らないので、コメント100万件でも使うメモリは一定で、
+StreamingHttpResponse ならヘッダ行をすぐに送り始められる。
+
+    stream_export('comments', 'csv', compress=True)   ->  bytes のジェネレータ（WSGI・コマンド用）
+    astream_export('comments', 'csv', compress=True)  ->  同じものを非同期で（ASGI 用）
+
+ASGI の StreamingHttpResponse に同期のジェネレータを渡すと、Django は最後まで list() にしてから
+送るので、ASGI では必ず astream_export() を使う。
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, NullIf
+
+from .adp import with_adp
+from .engine import DEFAULT_FORMAT
+from .models import Comment, Pick, Player
+from .ratings import RATING_FIELDS, rank_label
+
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'json': 'application/json'}
+CHUNK_SIZE = 2000  # DB から1回に読む行数
+BUFFER_BYTES = 64 * 1024  # これくらい溜まったら送る
+
+
+def _draft_rows():
+    picks = Pick.objects.filter(draft__phase='finished').order_by('draft_id', 'id').values_list(
+        'draft_id', 'draft__draft_format', 'draft__updated_at', 'round', 'team_id', 'team__name',
+        'player_id', 'player__name',
+    )
+    draft_id, overall = None, 0
+    for draft, draft_format, finished_at, rnd, *rest in picks.iterator(chunk_size=CHUNK_SIZE):
+        # 全体の指名順はドラフトごとに数える（並びは Pick の id 順）
+        overall = overall + 1 if draft == draft_id else 1
+        draft_id = draft
+        yield (draft, draft_format, finished_at, overall, rnd, *rest)
+
+
+def _player_rows():
+    averages = {
+        f'avg_{field}': Cast(F(f'rating__{field}_sum'), FloatField()) / NullIf(F(f'rating__{field}_count'), 0)
+        for field in RATING_FIELDS
+    }
+    # ADP は標準の形式のもの
+    players = with_adp(Player.objects, DEFAULT_FORMAT).annotate(**averages).order_by('id').values_list(
+        'id', 'name', 'category', 'position', 'team', 'bats_throws', 'height', 'weight',
+        'rating__comment_count', 'rating__avg_rank', *averages, 'adp_drafts', 'adp_value', 'adp_p10', 'adp_p90',
+    )
+    for p_id, *values in players.iterator(chunk_size=CHUNK_SIZE):
+        avg_rank = values[8]
+        values[7] = values[7] or 0  # コメントがない選手は集計行がない
+        yield (p_id, *values[:9], rank_label(avg_rank), *values[9:])
+
+
+def _comment_rows():
+    comments = Comment.objects.order_by('id').values_list(
+        'id', 'player_id', 'player__name', 'text', 'rank', *RATING_FIELDS, 'created_at',
+    )
+    return comments.iterator(chunk_size=CHUNK_SIZE)
+
+
+# データ名 -> (列名, 行のタプルを返す関数)
+DATASETS = {
+    'drafts': (
+        ['draft_id', 'draft_format', 'finished_at', 'overall_pick', 'round', 'team_id', 'team_name',
+         'player_id', 'player_name'],
+        _draft_rows,
+    ),
+    'players': (
+        ['id', 'name', 'category', 'position', 'team', 'bats_throws', 'height', 'weight',
+         'comment_count', 'avg_rank', 'rank_label', *(f'avg_{field}' for field in RATING_FIELDS),
+         'adp_drafts', 'adp', 'adp_p10', 'adp_p90'],
+        _player_rows,
+    ),
+    'comments': (
+        ['id', 'player_id', 'player_name', 'text', 'rank', *RATING_FIELDS, 'created_at'],
+        _comment_rows,
+    ),
+}
+
+
+def _plain(value):
+    """JSON・CSV に書ける値にする"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(columns, rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def line(values):
+        writer.writerow(values)
+        text = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return text
+
+    yield line(columns)
+    for row in rows:
+        yield line([_plain(v) for v in row])
+
+
+def _json_lines(columns, rows):
+    # 配列の要素を1行に1つずつ（全体で1つの JSON の配列になる）
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def stream_export(dataset, fmt='csv', compress=False):
+    """データを書き出した bytes を少しずつ返すジェネレータ（compress なら gzip）"""
+    columns, rows = DATASETS[dataset]
+    lines = (_csv_lines if fmt == 'csv' else _json_lines)(columns, rows())
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31 で gzip 形式
+
+    def encode(text, flush=False):
+        data = text.encode('utf-8')
+        if gzip is None:
+            return data
+        data = gzip.compress(data)
+        return data + gzip.flush(zlib.Z_SYNC_FLUSH) if flush else data
+
+    # 先頭（CSV のヘッダ行・JSON の '['）はクエリを待たずにすぐ送る
+    yield encode(next(lines), flush=True)
+    buffer, size = [], 0
+    for text in lines:
+        buffer.append(text)
+        size += len(text)
+        if size >= BUFFER_BYTES:
+            if chunk := encode(''.join(buffer)):
+                yield chunk
+            buffer, size = [], 0
+    tail = encode(''.join(buffer))
+    yield tail + gzip.flush() if gzip is not None else tail
+
+
+async def astream_export(dataset, fmt='csv', compress=False):
+    """stream_export() を1チャンクずつスレッドで進める非同期ジェネレータ
+
+    thread_sensitive（既定）なので、カーソルを持つ DB 接続はリクエストの同期処理と同じスレッドのまま。
+    """
+    chunks = stream_export(dataset, fmt, compress)
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # 途中で切断されたときも、カーソルを開いたスレッドで閉じる
+        await sync_to_async(chunks.close)()
+
+
+def export_filename(dataset, fmt='csv', compress=False):
+    return f'{dataset}.{fmt}' + ('.gz' if compress else '')
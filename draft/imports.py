@@ -0,0 +1,165 @@
+# draft/imports.py
+"""管理画面からの選手CSVの取り込みを、リクエストの外（別プロセス）で進める
+
+    1. 管理画面がアップロードを ImportJob に保存する（create_job）
+    2. run_import_jobs コマンドのプロセスがジョブを1件ずつ取り出し（claim_job）、
+       loaders.load_players() でチャンクごとに1トランザクションで取り込む（run_job）
+    3. 進捗と行ごとのエラーはチャンクごとに ImportJob に書くので、状況画面はそれを読むだけ
+
+進捗を書くたびに heartbeat_at も進める。ワーカーが落ちて settings.DRAFT_IMPORT_STALE_SECONDS
+の間更新されなかった「処理中」のジョブは、claim_job() が待機中のジョブと同じように取り直す
+（MAX_ATTEMPTS 回取り直しても終わらなければ失敗にする）。
+
+settings.DRAFT_IMPORT_SPAWN_WORKER が True なら、ジョブを作ったときにそのジョブだけを処理する
+プロセスを起動する。False なら、常駐させた run_import_jobs --loop が拾う。
+dry_run のジョブは登録せず、loaders.diff_players() の差分だけを保存する。
+"""
+import csv
+import io
+import subprocess
+import sys
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .loaders import diff_players, load_players
+from .models import ImportJob
+
+MAX_ATTEMPTS = 3
+
+
+class JobReclaimed(Exception):
+    """進捗が止まっている間に、別のワーカーがジョブを取り直した"""
+
+
+def count_rows(data):
+    """CSVのデータ行数（ヘッダを除く。進捗の分母に使う）"""
+    return max(0, sum(1 for _ in csv.reader(io.StringIO(data))) - 1)
+
+
+def create_job(data, filename='', dry_run=False, owner=None, chunk_size=1000, spawn=None):
+    """アップロードされたCSVの取り込みジョブを作る（spawn が None なら settings に従って処理を始める）"""
+    job = ImportJob.objects.create(
+        data=data,
+        filename=filename,
+        dry_run=dry_run,
+        owner=owner,
+        chunk_size=chunk_size,
+        total_rows=count_rows(data),
+    )
+    if spawn is None:
+        spawn = getattr(settings, 'DRAFT_IMPORT_SPAWN_WORKER', False)
+    if spawn:
+        # ワーカーからジョブの行が見えるよう、コミットしてから起動する
+        transaction.on_commit(lambda: spawn_worker(job))
+    return job
+
+
+def spawn_worker(job):
+    """このジョブだけを処理する run_import_jobs を別プロセスで起動する（終わるのは待たない）"""
+    subprocess.Popen(
+        [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_import_jobs', '--job', str(job.pk)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'DRAFT_IMPORT_STALE_SECONDS', 300))
+
+
+def _stale(jobs):
+    """ワーカーが止まったとみなす「処理中」のジョブ"""
+    cutoff = _stale_cutoff()
+    return jobs.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+
+
+def claim_job(job_id=None):
+    """待機中か、ワーカーが止まった処理中のジョブを1件「処理中」にして返す（なければ None）
+
+    取り出した回数（attempts）も条件にした UPDATE で取るので、複数のワーカーが同時に同じジョブを取ることはない。
+    """
+    jobs = ImportJob.objects.all() if job_id is None else ImportJob.objects.filter(pk=job_id)
+    now = timezone.now()
+    _stale(jobs).filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', finished_at=now, message=f'ワーカーが {MAX_ATTEMPTS} 回止まったため中止しました。',
+    )
+    claimable = jobs.filter(status='pending') | _stale(jobs)
+    for pk, attempts in claimable.order_by('id').values_list('pk', 'attempts')[:5]:
+        job = ImportJob.objects.filter(pk=pk)
+        claimed = (job.filter(status='pending') | _stale(job)).filter(attempts=attempts).update(
+            status='running', started_at=now, heartbeat_at=now, attempts=attempts + 1,
+            processed_rows=0, created_count=0, updated_count=0, rejected_count=0, errors=[],
+        )
+        if claimed:
+            return ImportJob.objects.get(pk=pk)
+    return None
+
+
+def resume_if_stale(job):
+    """ワーカーが止まったジョブ（起動されなかった待機中のジョブも）なら、取り直すワーカーを起動する"""
+    if not getattr(settings, 'DRAFT_IMPORT_SPAWN_WORKER', False):
+        return False  # 常駐の run_import_jobs --loop が取り直す
+    jobs = ImportJob.objects.filter(pk=job.pk)
+    if not (jobs.filter(status='pending', created_at__lt=_stale_cutoff()) | _stale(jobs)).exists():
+        return False
+    spawn_worker(job)
+    return True
+
+
+def _save(job, *fields):
+    """fields とハートビートを書く。別のワーカーに取り直されていたら JobReclaimed"""
+    job.heartbeat_at = timezone.now()
+    values = {field: getattr(job, field) for field in (*fields, 'heartbeat_at')}
+    if not ImportJob.objects.filter(pk=job.pk, attempts=job.attempts).update(**values):
+        raise JobReclaimed(job.pk)
+
+
+def _save_progress(job, stats):
+    job.processed_rows = stats.rows
+    job.created_count = stats.created
+    job.updated_count = stats.updated
+    job.rejected_count = stats.rejected
+    job.errors = [list(error) for error in stats.errors]
+    _save(job, 'processed_rows', 'created_count', 'updated_count', 'rejected_count', 'errors')
+
+
+def run_job(job):
+    """claim_job() で取ったジョブを最後まで処理する。例外はジョブに記録して返す
+
+    途中で別のワーカーに取り直されていたら、それ以上は書かずに返す（続きはそのワーカーが処理する）。
+    """
+    try:
+        f = io.StringIO(job.data, newline='')
+        if job.dry_run:
+            diff = diff_players(f)
+            job.processed_rows = diff.rows
+            job.rejected_count = diff.rejected
+            job.errors = [list(error) for error in diff.errors]
+            job.diff = diff.to_dict()
+        else:
+            stats = load_players(f, chunk_size=job.chunk_size, on_chunk=lambda stats: _save_progress(job, stats))
+            _save_progress(job, stats)
+        job.status = 'done'
+    except JobReclaimed:
+        return job
+    except Exception:
+        job.status = 'failed'
+        job.message = traceback.format_exc()
+    job.finished_at = timezone.now()
+    try:
+        _save(
+            job, 'status', 'message', 'finished_at', 'diff',
+            'processed_rows', 'created_count', 'updated_count', 'rejected_count', 'errors',
+        )
+    except JobReclaimed:
+        pass
+    return job
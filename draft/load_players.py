@@ -1,4 +1,3 @@
-import csv
 import os
 import django
 import sys
@@ -12,41 +11,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draftproject.settings')
 
 django.setup()
 
-from draft.models import Player
+from django.core.management import call_command
 
 def run():
-    # 3. CSVファイルもdraftフォルダ内にあるのでパスを合わせる
-    file_path = os.path.join(os.path.dirname(__file__), 'players.csv')
-    
-    if not os.path.exists(file_path):
-        print(f"エラー: {file_path} が見つかりません。")
-        return
-
-    with open(file_path, encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        count = 0
-        for row in reader:
-            try:
-                def safe_int(val):
-                    try: return int(val)
-                    except: return 0
-
-                Player.objects.create(
-                    name=row['name'],
-                    category=row['category'],
-                    position=row['position'],
-                    team=row['team'],
-                    bats_throws=row['bats_throws'],
-                    height=safe_int(row['height']),
-                    weight=safe_int(row['weight']),
-                    introduction=row.get('introduction', ''),
-                    scout_comment=row.get('scout_comment', '')
-                )
-                count += 1
-            except Exception as e:
-                print(f"エラー（{row.get('name')}）: {e}")
-
-    print(f"成功: {count} 名の選手を登録しました！")
+    # 取り込み処理本体は管理コマンドにある（python manage.py load_players と同じ）
+    call_command('load_players', os.path.join(os.path.dirname(__file__), 'players.csv'))
 
 if __name__ == '__main__':
-    run()
\ No newline at end of file
+    run()
@@ -0,0 +1,314 @@
+# draft/loaders.py
+"""選手CSV・スカウトコメントの一括取り込み
+
+CSVを chunk_size 行ずつ読み、チャンクごとに1トランザクションで
+bulk_create / bulk_update する。選手は「名前 + 所属」を自然キーとして扱い、
+すでに登録されている選手は上書き（upsert）するので、何度流し直しても重複しない。
+
+コメント（load_comments）は1行ずつ CommentForm で検証し（投手・野手で使う項目も画面と同じ）、
+チャンクごとに bulk_create する。bulk_create はシグナルを送らないので、
+PlayerRating の集計はチャンク内の差分を選手ごとにまとめて1回ずつ足し込む。
+"""
+import csv
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.db import transaction
+
+from .forms import CommentForm
+from .models import Comment, Player
+from .ratings import RATING_FIELDS, apply_totals, comment_totals
+from .search import index_players
+
+PLAYER_FIELDS = [
+    'name', 'category', 'position', 'team', 'bats_throws',
+    'height', 'weight', 'introduction', 'scout_comment', 'reading',
+]
+NATURAL_KEY = ('name', 'team')
+UPDATE_FIELDS = [f for f in PLAYER_FIELDS if f not in NATURAL_KEY]
+CHOICE_FIELDS = {
+    'category': dict(Player.CATEGORY_CHOICES),
+    'position': dict(Player.POSITION_CHOICES),
+    'bats_throws': dict(Player.BATS_CHOICES),
+}
+MAX_STORED_ERRORS = 1000
+
+
+@dataclass
+class LoadStats:
+    """取り込み結果"""
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)  # [(行番号, メッセージ), ...]（先頭 MAX_STORED_ERRORS 件）
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        """1秒あたりの処理行数"""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_STORED_ERRORS:
+            self.errors.append((line, message))
+
+
+def natural_key(values):
+    return tuple(values[f] for f in NATURAL_KEY)
+
+
+def clean_player_row(row):
+    """CSVの1行を Player のフィールド値に変換する。不正な行は ValueError"""
+    values = {f: (row.get(f) or '').strip() for f in PLAYER_FIELDS}
+    for f in NATURAL_KEY:
+        if not values[f]:
+            raise ValueError(f'{f} が空です')
+    for f, choices in CHOICE_FIELDS.items():
+        if values[f] not in choices:
+            raise ValueError(f'{f} の値が不正です: {values[f]!r}')
+    for f in ('height', 'weight'):
+        # 空欄は従来どおり 0 として扱う
+        try:
+            values[f] = int(values[f]) if values[f] else 0
+        except ValueError:
+            raise ValueError(f'{f} が数値ではありません: {values[f]!r}')
+    return values
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@transaction.atomic
+def upsert_players(rows):
+    """[(行番号, 値の辞書), ...] を自然キーで登録・更新し、(作成した選手, 更新した選手) を返す"""
+    # 同じチャンク内で同じ選手が重複していたら後の行を優先する
+    by_key = {natural_key(values): values for _, values in rows}
+    existing = {}
+    names = sorted({key[0] for key in by_key})
+    # SQLite の変数上限に掛からないよう、IN 句は分けて引く
+    for batch in iter_chunks(names, 500):
+        for player in Player.objects.filter(name__in=batch):
+            existing.setdefault((player.name, player.team), player)
+
+    to_create, to_update = [], []
+    for key, values in by_key.items():
+        player = existing.get(key)
+        if player is None:
+            to_create.append(Player(**values))
+        else:
+            for f in UPDATE_FIELDS:
+                setattr(player, f, values[f])
+            to_update.append(player)
+
+    Player.objects.bulk_create(to_create)
+    Player.objects.bulk_update(to_update, UPDATE_FIELDS)
+    # bulk_create / bulk_update はシグナルを送らないので、検索索引はここでまとめて更新する
+    index_players(to_create + to_update)
+    return to_create, to_update
+
+
+def load_players(f, chunk_size=1000, on_chunk=None):
+    """開いたCSVファイルから選手を取り込み、LoadStats を返す
+
+    on_chunk を渡すと、チャンクを1つ処理するたびに on_chunk(stats) を呼ぶ（進捗表示用）。
+    """
+    stats = LoadStats()
+    started = time.perf_counter()
+    reader = csv.DictReader(f)
+
+    def numbered_rows():
+        for row in reader:
+            yield reader.line_num, row
+
+    for chunk in iter_chunks(numbered_rows(), chunk_size):
+        valid = []
+        for line, row in chunk:
+            stats.rows += 1
+            try:
+                valid.append((line, clean_player_row(row)))
+            except ValueError as e:
+                stats.reject(line, str(e))
+        if valid:
+            created, updated = upsert_players(valid)
+            stats.created += len(created)
+            stats.updated += len(updated)
+        stats.elapsed = time.perf_counter() - started
+        if on_chunk:
+            on_chunk(stats)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+
+@dataclass
+class PlayerDiff:
+    """load_players() で取り込んだ場合に何が変わるか（dry run 用）"""
+    rows: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)
+    new: list = field(default_factory=list)  # [(名前, 所属), ...] 新しく登録される選手
+    changed: list = field(default_factory=list)  # [((名前, 所属), {列: (今の値, 新しい値)}), ...]
+    unchanged: int = 0
+    missing: list = field(default_factory=list)  # 登録済みで CSV にない選手（取り込んでも消えない）
+
+    def to_dict(self, limit=MAX_STORED_ERRORS):
+        """JSON にできる形（一覧は先頭 limit 件まで）"""
+        return {
+            'rows': self.rows,
+            'rejected': self.rejected,
+            'unchanged': self.unchanged,
+            'counts': {'new': len(self.new), 'changed': len(self.changed), 'missing': len(self.missing)},
+            'new': [list(key) for key in self.new[:limit]],
+            'changed': [
+                {'key': list(key), 'fields': {f: list(values) for f, values in fields.items()}}
+                for key, fields in self.changed[:limit]
+            ],
+            'missing': [list(key) for key in self.missing[:limit]],
+        }
+
+
+def diff_players(f):
+    """開いたCSVファイルと登録済みの選手を自然キーで突き合わせ、PlayerDiff を返す
+
+    登録済みの選手は1クエリでまとめて読み、あとは自然キーと値のタプルの集合演算だけで比べる。
+    """
+    diff = PlayerDiff()
+    reader = csv.DictReader(f)
+    incoming = {}
+    for row in reader:
+        diff.rows += 1
+        try:
+            values = clean_player_row(row)
+        except ValueError as e:
+            diff.rejected += 1
+            if len(diff.errors) < MAX_STORED_ERRORS:
+                diff.errors.append((reader.line_num, str(e)))
+            continue
+        # upsert_players() と同じく、同じ選手が重複していたら後の行を優先する
+        incoming[natural_key(values)] = tuple(values[f] for f in UPDATE_FIELDS)
+
+    existing = {}
+    for row in Player.objects.values_list(*NATURAL_KEY, *UPDATE_FIELDS).order_by('id'):
+        existing.setdefault(row[:len(NATURAL_KEY)], row[len(NATURAL_KEY):])
+
+    common = incoming.keys() & existing.keys()
+    changed = {key for key, _ in {(k, incoming[k]) for k in common} - {(k, existing[k]) for k in common}}
+    diff.new = sorted(incoming.keys() - existing.keys())
+    diff.missing = sorted(existing.keys() - incoming.keys())
+    diff.unchanged = len(common) - len(changed)
+    diff.changed = [
+        (key, {f: (old, new) for f, old, new in zip(UPDATE_FIELDS, existing[key], incoming[key]) if old != new})
+        for key in sorted(changed)
+    ]
+    return diff
+
+# --- スカウトコメント ---
+
+def _comment_player_key(row):
+    """行が指す選手のキー（player_id か、選手CSVと同じ 名前 + 所属）"""
+    player_id = row.get('player_id')
+    if player_id not in (None, ''):
+        try:
+            return int(player_id)
+        except (TypeError, ValueError):
+            raise ValueError(f'player_id が数値ではありません: {player_id!r}')
+    key = tuple(str(row.get(f) or '').strip() for f in NATURAL_KEY)
+    if not all(key):
+        raise ValueError('player_id か name・team を指定してください')
+    return key
+
+
+def _find_players(keys):
+    """{キー: Player}。ID と 名前 + 所属 をそれぞれまとめて引く"""
+    ids = [key for key in keys if isinstance(key, int)]
+    names = sorted({key[0] for key in keys if isinstance(key, tuple)})
+    found = {}
+    for batch in iter_chunks(ids, 500):
+        found.update(Player.objects.in_bulk(batch))
+    for batch in iter_chunks(names, 500):
+        for player in Player.objects.filter(name__in=batch):
+            found.setdefault((player.name, player.team), player)
+    return found
+
+
+def _form_errors(form):
+    return ' / '.join(
+        f'{form.fields[name].label if name in form.fields else name}: {" ".join(messages)}'
+        for name, messages in form.errors.items()
+    )
+
+
+def clean_comments(rows):
+    """[(行番号, 行の辞書), ...] を検証し、(Comment のリスト, [(行番号, エラー), ...]) を返す"""
+    keyed, errors = [], []
+    for line, row in rows:
+        try:
+            keyed.append((line, row, _comment_player_key(row)))
+        except ValueError as e:
+            errors.append((line, str(e)))
+    players = _find_players({key for _, _, key in keyed})
+
+    comments = []
+    for line, row, key in keyed:
+        player = players.get(key)
+        if player is None:
+            errors.append((line, f'選手が見つかりません: {key!r}'))
+            continue
+        # 画面と同じフォームで検証する（投手なら野手用の項目は無視される）
+        form = CommentForm(data=row, player=player)
+        if not form.is_valid():
+            errors.append((line, _form_errors(form)))
+            continue
+        comment = form.save(commit=False)
+        comment.player = player
+        comments.append(comment)
+    errors.sort()
+    return comments, errors
+
+
+@transaction.atomic
+def insert_comments(comments):
+    """検証済みのコメントをまとめて登録し、集計は選手ごとに1回だけ更新する"""
+    Comment.objects.bulk_create(comments, batch_size=500)
+    deltas = {}
+    for comment in comments:
+        values = {'rank': comment.rank, **{f: getattr(comment, f) for f in RATING_FIELDS}}
+        deltas.setdefault(comment.player_id, Counter()).update(comment_totals(values))
+    for player_id, delta in deltas.items():
+        apply_totals(player_id, dict(delta))
+    return deltas.keys()
+
+
+def load_comments(rows, chunk_size=1000, on_chunk=None):
+    """[(行番号, 行の辞書), ...] のコメントを取り込み、LoadStats を返す（created が登録件数）
+
+    不正な行は除外して残りを登録する。チャンクごとに1トランザクション。
+    """
+    stats = LoadStats()
+    started = time.perf_counter()
+    for chunk in iter_chunks(rows, chunk_size):
+        stats.rows += len(chunk)
+        comments, errors = clean_comments(chunk)
+        for line, message in errors:
+            stats.reject(line, message)
+        if comments:
+            insert_comments(comments)
+            stats.created += len(comments)
+        stats.elapsed = time.perf_counter() - started
+        if on_chunk:
+            on_chunk(stats)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def load_comments_csv(f, chunk_size=1000, on_chunk=None):
+    """開いたCSVファイルからコメントを取り込む（列は player_id または name・team と、Comment の項目）"""
+    reader = csv.DictReader(f)
+    return load_comments(((reader.line_num, row) for row in reader), chunk_size, on_chunk)
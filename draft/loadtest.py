@@ -0,0 +1,193 @@
+# draft/loadtest.py
+"""起動中のサーバーに対する負荷試験（manage.py loadtest から使う）
+
+仮想ユーザーを N 人同時に動かし、それぞれが自分のセッション（Cookie）で
+    simulation_start -> 1巡目の入札（全球団ぶん。外れたら再入札） -> 2巡目以降の指名
+    （ときどきランダムに指名終了） -> simulation_result
+をドラフトの形式の最後の巡目（育成指名も含む）まで進める。指名・パスは画面と同じ JSON API（api_pick / api_skip）を使う。
+外部ライブラリは使わず urllib だけで動くので、ネットワークのない環境でも
+ローカルのサーバー（runserver など）と SQLite のDBに対してそのまま使える。
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+PLAYER_ID = re.compile(r'name="player_id" value="(\d+)"')
+TEAM_CARD = re.compile(r'class="team-card[^"]*" id="team-(\d+)"')
+
+
+class LoadError(Exception):
+    """想定外の応答（ステータス・内容）"""
+
+
+def percentile(sorted_values, q):
+    """ソート済みのリストの q パーセンタイル（最近傍）"""
+    if not sorted_values:
+        return None
+    i = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[i]
+
+
+class LoadStats:
+    """ステップごとのレイテンシとエラーを集める（スレッドから同時に呼ばれる）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.error_samples = {}
+        self.drafts = 0
+        self.failed_drafts = 0
+
+    def record(self, step, seconds, error=None):
+        with self._lock:
+            self.latencies[step].append(seconds)
+            if error is not None:
+                self.errors[step] += 1
+                self.error_samples.setdefault(step, error)
+
+    def finish_draft(self, ok):
+        with self._lock:
+            if ok:
+                self.drafts += 1
+            else:
+                self.failed_drafts += 1
+
+    def summary(self, elapsed):
+        steps = {}
+        total = errors = 0
+        for step, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            total += len(values)
+            errors += self.errors[step]
+            steps[step] = {
+                "requests": len(values),
+                "errors": self.errors[step],
+                "error_rate": self.errors[step] / len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p90_ms": percentile(values, 90) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "requests_per_s": total / elapsed if elapsed else 0.0,
+            "drafts_completed": self.drafts,
+            "drafts_failed": self.failed_drafts,
+            "drafts_per_s": self.drafts / elapsed if elapsed else 0.0,
+            "steps": steps,
+            "error_samples": self.error_samples,
+        }
+
+
+class VirtualUser:
+    """1人ぶんのブラウザ（Cookie を持つ）"""
+
+    def __init__(self, base_url, stats, rng, skip_rate=0.05, max_rounds=None, hot=20, timeout=30):
+        self.base_url = base_url
+        self.stats = stats
+        self.rng = rng
+        self.skip_rate = skip_rate
+        self.max_rounds = max_rounds  # None なら巡目では打ち切らず、ドラフトが終わるまで指名する
+        self.hot = hot
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, step, path, data=None):
+        """1リクエスト送り、本文を返す。時間とエラーは stats に記録する"""
+        url = urljoin(self.base_url, path)
+        body = None if data is None else urlencode(data).encode()
+        req = Request(url, data=body)
+        if data is not None:
+            req.add_header("X-CSRFToken", self._csrf_token())
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                content = response.read()
+        except HTTPError as e:
+            detail = e.read()[:200].decode(errors="replace")
+            self.stats.record(step, time.perf_counter() - started, f"HTTP {e.code}: {detail}")
+            raise LoadError(f"{step}: HTTP {e.code}")
+        except (URLError, OSError) as e:
+            self.stats.record(step, time.perf_counter() - started, repr(e))
+            raise LoadError(f"{step}: {e!r}")
+        self.stats.record(step, time.perf_counter() - started)
+        return content.decode()
+
+    def api(self, step, path, data=None):
+        return json.loads(self.request(step, path, data or {}))
+
+    def _choose(self, available):
+        # 1巡目は上位に入札が集まるように、上位 hot 人から選ぶ
+        return self.rng.choice(available[:self.hot])
+
+    def _past_max_round(self, delta):
+        return self.max_rounds is not None and delta["round"] > self.max_rounds
+
+    def run_draft(self):
+        """ドラフトを1回最後まで進める"""
+        html = self.request("simulation_start", "/simulation/start/")
+        available = [int(p_id) for p_id in PLAYER_ID.findall(html)]
+        if not TEAM_CARD.search(html) or not available:
+            raise LoadError("simulation_start: 指名画面を読み取れません")
+
+        delta = {"phase": "1st_round", "round": 1}
+        while delta["phase"] != "finished":
+            if delta["phase"] == "1st_round":
+                delta = self.api("bid", "/simulation/api/pick/", {"player_id": self._choose(available)})
+            elif self._past_max_round(delta) or not available or self.rng.random() < self.skip_rate:
+                delta = self.api("skip", "/simulation/api/skip/")
+            else:
+                delta = self.api("pick", "/simulation/api/pick/", {"player_id": self._choose(available)})
+            taken = {pick["player_id"] for pick in delta["picks"]}
+            if taken:
+                available = [p_id for p_id in available if p_id not in taken]
+
+        self.request("simulation_result", "/simulation/result/")
+
+    def run(self, drafts):
+        for _ in range(drafts):
+            try:
+                self.run_draft()
+            except (LoadError, ValueError, KeyError):
+                self.stats.finish_draft(ok=False)
+            else:
+                self.stats.finish_draft(ok=True)
+
+
+def run_load(base_url, users=10, drafts_per_user=1, ramp_up=0.0, seed=None, **user_options):
+    """users 人を同時に動かし、LoadStats.summary() の辞書を返す"""
+    stats = LoadStats()
+    seeds = random.Random(seed)
+    virtual_users = [
+        VirtualUser(base_url, stats, random.Random(seeds.random()), **user_options) for _ in range(users)
+    ]
+
+    def start(i):
+        # ramp_up 秒かけて少しずつ開始する
+        if ramp_up and users > 1:
+            time.sleep(ramp_up * i / (users - 1))
+        virtual_users[i].run(drafts_per_user)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(start, range(users)))
+    return stats.summary(time.perf_counter() - started)
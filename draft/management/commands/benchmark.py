@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from draft.benchmark import CASES, Scale, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "架空のデータを入れたテスト用DBで主な画面と模擬ドラフトの時間・クエリ数を計測する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=Scale.players, help="選手数")
+        parser.add_argument("--comments", type=int, default=Scale.comments, help="1選手あたりのコメント数")
+        parser.add_argument("--teams", type=int, default=Scale.teams, help="球団数")
+        parser.add_argument("--seed", type=int, default=Scale.seed, help="データ生成の乱数シード")
+        parser.add_argument("--repeat", type=int, default=5, help="1ケースあたりの実行回数")
+        parser.add_argument("--case", dest="cases", action="append", choices=sorted(CASES),
+                            help="計測するケース（複数指定可。省略時はすべて）")
+        parser.add_argument("--json", dest="json_path", default=None, help="結果をJSONで書き出すパス")
+        parser.add_argument("--compare", dest="base_path", default=None,
+                            help="比較する以前の結果（--json で書き出したもの）")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat は1以上を指定してください。")
+        base = None
+        if options["base_path"]:
+            with open(options["base_path"], encoding="utf-8") as f:
+                base = json.load(f)
+
+        scale = Scale(options["players"], options["comments"], options["teams"], options["seed"])
+        # 本番のDBには触れない（テストと同じ手順で一時的なDBを作って捨てる）
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"データ作成中（選手 {scale.players} 人・コメント {scale.players * scale.comments} 件・球団 {scale.teams}）…")
+            result = run_benchmarks(scale, repeat=options["repeat"], cases=options["cases"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+        self.stdout.write(f"{'ケース':<24}{'中央値(ms)':>12}{'1回目(ms)':>12}{'クエリ':>8}")
+        for name, row in result["results"].items():
+            self.stdout.write(f"{name:<24}{row['median_ms']:>12.1f}{row['first_ms']:>12.1f}{row['queries']:>8}")
+
+        if base is not None:
+            self.stdout.write(f"\n比較（{base['meta'].get('commit')} -> {result['meta'].get('commit')}）")
+            for name, before, after, ratio, queries in compare(base, result):
+                change = "-" if ratio is None else f"{ratio:.2f}x"
+                self.stdout.write(f"{name:<24}{before:>10.1f} -> {after:>10.1f}{change:>8}{queries:>+6}")
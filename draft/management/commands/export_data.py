@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from draft.exports import DATASETS, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = "終わったドラフト・選手（集計つき）・コメントを CSV / JSON で書き出す（少しずつ読んで書くのでメモリは一定）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=list(DATASETS), help="書き出すデータ")
+        parser.add_argument("--format", choices=list(FORMATS), default="csv", help="形式")
+        parser.add_argument("--gzip", action="store_true", help="gzip で圧縮する（出力先が .gz なら指定しなくてよい）")
+        parser.add_argument("-o", "--output", default=None, help="出力先のファイル（省略時は標準出力）")
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        compress = options["gzip"] or bool(path and path.endswith(".gz"))
+        chunks = stream_export(options["dataset"], options["format"], compress)
+        if path is None:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        size = 0
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"{path} に書き出しました（{size:,} バイト）。"))
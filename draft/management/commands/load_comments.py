@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.loaders import load_comments_csv
+
+
+class Command(BaseCommand):
+    help = "スカウトコメントのCSVを一括登録する（検証は詳細画面のフォームと同じ。集計は選手ごとにまとめて更新）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="取り込むCSVファイル（列は player_id または name・team と、text・rank・各評価項目）")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="1トランザクションで処理する行数")
+
+    def handle(self, *args, **options):
+        path = options["csv_path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} が見つかりません。")
+
+        printed = 0
+
+        def report(stats):
+            nonlocal printed
+            for line, message in stats.errors[printed:]:
+                self.stderr.write(f"  {line} 行目: {message}")
+            printed = len(stats.errors)
+            if options["verbosity"] >= 1:
+                self.stdout.write(
+                    f"{stats.rows} 行処理（登録 {stats.created} / 除外 {stats.rejected}） {stats.rate:.0f} 行/秒"
+                )
+
+        with open(path, encoding="utf-8", newline="") as f:
+            stats = load_comments_csv(f, chunk_size=options["chunk_size"], on_chunk=report)
+
+        if stats.rejected > len(stats.errors):
+            self.stderr.write(f"  ...ほか {stats.rejected - len(stats.errors)} 行を除外しました。")
+        self.stdout.write(self.style.SUCCESS(
+            f"成功: {stats.created} 件のコメントを登録しました（{stats.elapsed:.1f} 秒, {stats.rate:.0f} 行/秒）。"
+        ))
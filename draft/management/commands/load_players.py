@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.loaders import load_players
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "players.csv")
+
+
+class Command(BaseCommand):
+    help = "選手CSVをチャンクごとに一括登録・更新する（名前 + 所属が同じ選手は上書き）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", nargs="?", default=DEFAULT_CSV, help="取り込むCSVファイル（省略時は draft/players.csv）")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="1トランザクションで処理する行数")
+
+    def handle(self, *args, **options):
+        path = options["csv_path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} が見つかりません。")
+
+        printed = 0
+
+        def report(stats):
+            nonlocal printed
+            for line, message in stats.errors[printed:]:
+                self.stderr.write(f"  {line} 行目: {message}")
+            printed = len(stats.errors)
+            if options["verbosity"] >= 1:
+                self.stdout.write(
+                    f"{stats.rows} 行処理（作成 {stats.created} / 更新 {stats.updated} / 除外 {stats.rejected}）"
+                    f" {stats.rate:.0f} 行/秒"
+                )
+
+        with open(path, encoding="utf-8", newline="") as f:
+            stats = load_players(f, chunk_size=options["chunk_size"], on_chunk=report)
+
+        if stats.rejected > len(stats.errors):
+            self.stderr.write(f"  ...ほか {stats.rejected - len(stats.errors)} 行を除外しました。")
+        self.stdout.write(self.style.SUCCESS(
+            f"成功: {stats.created} 名を登録、{stats.updated} 名を更新しました"
+            f"（{stats.elapsed:.1f} 秒, {stats.rate:.0f} 行/秒）。"
+        ))
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.loadtest import run_load
+
+
+class Command(BaseCommand):
+    help = "起動中のサーバーに仮想ユーザーを同時に接続し、模擬ドラフトを最後まで進めて性能を測る"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/", help="サーバーのURL")
+        parser.add_argument("-u", "--users", type=int, default=10, help="同時に動かす仮想ユーザー数")
+        parser.add_argument("--drafts", type=int, default=1, help="1ユーザーあたりのドラフト回数")
+        parser.add_argument("--ramp-up", type=float, default=0.0, help="全員が開始するまでの秒数")
+        parser.add_argument("--skip-rate", type=float, default=0.05, help="2巡目以降にランダムで指名終了する確率")
+        parser.add_argument("--max-rounds", type=int, default=None,
+                            help="指定すると、この巡目を過ぎたら全球団が指名終了する（既定はドラフトが終わるまで）")
+        parser.add_argument("--timeout", type=float, default=30, help="1リクエストのタイムアウト（秒）")
+        parser.add_argument("--seed", type=int, default=None, help="乱数シード")
+        parser.add_argument("--json", dest="json_path", default=None, help="結果をJSONで書き出すパス")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["drafts"] < 1:
+            raise CommandError("--users と --drafts は1以上を指定してください。")
+        self.stdout.write(f"{options['url']} に {options['users']} 人で接続します…")
+        result = run_load(
+            options["url"],
+            users=options["users"],
+            drafts_per_user=options["drafts"],
+            ramp_up=options["ramp_up"],
+            seed=options["seed"],
+            skip_rate=options["skip_rate"],
+            max_rounds=options["max_rounds"],
+            timeout=options["timeout"],
+        )
+
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+        self.stdout.write(
+            f"{result['elapsed_s']:.1f} 秒で {result['requests']} リクエスト"
+            f"（{result['requests_per_s']:.1f} req/s）、ドラフト完了 {result['drafts_completed']} 回"
+            f"（{result['drafts_per_s']:.2f} 回/s）、失敗 {result['drafts_failed']} 回、"
+            f"エラー率 {result['error_rate']:.2%}"
+        )
+        self.stdout.write(f"{'ステップ':<20}{'件数':>8}{'エラー':>8}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}")
+        for step, row in result["steps"].items():
+            self.stdout.write(
+                f"{step:<20}{row['requests']:>8}{row['errors']:>8}"
+                f"{row['p50_ms']:>10.1f}{row['p90_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+            )
+        for step, error in result["error_samples"].items():
+            self.stderr.write(f"{step}: {error}")
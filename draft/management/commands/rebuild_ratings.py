@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from draft.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Comment テーブルから選手ごとの評価集計（PlayerRating）を作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument("player_ids", nargs="*", type=int, help="作り直す選手ID（省略時は全選手）")
+
+    def handle(self, *args, **options):
+        count = rebuild_ratings(options["player_ids"] or None)
+        self.stdout.write(self.style.SUCCESS(f"{count} 名分の評価集計を作り直しました。"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from draft.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "全選手の検索索引（n-gram）を作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="1トランザクションで処理する人数")
+
+    def handle(self, *args, **options):
+        count = rebuild_index(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"{count} 名分の検索索引を作り直しました。"))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from draft.imports import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = "管理画面から受け付けた選手CSVの取り込みジョブを処理する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", type=int, default=None, help="このIDのジョブだけを処理する")
+        parser.add_argument("--loop", action="store_true", help="終わらずに、新しいジョブを待ち続ける")
+        parser.add_argument("--interval", type=float, default=2.0, help="--loop で待つときの間隔（秒）")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job(options["job"])
+            if job is not None:
+                self.stdout.write(f"ジョブ {job.pk}（{job.filename or 'CSV'}）を処理します…")
+                job = run_job(job)
+                self.stdout.write(
+                    f"  {job.get_status_display()}: {job.processed_rows} 行処理（作成 {job.created_count} / "
+                    f"更新 {job.updated_count} / 除外 {job.rejected_count}）"
+                )
+                if job.message:
+                    self.stderr.write(job.message)
+                if options["job"] is None:
+                    continue
+            if not options["loop"] or options["job"] is not None:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,54 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.adp import record_summary
+from draft.engine import DEFAULT_FORMAT, FORMATS, POLICIES, get_format, get_policy, load_pool, run_drafts
+
+
+class Command(BaseCommand):
+    help = "DBの選手・球団で模擬ドラフトを大量に実行し、指名率などを集計する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", "--drafts", type=int, default=1000, help="実行するドラフト回数")
+        parser.add_argument("--policy", choices=sorted(POLICIES), default="weighted", help="全球団共通の指名方針")
+        parser.add_argument("--format", choices=sorted(FORMATS), default=DEFAULT_FORMAT, help="ドラフト形式")
+        parser.add_argument("--max-picks", type=int, default=None, help="1球団あたりの最大指名人数")
+        parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（1ならプールを使わない）")
+        parser.add_argument("--seed", type=int, default=None, help="乱数シード（固定すると結果を再現できる）")
+        parser.add_argument("--top", type=int, default=20, help="表示する選手の人数")
+        parser.add_argument("--json", dest="json_path", default=None, help="集計結果をJSONで書き出すパス")
+        parser.add_argument("--results", dest="results_path", default=None,
+                            help="全指名をバイナリの結果ファイルに書き出すパス（既存のファイルには追記）")
+        parser.add_argument("--record-adp", action="store_true",
+                            help="結果を選手ごとの予想指名順位（ADP）の集計に足し込む")
+
+    def handle(self, *args, **options):
+        players, teams = load_pool()
+        if not players or not teams:
+            raise CommandError("選手または球団が登録されていません。")
+
+        policy = get_policy(options["policy"], max_picks=options["max_picks"])
+        started = time.perf_counter()
+        summary = run_drafts(
+            players, teams, options["drafts"], policy,
+            workers=options["workers"], seed=options["seed"],
+            draft_format=get_format(options["format"]),
+            results_path=options["results_path"],
+        )
+        elapsed = time.perf_counter() - started
+        result = summary.to_dict(players, teams)
+        if options["record_adp"]:
+            record_summary(summary, options["format"])
+
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+        self.stdout.write(f"{summary.drafts} 回のドラフトを {elapsed:.2f} 秒で実行しました。")
+        self.stdout.write(f"{'選手':<16}{'指名率':>8}{'1巡目率':>8}{'平均順位':>8}")
+        for row in result["players"][:options["top"]]:
+            self.stdout.write(
+                f"{row['name']:<16}{row['drafted_rate']:>8.1%}{row['first_round_rate']:>8.1%}{row['avg_pick']:>8.1f}"
+            )
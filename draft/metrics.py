@@ -0,0 +1,309 @@
+# draft/metrics.py
+"""処理時間・回数の計測と /metrics（Prometheus のテキスト形式）
+
+外部ライブラリは使わず、カウンタ・ヒストグラム・ゲージを最小限だけ実装している。
+値はプロセスごとに持つ（複数ワーカーで動かすときは、ワーカーごとに集めることになる）。
+
+    MetricsMiddleware    ビューごとのレイテンシ・件数・DB時間
+    DjangoTemplates      テンプレートの描画時間（settings.TEMPLATES の BACKEND に指定する）
+    @timed(...)          DraftManager.resolve_lottery などの関数の実行時間
+    ゲージ               進行中のドラフト数・セッションのサイズ（/metrics を読んだときに集計する）
+
+1回の記録は perf_counter() 2回とロック付きの足し算だけなので、常に有効にしておいてよい。
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.template.backends import django as django_backend
+
+# 秒単位のヒストグラムの区切り
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# /metrics を読めるアドレス（settings.DRAFT_METRICS_ALLOWED_IPS で変更できる）
+DEFAULT_ALLOWED_IPS = ("127.0.0.1", "::1")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in [*zip(names, values), *extra]]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        """[(名前の後ろに付ける文字列, ラベルの値, 追加のラベル, 値), ...]"""
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """値を set() するか、collect に「{ラベルの値のタプル: 値}を返す関数」を渡して読み出し時に集計する"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, collect=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.collect is not None:
+            values = self.collect()
+            with self._lock:
+                self._values = values if isinstance(values, dict) else {(): values}
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [区切りごとの件数（累積ではない。最後は +Inf）, 合計, 件数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, n) for key, (counts, total, n) in sorted(self._values.items())]
+        out = []
+        for key, counts, total, n in items:
+            cumulative = 0
+            for le, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                out.append(("_bucket", key, (("le", _format_value(le)),), cumulative))
+            out.append(("_sum", key, (), total))
+            out.append(("_count", key, (), n))
+        return out
+
+
+class _Timer:
+    """with HISTOGRAM.time(label=...): で囲んだ部分の時間を記録する"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def expose(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def timed(operation):
+    """関数の実行時間を draft_operation_duration_seconds{operation=...} に記録するデコレータ"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                OPERATION_LATENCY.observe(time.perf_counter() - started, operation=operation)
+        return wrapper
+    return decorator
+
+
+# --- 集計するもの ---
+
+def _active_drafts():
+    from .models import Draft
+    return Draft.objects.exclude(phase="finished").count()
+
+
+def _session_bytes():
+    """DBに保存されている有効なセッションのデータ量（平均・最大）"""
+    if settings.SESSION_ENGINE != "django.contrib.sessions.backends.db":
+        return {}
+    from django.contrib.sessions.models import Session
+    from django.db.models import Avg, Max
+    from django.db.models.functions import Length
+    from django.utils import timezone
+    row = Session.objects.filter(expire_date__gt=timezone.now()).aggregate(
+        avg=Avg(Length("session_data")), max=Max(Length("session_data"))
+    )
+    return {("avg",): row["avg"] or 0, ("max",): row["max"] or 0}
+
+
+REQUEST_LATENCY = Histogram("draft_http_request_duration_seconds", "ビューごとの応答時間", ["view", "method"])
+REQUESTS = Counter("draft_http_requests_total", "ビューごとのリクエスト数", ["view", "method", "status"])
+DB_LATENCY = Histogram("draft_db_duration_seconds", "1リクエストあたりのDB時間の合計", ["view"])
+DB_QUERIES = Counter("draft_db_queries_total", "ビューごとのクエリ数", ["view"])
+TEMPLATE_LATENCY = Histogram("draft_template_render_seconds", "テンプレートの描画時間", ["template"])
+OPERATION_LATENCY = Histogram("draft_operation_duration_seconds", "ドラフト処理の実行時間", ["operation"])
+ACTIVE_DRAFTS = Gauge("draft_active_drafts", "終了していないドラフトの数", collect=_active_drafts)
+SESSION_BYTES = Gauge("draft_session_bytes", "有効なセッションのデータ量（バイト）", ["stat"], collect=_session_bytes)
+
+
+class _DBTimer:
+    """connection.execute_wrapper() 用。回数と時間だけ数える"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def _add_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+def _remove_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<unmatched>"
+
+
+class MetricsMiddleware:
+    """ビューごとのレイテンシ・リクエスト数・DB時間を記録する
+
+    ASGI ではすべてのリクエストが __acall__ を通る。同期のビューや他のミドルウェアの DB 処理は
+    リクエストごとに1つのスレッド（thread_sensitive）で動くので、そのスレッドの接続に
+    _DBTimer を付けて数える。非同期のビューが sync_to_async(thread_sensitive=False) で
+    別スレッドから出すクエリは数えられない。SSE は応答を返すまでの時間になる。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _record(self, request, response, started):
+        view = _view_name(request)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        return view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        db = _DBTimer()
+        with connection.execute_wrapper(db):
+            response = self.get_response(request)
+        view = self._record(request, response, started)
+        DB_LATENCY.observe(db.seconds, view=view)
+        DB_QUERIES.inc(db.count, view=view)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        db = _DBTimer()
+        # 同期の処理が動くスレッドの接続に付ける（async の文脈では接続に触らない）
+        await sync_to_async(_add_wrapper)(db)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_remove_wrapper)(db)
+        view = self._record(request, response, started)
+        DB_LATENCY.observe(db.seconds, view=view)
+        DB_QUERIES.inc(db.count, view=view)
+        return response
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            name = getattr(self.origin, "template_name", None) or "<string>"
+            TEMPLATE_LATENCY.observe(time.perf_counter() - started, template=name)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """描画時間を記録する Django テンプレートのバックエンド"""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
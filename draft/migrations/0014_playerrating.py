@@ -0,0 +1,104 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+RATING_FIELDS = [
+    "velocity", "command", "breakingball", "mechanics",
+    "batcontroll", "power", "speed", "defense", "potential",
+]
+RANK_SCORES = {"S": 5, "A": 4, "B": 3, "C": 2, "D": 1}
+
+
+def build_ratings(apps, schema_editor):
+    """既存のコメントから集計を作る"""
+    Comment = apps.get_model("draft", "Comment")
+    PlayerRating = apps.get_model("draft", "PlayerRating")
+
+    ratings = {}
+    for c in Comment.objects.all().iterator():
+        r = ratings.setdefault(c.player_id, PlayerRating(player_id=c.player_id))
+        r.comment_count += 1
+        r.rank_sum += RANK_SCORES.get(c.rank, 0)
+        for field in RATING_FIELDS:
+            value = getattr(c, field)
+            if value is not None:
+                setattr(r, f"{field}_sum", getattr(r, f"{field}_sum") + value)
+                setattr(r, f"{field}_count", getattr(r, f"{field}_count") + 1)
+    for r in ratings.values():
+        r.avg_rank = r.rank_sum / r.comment_count
+    PlayerRating.objects.bulk_create(ratings.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0013_rename_primary_color_team_first_color_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlayerRating",
+            fields=[
+                (
+                    "player",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating",
+                        serialize=False,
+                        to="draft.player",
+                    ),
+                ),
+                ("comment_count", models.IntegerField(default=0)),
+                ("rank_sum", models.IntegerField(default=0)),
+                ("avg_rank", models.FloatField(blank=True, db_index=True, null=True)),
+                (
+                    "velocity_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("velocity_count", models.IntegerField(default=0)),
+                (
+                    "command_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("command_count", models.IntegerField(default=0)),
+                (
+                    "breakingball_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("breakingball_count", models.IntegerField(default=0)),
+                (
+                    "mechanics_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("mechanics_count", models.IntegerField(default=0)),
+                (
+                    "batcontroll_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("batcontroll_count", models.IntegerField(default=0)),
+                (
+                    "power_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("power_count", models.IntegerField(default=0)),
+                (
+                    "speed_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("speed_count", models.IntegerField(default=0)),
+                (
+                    "defense_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("defense_count", models.IntegerField(default=0)),
+                (
+                    "potential_sum",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=10),
+                ),
+                ("potential_count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_ratings, migrations.RunPython.noop),
+    ]
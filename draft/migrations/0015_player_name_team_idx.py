@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0014_playerrating"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="player",
+            index=models.Index(fields=["name", "team"], name="player_name_team_idx"),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:36
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# この時点の draft/search.py の正規化と bigram（あとで search.py が変わってもこのマイグレーションは変えない）
+KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+
+def normalize(text):
+    text = (
+        unicodedata.normalize("NFKC", text or "")
+        .lower()
+        .translate(KATAKANA_TO_HIRAGANA)
+    )
+    return "".join(text.split())
+
+
+def document(player):
+    return "\n".join(
+        normalize(value) for value in (player.name, player.team, player.reading)
+    )
+
+
+def document_grams(doc):
+    grams = set()
+    for part in doc.split("\n"):
+        grams |= {part[i : i + 2] for i in range(len(part) - 1)}
+    return grams
+
+
+def build_search_index(apps, schema_editor):
+    """既存の選手の検索索引を作る"""
+    Player = apps.get_model("draft", "Player")
+    PlayerSearchGram = apps.get_model("draft", "PlayerSearchGram")
+    players = list(Player.objects.all())
+    for player in players:
+        player.search_text = document(player)
+    Player.objects.bulk_update(players, ["search_text"], batch_size=500)
+    PlayerSearchGram.objects.bulk_create(
+        PlayerSearchGram(player_id=player.pk, gram=gram)
+        for player in players
+        for gram in document_grams(player.search_text)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0015_player_name_team_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="player",
+            name="reading",
+            field=models.CharField(
+                blank=True, max_length=100, verbose_name="読み（かな）"
+            ),
+        ),
+        migrations.AddField(
+            model_name="player",
+            name="search_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.CreateModel(
+            name="PlayerSearchGram",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("gram", models.CharField(max_length=2)),
+                (
+                    "player",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_grams",
+                        to="draft.player",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("gram", "player"), name="unique_player_search_gram"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0016_player_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="player",
+            index=models.Index(
+                fields=["category", "position", "name", "id"],
+                name="player_group_page_idx",
+            ),
+        ),
+    ]
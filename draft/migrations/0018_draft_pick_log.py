@@ -0,0 +1,83 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def delete_unattached_picks(apps, schema_editor):
+    apps.get_model("draft", "Pick").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0017_player_group_page_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Draft",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("team_ids", models.JSONField(default=list)),
+                (
+                    "phase",
+                    models.CharField(
+                        choices=[
+                            ("1st_round", "1巡目（入札）"),
+                            ("waiver", "2巡目以降"),
+                            ("finished", "終了"),
+                        ],
+                        default="1st_round",
+                        max_length=10,
+                    ),
+                ),
+                ("current_round", models.IntegerField(default=1)),
+                ("current_team_index", models.IntegerField(default=0)),
+                ("direction", models.SmallIntegerField(default=1)),
+                ("pending_teams", models.JSONField(default=list)),
+                ("current_bids", models.JSONField(default=dict)),
+                ("finished_teams", models.JSONField(default=list)),
+                ("lottery_messages", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="drafts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        # これまで Pick は書き込まれていない。ドラフトに紐付けられない行は残さない
+        migrations.RunPython(delete_unattached_picks, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="pick",
+            name="draft",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="picks",
+                to="draft.draft",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="pick",
+            constraint=models.UniqueConstraint(
+                fields=("draft", "player"), name="unique_draft_player_pick"
+            ),
+        ),
+    ]
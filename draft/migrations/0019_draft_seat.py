@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:43
+
+import django.db.models.deletion
+import draft.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0018_draft_pick_log"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DraftSeat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "token",
+                    models.CharField(
+                        default=draft.models.new_seat_token, max_length=32, unique=True
+                    ),
+                ),
+                (
+                    "draft",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="seats",
+                        to="draft.draft",
+                    ),
+                ),
+                (
+                    "team",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="draft.team"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("draft", "team"), name="unique_draft_team_seat"
+                    )
+                ],
+            },
+        ),
+    ]
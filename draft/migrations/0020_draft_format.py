@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0019_draft_seat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="draft",
+            name="draft_format",
+            field=models.CharField(default="npb", max_length=20),
+        ),
+        migrations.AlterField(
+            model_name="draft",
+            name="phase",
+            field=models.CharField(
+                choices=[
+                    ("1st_round", "入札・抽選"),
+                    ("waiver", "2巡目以降"),
+                    ("development", "育成指名"),
+                    ("finished", "終了"),
+                ],
+                default="1st_round",
+                max_length=12,
+            ),
+        ),
+    ]
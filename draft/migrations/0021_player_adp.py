@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0020_draft_format"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlayerADP",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("draft_format", models.CharField(default="npb", max_length=20)),
+                ("drafts", models.IntegerField(default=0)),
+                ("picked", models.IntegerField(default=0)),
+                ("pick_sum", models.BigIntegerField(default=0)),
+                ("histogram", models.JSONField(default=dict)),
+                ("rounds", models.JSONField(default=dict)),
+                ("adp", models.FloatField(blank=True, db_index=True, null=True)),
+                ("p10", models.IntegerField(blank=True, null=True)),
+                ("p50", models.IntegerField(blank=True, null=True)),
+                ("p90", models.IntegerField(blank=True, null=True)),
+                (
+                    "player",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="adp_rows",
+                        to="draft.player",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("player", "draft_format"),
+                        name="unique_player_adp_format",
+                    )
+                ],
+            },
+        ),
+    ]
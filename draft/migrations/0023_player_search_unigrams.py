@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def add_unigrams(apps, schema_editor):
+    """既存の索引に1文字の gram を足す（bigram の行はそのまま）
+
+    search_text は 0016 で正規化済みなので、項目（改行区切り）ごとの文字をそのまま使う。
+    """
+    Player = apps.get_model("draft", "Player")
+    PlayerSearchGram = apps.get_model("draft", "PlayerSearchGram")
+    rows = (
+        PlayerSearchGram(player_id=p_id, gram=gram)
+        for p_id, search_text in Player.objects.values_list(
+            "id", "search_text"
+        ).iterator()
+        for gram in set(search_text) - {"\n"}
+    )
+    PlayerSearchGram.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+def remove_unigrams(apps, schema_editor):
+    PlayerSearchGram = apps.get_model("draft", "PlayerSearchGram")
+    PlayerSearchGram.objects.filter(gram__regex=r"^.$").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0022_import_job"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_unigrams, remove_unigrams),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("draft", "0023_player_search_unigrams"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="playerrating",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
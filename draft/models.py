@@ -1,3 +1,6 @@
+import secrets
+
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -14,6 +17,9 @@ def rating_field(verbose_name):
         ]
     )
 
+def rating_sum_field():
+    return models.DecimalField(max_digits=10, decimal_places=1, default=0)
+
 class Team(models.Model):
     name = models.CharField(max_length=100)
     order = models.IntegerField() 
@@ -56,12 +62,23 @@ class Player(models.Model):
     weight = models.IntegerField()  # kg
     introduction = models.TextField(blank=True, verbose_name='選手紹介')
     scout_comment = models.TextField(blank=True)
+    reading = models.CharField(max_length=100, blank=True, verbose_name='読み（かな）')
+    # 検索用に正規化した「名前\n所属\n読み」（search.py が更新する）
+    search_text = models.TextField(blank=True, editable=False)
     drafted_team = models.ForeignKey(
         Team,
         null=True,
         blank=True,
         on_delete=models.SET_NULL
     )
+
+    class Meta:
+        indexes = [
+            # CSV取り込みで「名前 + 所属」を自然キーとして引くため
+            models.Index(fields=['name', 'team'], name='player_name_team_idx'),
+            # 一覧ページでカテゴリ・ポジションごとに名前順でページ送りするため
+            models.Index(fields=['category', 'position', 'name', 'id'], name='player_group_page_idx'),
+        ]
     
 
     def __str__(self):
@@ -95,17 +112,244 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
 
+class PlayerRating(models.Model):
+    """選手ごとのコメント集計（Comment の保存・削除のたびに差分で更新する）"""
+    RATING_FIELDS = [
+        'velocity', 'command', 'breakingball', 'mechanics',
+        'batcontroll', 'power', 'speed', 'defense', 'potential',
+    ]
+
+    player = models.OneToOneField(
+        Player,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rating'
+    )
+    comment_count = models.IntegerField(default=0)
+    rank_sum = models.IntegerField(default=0)  # S=5 〜 D=1 に置き換えた合計
+    avg_rank = models.FloatField(null=True, blank=True, db_index=True)  # rank_sum / comment_count
+    version = models.PositiveIntegerField(default=0)  # 集計が変わるたびに増やす（詳細ページのキャッシュのキー）
+    velocity_sum = rating_sum_field()
+    velocity_count = models.IntegerField(default=0)
+    command_sum = rating_sum_field()
+    command_count = models.IntegerField(default=0)
+    breakingball_sum = rating_sum_field()
+    breakingball_count = models.IntegerField(default=0)
+    mechanics_sum = rating_sum_field()
+    mechanics_count = models.IntegerField(default=0)
+    batcontroll_sum = rating_sum_field()
+    batcontroll_count = models.IntegerField(default=0)
+    power_sum = rating_sum_field()
+    power_count = models.IntegerField(default=0)
+    speed_sum = rating_sum_field()
+    speed_count = models.IntegerField(default=0)
+    defense_sum = rating_sum_field()
+    defense_count = models.IntegerField(default=0)
+    potential_sum = rating_sum_field()
+    potential_count = models.IntegerField(default=0)
+
+    def averages(self):
+        """detail テンプレート用の平均値（avg_velocity など）を返す"""
+        averages = {}
+        for field in self.RATING_FIELDS:
+            count = getattr(self, f'{field}_count')
+            averages[f'avg_{field}'] = getattr(self, f'{field}_sum') / count if count else None
+        return averages
+
  
 
 
 
 
+class PlayerADP(models.Model):
+    """選手ごと・ドラフト形式ごとの指名順位の分布（模擬ドラフトと指名画面で終わったドラフトから、adp.py が差分で足し込む）
+
+    形式によって巡目の数も1巡あたりの指名数も違うので、形式をまたいで足し合わせない。
+    """
+    player = models.ForeignKey(
+        Player,
+        on_delete=models.CASCADE,
+        related_name='adp_rows'
+    )
+    draft_format = models.CharField(max_length=20, default='npb')  # engine.FORMATS のキー
+    drafts = models.IntegerField(default=0)  # 集計したドラフトの数（指名されなかった回も含む）
+    picked = models.IntegerField(default=0)  # そのうち指名された回数
+    pick_sum = models.BigIntegerField(default=0)  # 指名された全体順位の合計
+    histogram = models.JSONField(default=dict)  # {全体順位: 回数}
+    rounds = models.JSONField(default=dict)  # {指名された巡目: 回数}（パスする球団があっても実際の巡目）
+    # histogram から計算しておく値（指名された回だけで見た平均と 10/50/90% 点）
+    adp = models.FloatField(null=True, blank=True, db_index=True)
+    p10 = models.IntegerField(null=True, blank=True)
+    p50 = models.IntegerField(null=True, blank=True)
+    p90 = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['player', 'draft_format'], name='unique_player_adp_format'),
+        ]
+
+    @property
+    def drafted_rate(self):
+        return self.picked / self.drafts if self.drafts else None
+
+    def available_in_round(self, rnd):
+        """rnd 巡目が始まる時点でまだ残っている確率"""
+        if not self.drafts:
+            return None
+        gone = sum(n for k, n in self.rounds.items() if int(k) < rnd)
+        return 1 - gone / self.drafts
+
+
+class PlayerSearchGram(models.Model):
+    """選手検索用の bigram 索引（search.py が更新する）"""
+    player = models.ForeignKey(
+        Player,
+        on_delete=models.CASCADE,
+        related_name='search_grams'
+    )
+    gram = models.CharField(max_length=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gram', 'player'], name='unique_player_search_gram'),
+        ]
+
+
+class Draft(models.Model):
+    """1回分のドラフトの進行状況（指名そのものは Pick に1行ずつ追記する）"""
+    PHASE_CHOICES = [
+        ('1st_round', '入札・抽選'),
+        ('waiver', '2巡目以降'),
+        ('development', '育成指名'),
+        ('finished', '終了'),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='drafts'
+    )
+    team_ids = models.JSONField(default=list)  # 指名順（Team.order の降順）
+    draft_format = models.CharField(max_length=20, default='npb')  # engine.FORMATS のキー
+    # --- 現在位置（カーソル） ---
+    phase = models.CharField(max_length=12, choices=PHASE_CHOICES, default='1st_round')
+    current_round = models.IntegerField(default=1)
+    current_team_index = models.IntegerField(default=0)
+    direction = models.SmallIntegerField(default=1)
+    # --- 1巡目の入札と、2巡目以降の指名終了チーム ---
+    pending_teams = models.JSONField(default=list)
+    current_bids = models.JSONField(default=dict)
+    finished_teams = models.JSONField(default=list)
+    lottery_messages = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    CURSOR_FIELDS = ['phase', 'current_round', 'current_team_index', 'direction', 'updated_at']
+
+    @property
+    def is_finished(self):
+        return self.phase == 'finished'
+
+    def current_team_id(self):
+        """いま指名（入札）するチームのID"""
+        if self.phase == '1st_round':
+            return self.pending_teams[self.current_team_index]
+        return self.team_ids[self.current_team_index]
+
+    def picks_by_team(self):
+        """{team_id: [player_id, ...]}（指名順）を1クエリで返す"""
+        picks = {t_id: [] for t_id in self.team_ids}
+        for t_id, p_id in self.picks.order_by('id').values_list('team_id', 'player_id'):
+            picks.setdefault(t_id, []).append(p_id)
+        return picks
+
+
 class Pick(models.Model):
+    draft = models.ForeignKey(Draft, on_delete=models.CASCADE, related_name='picks')
     round = models.IntegerField()
     team = models.ForeignKey(Team, on_delete=models.CASCADE)
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # 同じドラフトで同じ選手を二度指名できない
+            models.UniqueConstraint(fields=['draft', 'player'], name='unique_draft_player_pick'),
+        ]
+
+
+def new_seat_token():
+    return secrets.token_urlsafe(16)
+
+
+class DraftSeat(models.Model):
+    """ドラフトルームの席（1球団を1人が担当する）。token 入りの招待リンクで席に着く"""
+    draft = models.ForeignKey(Draft, on_delete=models.CASCADE, related_name='seats')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    token = models.CharField(max_length=32, unique=True, default=new_seat_token)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['draft', 'team'], name='unique_draft_team_seat'),
+        ]
+
+
+class ImportJob(models.Model):
+    """管理画面から受け付けた選手CSVの取り込み（別プロセスの run_import_jobs が処理する。imports.py）"""
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '処理中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='import_jobs'
+    )
+    filename = models.CharField(max_length=255, blank=True)
+    data = models.TextField()  # アップロードされたCSVの中身
+    dry_run = models.BooleanField(default=False)  # True なら登録せず、差分（diff）だけを出す
+    chunk_size = models.IntegerField(default=1000)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    # --- 進捗（チャンクごとに更新） ---
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    updated_count = models.IntegerField(default=0)
+    rejected_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list)  # [[行番号, メッセージ], ...]（先頭 loaders.MAX_STORED_ERRORS 件）
+    diff = models.JSONField(null=True, blank=True)  # dry_run の結果（loaders.PlayerDiff.to_dict()）
+    message = models.TextField(blank=True)  # 失敗したときの例外
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # 処理中のワーカーがチャンクごとに更新する。止まったまま古くなったジョブは別のワーカーが取り直す
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)  # 取り出された回数（どのワーカーの処理かの目印にもする）
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.filename or "CSV"}（{self.get_status_display()}）'
+
+    @property
+    def is_active(self):
+        return self.status in ('pending', 'running')
+
+    @property
+    def progress(self):
+        """0〜100（件数が分からないうちは 0）"""
+        if self.status == 'done':
+            return 100
+        return min(100, self.processed_rows * 100 // self.total_rows) if self.total_rows else 0
+
 
 
 
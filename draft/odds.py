@@ -0,0 +1,183 @@
+# draft/odds.py
+"""1巡目の入札・抽選の結果を、乱数を使わずに正確な確率で求める
+
+各球団の入札の仕方（入札モデル）を
+    [選手ID, ...]            希望順のリスト。残っている中で最も希望順の高い選手に入札する
+    {選手ID: 重み, ...}      残っている選手の重みに比例した確率で入札する
+のどちらかで渡すと、外れ1位・外れ外れ1位…の再入札まで含めて、
+「どの球団がどの選手を何回目の入札で獲得するか」の確率を返す。
+
+抽選は engine.draw_lottery と同じく、入札した球団から等確率で1球団が当選する。
+途中の状態（残っている球団の数と指名済みの選手の組）ごとに結果をメモしておくので、
+同じ状態は1回しか計算しない。入札モデル全体の結果もメモするので、同じ条件の
+問い合わせ（what-if の繰り返しなど）はすぐに返る。
+"""
+from collections import Counter
+from fractions import Fraction
+from functools import lru_cache
+from itertools import product
+from math import comb, factorial, prod
+
+# 入札できる選手が残っていない球団の結果
+NO_PLAYER = None
+# 1回の計算で数え上げてよい「入札の分かれ方・抽選の当たり方」の数。
+# 重み付きのモデルは球団と候補が増えると組み合わせが爆発するので、これを超えたら計算しない
+MAX_STEPS = 20_000  # 0.5 秒程度
+
+
+class OddsTooComplex(ValueError):
+    """入札モデルの組み合わせが多すぎて、MAX_STEPS の中で計算できない"""
+
+
+def _canonical(bid_models):
+    """入札モデルをメモのキーにできる形（タプル）にそろえる"""
+    key = []
+    for t_id, model in bid_models.items():
+        if isinstance(model, dict):
+            weights = tuple(sorted((int(p_id), Fraction(w)) for p_id, w in model.items() if w > 0))
+            key.append((int(t_id), "weights", weights))
+        else:
+            key.append((int(t_id), "ranked", tuple(int(p_id) for p_id in model)))
+    # JSON から来た文字列の ID でも同じキーになるよう、数値にしてから並べる
+    return tuple(sorted(key))
+
+
+def _bid_distribution(model, taken):
+    """残っている選手への入札の確率 [(player_id, 確率), ...]。入札先がなければ空"""
+    kind, players = model
+    if kind == "ranked":
+        for p_id in players:
+            if p_id not in taken:
+                return [(p_id, Fraction(1))]
+        return []
+    available = [(p_id, w) for p_id, w in players if p_id not in taken]
+    total = sum(w for _, w in available)
+    return [(p_id, w / total) for p_id, w in available]
+
+
+def _compositions(n, k):
+    """n 球団を k 人の選手に振り分ける人数の組 (a_1, ..., a_k)"""
+    if k == 1:
+        yield (n,)
+        return
+    for first in range(n, -1, -1):
+        for rest in _compositions(n - first, k - 1):
+            yield (first,) + rest
+
+
+def _class_bids(n, distribution):
+    """同じ入札モデルの n 球団の入札の分かれ方 [({player_id: 人数}, 確率), ...]（多項分布）"""
+    players = [p_id for p_id, _ in distribution]
+    probs = [p for _, p in distribution]
+    out = []
+    for counts in _compositions(n, len(players)):
+        p = Fraction(factorial(n))
+        for a, q in zip(counts, probs):
+            p = p / factorial(a) * q ** a
+        if p:
+            out.append(({p_id: a for p_id, a in zip(players, counts) if a}, p))
+    return out
+
+
+class _Solver:
+    """1つの入札モデルについて、状態ごとの結果をメモしながら解く
+
+    入札モデルが同じ球団どうしは入れ替えても結果が変わらないので、球団を
+    「モデルの種類ごとの人数」でまとめて扱う（12球団が同じ希望順でも状態は12通りで済む）。
+    """
+
+    def __init__(self, key, max_steps=MAX_STEPS):
+        self.classes = sorted({(kind, players) for _, kind, players in key})
+        self.team_class = {t_id: self.classes.index((kind, players)) for t_id, kind, players in key}
+        self.steps_left = max_steps
+        self.solve = lru_cache(maxsize=None)(self._solve)
+
+    def _spend(self, steps):
+        """これから数え上げる数を先に差し引く（列挙する前に数だけで判定する）"""
+        self.steps_left -= steps
+        if self.steps_left < 0:
+            raise OddsTooComplex("入札モデルの組み合わせが多すぎます。")
+
+    def _solve(self, counts, taken):
+        """モデルの種類ごとの人数 counts の球団がこれから入札するときの、
+        その種類の球団1つあたりの結果 {種類: Counter({(選手, 何回目): 確率})}"""
+        results = {c: Counter() for c, n in enumerate(counts) if n}
+        per_class = []
+        for c, n in enumerate(counts):
+            if not n:
+                continue
+            distribution = _bid_distribution(self.classes[c], taken)
+            if distribution:
+                self._spend(comb(n + len(distribution) - 1, len(distribution) - 1))
+                per_class.append((c, _class_bids(n, distribution)))
+            else:
+                results[c][(NO_PLAYER, 1)] += 1
+
+        retries = Counter()
+        self._spend(prod(len(bids) for _, bids in per_class))
+        # 入札の分かれ方の組み合わせごとに、抽選でどの種類の球団が当たるかを数え上げる
+        for combination in product(*(bids for _, bids in per_class)):
+            p_bids = Fraction(1)
+            by_player = {}
+            for (c, _), (bids, p) in zip(per_class, combination):
+                p_bids *= p
+                for p_id, a in bids.items():
+                    by_player.setdefault(p_id, {})[c] = a
+            new_taken = taken | frozenset(by_player)
+            bidding = {c for c, _ in per_class}
+            contested = [(p_id, list(bidders.items()), sum(bidders.values())) for p_id, bidders in by_player.items()]
+            self._spend(prod(len(bidders) for _, bidders, _ in contested))
+
+            for winners in product(*(bidders for _, bidders, _ in contested)):
+                p_outcome = p_bids
+                # 入札した球団のうち当選しなかった球団が、外れ1位として再入札する
+                losers = [counts[c] if c in bidding else 0 for c in range(len(counts))]
+                for (p_id, _, total), (winner, a) in zip(contested, winners):
+                    p_outcome *= Fraction(a, total)
+                    losers[winner] -= 1
+                for (p_id, _, _), (winner, _) in zip(contested, winners):
+                    results[winner][(p_id, 1)] += p_outcome / counts[winner]
+                losers = tuple(losers)
+                if any(losers):
+                    retries[(losers, new_taken)] += p_outcome
+
+        # 同じ再入札の状態に行き着く場合はまとめてから足し込む
+        for (losers, new_taken), p_state in retries.items():
+            for c, outcomes in self.solve(losers, new_taken).items():
+                share = p_state * Fraction(losers[c], counts[c])
+                for (p_id, attempt), q in outcomes.items():
+                    results[c][(p_id, attempt + 1)] += share * q
+        return results
+
+
+@lru_cache(maxsize=256)
+def _odds(key):
+    solver = _Solver(key)
+    counts = [0] * len(solver.classes)
+    for c in solver.team_class.values():
+        counts[c] += 1
+    results = solver.solve(tuple(counts), frozenset())
+    return {t_id: dict(results[c]) for t_id, c in solver.team_class.items()}
+
+
+def lottery_odds(bid_models, exact=False):
+    """入札モデル {team_id: [希望順] または {player_id: 重み}} から1巡目の結果の確率を返す
+
+    返り値は {team_id: {"players": {player_id: 確率}, "attempts": {何回目の入札で決まったか: 確率}}}。
+    入札できる選手がなくなった球団は player_id が None になる。
+    exact=True なら確率を Fraction のまま返す（既定は float）。
+    組み合わせが多すぎる入札モデルは OddsTooComplex（計算を始めてすぐに打ち切る）。
+    """
+    raw = _odds(_canonical(bid_models))
+    convert = (lambda p: p) if exact else float
+    odds = {}
+    for t_id, outcomes in raw.items():
+        players, attempts = Counter(), Counter()
+        for (p_id, attempt), p in outcomes.items():
+            players[p_id] += p
+            attempts[attempt] += p
+        odds[t_id] = {
+            "players": {p_id: convert(p) for p_id, p in players.most_common()},
+            "attempts": {n: convert(attempts[n]) for n in sorted(attempts)},
+        }
+    return odds
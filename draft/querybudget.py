@@ -0,0 +1,174 @@
+# draft/querybudget.py
+"""リクエストごとの SQL の回数・時間の上限（クエリ予算）
+
+settings.DRAFT_QUERY_BUDGETS に URL 名ごとの上限を書いておくと、
+QueryBudgetMiddleware（MIDDLEWARE に追加したときだけ有効）がリクエストごとに
+SQL の回数と合計時間を数え、上限を超えたらどの行から発行されたか（スタック）付きで
+ログに出す。DRAFT_QUERY_BUDGET_STRICT = True のときは QueryBudgetExceeded を送出する
+（テストでは enforce_query_budgets() でこちらにする）。
+
+    DRAFT_QUERY_BUDGETS = {
+        "draft:detail": 4,                                    # 回数だけ
+        "draft:simulation_play": {"queries": 6, "time_ms": 200},
+    }
+
+ビュー以外の処理には、テストで with query_budget(queries=3): ... のように使う。
+"""
+import logging
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+MIDDLEWARE_PATH = "draft.querybudget.QueryBudgetMiddleware"
+# 報告に載せるスタックの数（同じ SQL は回数の多いものから）
+REPORT_LIMIT = 5
+
+
+class QueryBudgetExceeded(AssertionError):
+    """クエリ予算を超えた（テストの失敗として扱えるよう AssertionError にしてある）"""
+
+
+@dataclass(frozen=True)
+class Budget:
+    queries: int = None
+    time_ms: float = None
+
+    @classmethod
+    def parse(cls, value):
+        return cls(**value) if isinstance(value, dict) else cls(queries=value)
+
+    def violations(self, recorder):
+        out = []
+        if self.queries is not None and recorder.count > self.queries:
+            out.append(f"クエリ {recorder.count} 回（上限 {self.queries} 回）")
+        if self.time_ms is not None and recorder.time_ms > self.time_ms:
+            out.append(f"DB時間 {recorder.time_ms:.1f}ms（上限 {self.time_ms}ms）")
+        return out
+
+
+def _project_stack():
+    """このプロジェクトのコードの呼び出し元だけを残したスタック"""
+    base = str(settings.BASE_DIR)
+    return traceback.format_list([
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base) and "site-packages" not in frame.filename
+        and not frame.filename.endswith("querybudget.py")
+    ])
+
+
+class QueryRecorder:
+    """connection.execute_wrapper() に渡して、SQL ごとの時間と呼び出し元を記録する"""
+
+    def __init__(self):
+        self.queries = []  # [(sql, 時間ms, スタック), ...]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000, _project_stack()))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time_ms(self):
+        return sum(duration for _, duration, _ in self.queries)
+
+    @contextmanager
+    def record(self):
+        """全DB接続の SQL を記録する"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def report(self, limit=REPORT_LIMIT):
+        """同じ SQL が多い順に、回数・呼び出し元を並べた文字列（N+1 はここで目立つ）"""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        first_stack = {}
+        for sql, _, stack in self.queries:
+            first_stack.setdefault(sql, stack)
+        lines = []
+        for sql, n in counts.most_common(limit):
+            lines.append(f"--- {n} 回: {sql[:300]}")
+            lines.append("".join(first_stack[sql]).rstrip())
+        return "\n".join(lines)
+
+
+def check_budget(recorder, budget, label, strict=None):
+    """予算を超えていれば、ログに出すか例外を送出する（strict が None なら設定に従う）。超えていれば True"""
+    violations = budget.violations(recorder)
+    if not violations:
+        return False
+    message = f"{label}: クエリ予算超過（{'、'.join(violations)}）\n{recorder.report()}"
+    if strict is None:
+        strict = getattr(settings, "DRAFT_QUERY_BUDGET_STRICT", False)
+    if strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return True
+
+
+def budgets_from_settings():
+    return {name: Budget.parse(value) for name, value in getattr(settings, "DRAFT_QUERY_BUDGETS", {}).items()}
+
+
+class QueryBudgetMiddleware:
+    """URL 名（"draft:detail" など）ごとのクエリ予算を確かめる
+
+    予算のある URL のリクエストだけ SQL を記録する（記録するとスタックを取る分だけ遅くなる）。
+    同期のミドルウェアなので、計測したいときだけ MIDDLEWARE に入れる。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            view_name = None
+        budget = budgets_from_settings().get(view_name)
+        if budget is None:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        check_budget(recorder, budget, f"{request.method} {request.path} ({view_name})")
+        return response
+
+
+@contextmanager
+def query_budget(queries=None, time_ms=None, label="query_budget"):
+    """ブロック内の SQL が予算を超えたら QueryBudgetExceeded（テスト用）"""
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    check_budget(recorder, Budget(queries, time_ms), label, strict=True)
+
+
+def enforce_query_budgets(budgets=None):
+    """テストクラス・テストメソッド用のデコレータ。ミドルウェアを有効にして、予算超過を失敗にする
+
+    budgets を渡すと settings.DRAFT_QUERY_BUDGETS の代わりにそれを使う。
+    """
+    from django.test.utils import override_settings
+
+    overrides = {"DRAFT_QUERY_BUDGET_STRICT": True}
+    if MIDDLEWARE_PATH not in settings.MIDDLEWARE:
+        overrides["MIDDLEWARE"] = [*settings.MIDDLEWARE, MIDDLEWARE_PATH]
+    if budgets is not None:
+        overrides["DRAFT_QUERY_BUDGETS"] = budgets
+    return override_settings(**overrides)
@@ -0,0 +1,182 @@
+# draft/ratings.py
+"""選手ごとのコメント集計（PlayerRating）の更新処理
+
+Comment が保存・削除されるたびに、そのコメント1件分の差分だけを
+PlayerRating に足し引きする。全件を作り直すときは rebuild_ratings() を使う。
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, CharField, Case, Count, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import Cast, NullIf
+
+from .models import Comment, PlayerRating
+
+# ランク文字 -> 数値（simulation_play の並び順と detail の平均ランクで共通）
+RANK_SCORES = {'S': 5, 'A': 4, 'B': 3, 'C': 2, 'D': 1}
+# 平均ランク（数値）-> 表示用のランク文字。この値以上ならそのランク
+# 0 より大きければ D
+RANK_THRESHOLDS = [(4.5, 'S'), (3.5, 'A'), (2.5, 'B'), (1.5, 'C')]
+RATING_FIELDS = PlayerRating.RATING_FIELDS
+SUMMARY_CACHE_TIMEOUT = 60 * 60
+
+
+def rank_score(field='rank'):
+    """ランク文字を数値に置き換える式（集計クエリ用）"""
+    return Case(
+        *[When(**{field: rank}, then=Value(score)) for rank, score in RANK_SCORES.items()],
+        output_field=IntegerField(),
+    )
+
+
+def display_rank(field):
+    """平均ランクの列をランク文字にする式（コメントがなければ '-'）"""
+    return Case(
+        *[When(**{f'{field}__gte': low}, then=Value(rank)) for low, rank in RANK_THRESHOLDS],
+        When(**{f'{field}__gt': 0}, then=Value('D')),
+        default=Value('-'),
+        output_field=CharField(),
+    )
+
+
+def rank_label(avg_rank):
+    """display_rank() と同じ基準で、平均ランクの数値をランク文字にする"""
+    if avg_rank is None:
+        return '-'
+    for low, rank in RANK_THRESHOLDS:
+        if avg_rank >= low:
+            return rank
+    return 'D' if avg_rank > 0 else '-'
+
+
+def comment_totals(values):
+    """コメント1件分が集計に足す値を {列名: 値} で返す（values は rank と各評価項目を持つ辞書）"""
+    totals = {'comment_count': 1, 'rank_sum': RANK_SCORES.get(values['rank'], 0)}
+    for field in RATING_FIELDS:
+        if values.get(field) is not None:
+            totals[f'{field}_sum'] = values[field]
+            totals[f'{field}_count'] = 1
+    return totals
+
+
+def subtract_totals(new, old):
+    """new - old の差分（編集時に使う）"""
+    delta = dict(new)
+    for key, value in old.items():
+        delta[key] = delta.get(key, 0) - value
+    return {key: value for key, value in delta.items() if value}
+
+
+def negate_totals(totals):
+    return {key: -value for key, value in totals.items()}
+
+
+def apply_totals(player_id, delta):
+    """PlayerRating に差分を足し込む。行がなければ作る"""
+    if not delta:
+        return
+    updates = {key: F(key) + value for key, value in delta.items()}
+    updates['version'] = F('version') + 1
+    # 同じ UPDATE 文の中で、更新後の合計と件数から平均ランクを計算し直す
+    updates['avg_rank'] = (
+        Cast(F('rank_sum') + delta.get('rank_sum', 0), FloatField())
+        / NullIf(F('comment_count') + delta.get('comment_count', 0), 0)
+    )
+
+    with transaction.atomic():
+        if PlayerRating.objects.filter(player_id=player_id).update(**updates):
+            return
+        count = delta.get('comment_count', 0)
+        if count <= 0:
+            # 引く元の行がない（選手ごと削除された場合など）ので何もしない
+            return
+        try:
+            with transaction.atomic():
+                PlayerRating.objects.create(
+                    player_id=player_id,
+                    avg_rank=delta.get('rank_sum', 0) / count if count > 0 else None,
+                    version=1,
+                    **delta
+                )
+        except IntegrityError:
+            # 同時に別のリクエストが行を作った場合は、その行に足し込む
+            PlayerRating.objects.filter(player_id=player_id).update(**updates)
+
+
+def rebuild_ratings(player_ids=None):
+    """Comment テーブルから PlayerRating を作り直し、作成した件数を返す
+
+    player_ids を渡すと、その選手の分だけを作り直す。
+    コメントがなくなった選手の行も、version を進めた0件の行として残す。
+    """
+    comments = Comment.objects.all()
+    ratings = PlayerRating.objects.all()
+    if player_ids is not None:
+        comments = comments.filter(player_id__in=player_ids)
+        ratings = ratings.filter(player_id__in=player_ids)
+
+    annotations = {'comment_count': Count('id'), 'rank_sum': Sum(rank_score())}
+    for field in RATING_FIELDS:
+        annotations[f'{field}_sum'] = Sum(field)
+        annotations[f'{field}_count'] = Count(field)
+    rows = comments.values('player_id').annotate(**annotations).order_by()
+
+    with transaction.atomic():
+        # 作り直した行も version は前の値より大きくする（古いキャッシュのキーに戻らないように）。
+        # 行を消すと version も消えて、次に作る行が 1 からになるので、コメントのない選手も0件の行で残す
+        versions = dict(ratings.select_for_update().values_list('player_id', 'version'))
+        objs = []
+        for row in rows:
+            values = {key: value or 0 for key, value in row.items()}
+            values['avg_rank'] = values['rank_sum'] / values['comment_count']
+            values['version'] = versions.pop(values['player_id'], 0) + 1
+            objs.append(PlayerRating(**values))
+        objs += [PlayerRating(player_id=p_id, version=version + 1) for p_id, version in versions.items()]
+        ratings.delete()
+        PlayerRating.objects.bulk_create(objs, batch_size=500)
+    return len(objs)
+
+
+# --- 選手詳細ページ用の集計（選手ごとにキャッシュ） ---
+
+def summary_key(player_id, version):
+    return f'draft:rating-summary:{player_id}:{version}'
+
+
+def aggregate_comments(comments):
+    """評価項目の平均と平均ランクを、1回の集計クエリでまとめて出す"""
+    annotations = {f'avg_{field}': Avg(field) for field in RATING_FIELDS}
+    annotations['avg_rank_num'] = Avg(rank_score(), output_field=FloatField())
+    annotations['comment_count'] = Count('id')
+    return comments.aggregate(**annotations)
+
+
+def rating_summary(player):
+    """detail 用の {'averages', 'avg_rank', 'comment_count'} を返す
+
+    普段は PlayerRating の列を読むだけ（detail は select_related('rating') で選手と一緒に読む）。
+    結果は PlayerRating.version を含めたキーでキャッシュするので、コメントが変われば
+    どのプロセスでも別のキーになり、古い集計を返すことはない。
+    集計行がまだない選手（一括登録の直後など）は Comment から1回で集計する（キャッシュしない）。
+    """
+    try:
+        rating = player.rating
+    except PlayerRating.DoesNotExist:
+        result = aggregate_comments(player.comments.all())
+        avg_rank_num = result.pop('avg_rank_num')
+        comment_count = result.pop('comment_count')
+        return _summary(result, avg_rank_num, comment_count)
+
+    key = summary_key(player.pk, rating.version)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _summary(rating.averages(), rating.avg_rank, rating.comment_count)
+        cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def _summary(averages, avg_rank_num, comment_count):
+    return {
+        'averages': {k: float(v) if v is not None else None for k, v in averages.items()},
+        'avg_rank': rank_label(avg_rank_num),
+        'comment_count': comment_count,
+    }
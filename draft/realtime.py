@@ -0,0 +1,192 @@
+# draft/realtime.py
+"""ドラフトの状態変化をリアルタイムに配信する仕組み
+
+DraftManager が指名・抽選のたびに publish() し、ドラフトルームの WebSocket
+（consumers.py）と観戦用の SSE（views.draft_stream）が subscribe() して受け取る。
+既定の InProcessBroadcaster は同じプロセスの中だけで配信する。settings.DRAFT_BROADCASTER にクラスのパスを
+書けば、同じメソッドを持つ別の実装（Redis の pub/sub など）に差し替えられる。
+"""
+import asyncio
+import json
+import secrets
+import threading
+from collections import OrderedDict, deque
+from functools import cached_property, lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROADCASTER = "draft.realtime.InProcessBroadcaster"
+
+
+class SubscriptionClosed(Exception):
+    """購読が終了した（受信が追いつかずに切断された場合を含む）"""
+
+
+class Subscription:
+    """1つの接続ぶんの受信口。イベントループ上で get() を待つだけなので、待機中は何もしない"""
+
+    def __init__(self, broadcaster, channel, loop, max_queue):
+        self.broadcaster = broadcaster
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(max_queue)
+        self.closed = False
+
+    def _put(self, message):
+        # イベントループのスレッドで呼ばれる
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # 受信が追いつかない接続は切る（他の購読者を待たせない）
+            self.close()
+
+    async def get(self):
+        if self.closed:
+            raise SubscriptionClosed()
+        message = await self.queue.get()
+        if message is None:
+            raise SubscriptionClosed()
+        return message
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcaster.unsubscribe(self)
+            # get() で待っている側を起こす（溜まっている分は捨てる）
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class Event:
+    """配信する1件。JSON / SSE への変換は最初の1回だけ行い、全購読者で使い回す"""
+
+    def __init__(self, epoch, seq, data):
+        self.id = f"{epoch}-{seq}"
+        self.seq = seq
+        self.data = data
+
+    @cached_property
+    def json(self):
+        return json.dumps(self.data, ensure_ascii=False)
+
+    @cached_property
+    def sse(self):
+        return f"id: {self.id}\nevent: {self.data['event']}\ndata: {self.json}\n\n".encode()
+
+
+class InProcessBroadcaster:
+    """同じプロセス内の購読者に配信する
+
+    publish() はどのスレッドからでも呼べる（同期ビューからも、イベントループからも）。
+    イベントにはチャンネルごとの通し番号（"<起動ごとの値>-<番号>"）を振り、直近 history 件を
+    残しておくので、subscribe(channel, last_event_id) で切断中に流れた分から再開できる。
+    """
+
+    def __init__(self, max_queue=1000, history=200, max_channels=1000):
+        self.max_queue = max_queue
+        self.history = history
+        self.max_channels = max_channels
+        # 再起動をまたいだ番号の取り違えを防ぐ（前の起動の ID では再開できない）
+        self.epoch = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self._channels = {}
+        # チャンネルごとの (最後の番号, 直近のイベント)。古いチャンネルから捨てる
+        self._logs = OrderedDict()
+
+    def _log(self, channel):
+        log = self._logs.get(channel)
+        if log is None:
+            log = self._logs[channel] = [0, deque(maxlen=self.history)]
+            while len(self._logs) > self.max_channels:
+                self._logs.popitem(last=False)
+        self._logs.move_to_end(channel)
+        return log
+
+    def _missed(self, log, last_event_id):
+        """last_event_id より後のイベント。再開できなければ None"""
+        epoch, _, seq = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        last_seq, events = log
+        if seq > last_seq:
+            return None
+        missed = [event for event in events if event.seq > seq]
+        # 古すぎて履歴に残っていない分がある
+        if len(missed) != last_seq - seq:
+            return None
+        return missed
+
+    def subscribe(self, channel, last_event_id=None):
+        """購読を始める。イベントループの中で呼ぶ
+
+        last_event_id から再開できたときは、その後のイベントがすでに入った状態で返り、
+        subscription.resumed が True になる。subscription.last_event_id は購読開始時点の最新の ID。
+        """
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            log = self._log(channel)
+            missed = self._missed(log, last_event_id) if last_event_id else None
+            subscription.last_event_id = f"{self.epoch}-{log[0]}"
+            self._channels.setdefault(channel, set()).add(subscription)
+        subscription.resumed = missed is not None
+        for event in missed or ():
+            subscription._put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            log = self._log(channel)
+            log[0] += 1
+            event = Event(self.epoch, log[0], message)
+            log[1].append(event)
+            subscribers = list(self._channels.get(channel, ()))
+        # 購読者が何人いても、イベントループごとに1回だけ呼び出しを積む
+        by_loop = {}
+        for subscription in subscribers:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, group, event)
+            except RuntimeError:
+                # イベントループがすでに閉じている
+                for subscription in group:
+                    self.unsubscribe(subscription)
+        return event
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+def _deliver(subscriptions, event):
+    for subscription in subscriptions:
+        subscription._put(event)
+
+
+@lru_cache(maxsize=None)
+def get_broadcaster():
+    """設定されたブロードキャスタ（プロセスで1つ）"""
+    return import_string(getattr(settings, "DRAFT_BROADCASTER", DEFAULT_BROADCASTER))()
+
+
+def draft_channel(draft_id):
+    return f"draft:{draft_id}"
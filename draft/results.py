@@ -0,0 +1,238 @@
+# draft/results.py
+"""模擬ドラフトの全指名を保存する固定長のバイナリ形式
+
+1指名 = 1レコード（10バイト）:
+    draft   uint32  何回目のドラフトか（ファイル内で通し番号）
+    player  uint16  選手の番号（ヘッダの player_ids の添字）
+    pick    uint16  そのドラフトでの全体の指名順（1から）
+    round   uint8   巡目
+    team    uint8   球団の番号（ヘッダの team_ids の添字）
+
+ファイルの先頭は MAGIC・バージョン・ヘッダ長・払い出したドラフト番号の数・JSON のヘッダ
+（選手・球団の ID の対応表など）で、レコードは HEADER_ALIGN バイト境界から始まる。
+100万件でも 10MB 程度に収まる。
+
+ResultWriter はレコードを bytearray に貯めてまとめて追記する（追記中はファイルをロックするので、
+複数のワーカープロセスから同じファイルに追記できる）。ドラフト番号は reserve() で同じロックの中で
+まとめて払い出すので、同じファイルに同時に追記する実行どうしでも番号は重ならない。
+ResultReader はファイルを mmap して、必要な範囲だけを読む。to_numpy() ならコピーせずに
+NumPy の構造化配列として扱える。
+"""
+import json
+import mmap
+import os
+import struct
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MAGIC = b"DRAFTRES"
+VERSION = 2
+HEADER_ALIGN = 64
+RECORD = struct.Struct("<IHHBB")
+# NumPy の dtype（RECORD と同じ並び・パディングなし）
+NUMPY_FIELDS = [("draft", "<u4"), ("player", "<u2"), ("pick", "<u2"), ("round", "u1"), ("team", "u1")]
+_PREFIX = struct.Struct("<8sHIQ")  # MAGIC, VERSION, ヘッダ長, 払い出したドラフト番号の数
+_COUNTER = struct.Struct("<Q")
+_COUNTER_OFFSET = _PREFIX.size - _COUNTER.size
+
+Outcome = namedtuple("Outcome", ["draft", "pick", "round", "team_id", "player_id"])
+
+
+class ResultFileError(Exception):
+    """形式が違う・対応表が合わないなど、結果ファイルを扱えない"""
+
+
+def _read_header(f):
+    prefix = f.read(_PREFIX.size)
+    if len(prefix) != _PREFIX.size:
+        raise ResultFileError("結果ファイルのヘッダが壊れています。")
+    magic, version, length, drafts = _PREFIX.unpack(prefix)
+    if magic != MAGIC:
+        raise ResultFileError("模擬ドラフトの結果ファイルではありません。")
+    if version != VERSION:
+        raise ResultFileError(f"結果ファイルの形式（version {version}）に対応していません。")
+    header = json.loads(f.read(length))
+    return header, _data_offset(length), drafts
+
+
+def _data_offset(header_length):
+    end = _PREFIX.size + header_length
+    return -(-end // HEADER_ALIGN) * HEADER_ALIGN
+
+
+@contextmanager
+def _locked(path, flags):
+    """ファイルを開いて排他ロックした fd（閉じるとロックも外れる）"""
+    fd = os.open(path, flags, 0o666)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+class ResultWriter:
+    """結果ファイルへの追記（create() で新しく作るか、既存のファイルを開く）"""
+
+    def __init__(self, path, buffer_records=65536):
+        self.path = path
+        with open(path, "rb") as f:
+            header, self.data_offset, _ = _read_header(f)
+        self.player_ids = header["player_ids"]
+        self.team_ids = header["team_ids"]
+        self._player_index = {p_id: i for i, p_id in enumerate(self.player_ids)}
+        self._team_index = {t_id: i for i, t_id in enumerate(self.team_ids)}
+        self.buffer_records = buffer_records
+        self._buffer = bytearray()
+
+    @classmethod
+    def create(cls, path, player_ids, team_ids, meta=None, **kwargs):
+        """ヘッダだけのファイルを作る（すでにあれば対応表が同じか確かめて、そのまま追記する）
+
+        同時に同じファイルを作ろうとする実行があっても、ロックを取ってからまだ空のときだけヘッダを書く。
+        """
+        player_ids, team_ids = [int(p) for p in player_ids], [int(t) for t in team_ids]
+        if len(player_ids) > 0xFFFF or len(team_ids) > 0xFF:
+            raise ResultFileError("選手は65535人、球団は255球団までです。")
+        with _locked(path, os.O_RDWR | os.O_CREAT) as fd:
+            if not os.fstat(fd).st_size:
+                header = json.dumps({"player_ids": player_ids, "team_ids": team_ids, "meta": meta or {}}).encode()
+                padding = _data_offset(len(header)) - _PREFIX.size - len(header)
+                data = memoryview(_PREFIX.pack(MAGIC, VERSION, len(header), 0) + header + b"\0" * padding)
+                while data:
+                    data = data[os.write(fd, data):]
+        writer = cls(path, **kwargs)
+        if writer.player_ids != player_ids or writer.team_ids != team_ids:
+            raise ResultFileError("既存の結果ファイルと選手・球団の対応表が違います。")
+        return writer
+
+    def reserve(self, n):
+        """ドラフト番号を n 個払い出し、最初の番号を返す（追記と同じロックの中でヘッダの数を進める）"""
+        with _locked(self.path, os.O_RDWR) as fd:
+            os.lseek(fd, _COUNTER_OFFSET, os.SEEK_SET)
+            (first,) = _COUNTER.unpack(os.read(fd, _COUNTER.size))
+            os.lseek(fd, _COUNTER_OFFSET, os.SEEK_SET)
+            os.write(fd, _COUNTER.pack(first + n))
+        return first
+
+    def add(self, draft, pick, rnd, team_id, player_id):
+        self._buffer += RECORD.pack(draft, self._player_index[player_id], pick, rnd, self._team_index[team_id])
+        if len(self._buffer) >= self.buffer_records * RECORD.size:
+            self.flush()
+
+    def add_draft(self, draft, order):
+        """engine.DraftResult.order（[(round, team_id, player_id), ...]）を1ドラフト分まとめて追加する"""
+        for pick, (rnd, t_id, p_id) in enumerate(order, start=1):
+            self.add(draft, pick, rnd, t_id, p_id)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        # O_APPEND ＋ ロックで、他のプロセスの追記とレコードが混ざらないようにする
+        with _locked(self.path, os.O_WRONLY | os.O_APPEND) as fd:
+            view = memoryview(self._buffer)
+            while view:
+                view = view[os.write(fd, view):]
+        self._buffer = bytearray()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ResultReader:
+    """結果ファイルを mmap して読む。len()・添字・スライス・for で使える
+
+    reader[i] は Outcome（ID は選手・球団の本来の ID に戻したもの）、
+    reader[a:b] は Outcome のリスト。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            header, self.data_offset, self.drafts = _read_header(self._file)
+            size = os.fstat(self._file.fileno()).st_size
+            # 書き込み途中の端数は読まない
+            self.count = (size - self.data_offset) // RECORD.size
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+        except Exception:
+            self._file.close()
+            raise
+        self.player_ids = header["player_ids"]
+        self.team_ids = header["team_ids"]
+        self.meta = header.get("meta", {})
+
+    def __len__(self):
+        return self.count
+
+    def _outcome(self, values):
+        draft, player, pick, rnd, team = values
+        return Outcome(draft, pick, rnd, self.team_ids[team], self.player_ids[player])
+
+    def _view(self, start, stop):
+        begin = self.data_offset + start * RECORD.size
+        return memoryview(self._mmap)[begin:self.data_offset + stop * RECORD.size]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if start >= stop:
+                return []
+            return [self._outcome(v) for v in RECORD.iter_unpack(self._view(start, stop))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self._outcome(RECORD.unpack_from(self._mmap, self.data_offset + index * RECORD.size))
+
+    def __iter__(self, chunk=65536):
+        for start in range(0, self.count, chunk):
+            yield from self[start:start + chunk]
+
+    def next_draft(self):
+        """次に払い出されるドラフト番号（開いた時点のヘッダの値。レコードは読まない）
+
+        追記するときは、ここから決めずに ResultWriter.reserve() で払い出してもらう。
+        """
+        return self.drafts
+
+    def to_numpy(self):
+        """レコード全体を NumPy の構造化配列で返す（mmap をそのまま参照するのでコピーしない）
+
+        player / team は添字のままなので、ID にするには np.asarray(reader.player_ids)[arr["player"]]。
+        """
+        import numpy as np
+
+        dtype = np.dtype(NUMPY_FIELDS)
+        if not self.count:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=self.count, offset=self.data_offset)
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # to_numpy() の配列がまだ参照している。配列が消えれば閉じられる
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,98 @@
+# draft/search.py
+"""選手検索用の n-gram 索引
+
+選手名・所属・読み（かな）を正規化して1文字ずつ（unigram）と2文字ずつ（bigram）に分け、
+PlayerSearchGram に保存しておく。検索語の bigram（1文字の検索ならその1文字）をすべて持つ
+選手だけを索引から絞り込み、最後に正規化済みの search_text で部分一致を確認する。
+Player の保存時（signals.py）と一括取り込み時に更新する。
+"""
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Player, PlayerSearchGram
+
+# カタカナ（ァ〜ヶ）をひらがなに寄せて、どちらで入力しても読みに当たるようにする
+KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+
+def normalize(text):
+    """全角/半角・大文字/小文字・カタカナ/ひらがなの違いをなくし、空白を除く"""
+    text = unicodedata.normalize('NFKC', text or '').lower().translate(KATAKANA_TO_HIRAGANA)
+    return ''.join(text.split())
+
+
+def bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def query_grams(nq):
+    """索引で引く gram（1文字の検索語は bigram がないので、その1文字で引く）"""
+    return bigrams(nq) if len(nq) > 1 else set(nq)
+
+
+def document(player):
+    """索引する文字列（項目ごとに改行で区切り、項目をまたぐ bigram は作らない）"""
+    return '\n'.join(normalize(value) for value in (player.name, player.team, player.reading))
+
+
+def document_grams(doc):
+    grams = set()
+    for part in doc.split('\n'):
+        grams |= set(part) | bigrams(part)
+    return grams
+
+
+@transaction.atomic
+def index_players(players):
+    """選手の索引を作り直す（一括取り込み後などにまとめて呼ぶ）"""
+    players = [p for p in players if p.pk]
+    if not players:
+        return
+    for player in players:
+        player.search_text = document(player)
+
+    PlayerSearchGram.objects.filter(player__in=players).delete()
+    PlayerSearchGram.objects.bulk_create(
+        (
+            PlayerSearchGram(player_id=player.pk, gram=gram)
+            for player in players
+            for gram in document_grams(player.search_text)
+        ),
+        batch_size=1000,
+    )
+    Player.objects.bulk_update(players, ['search_text'], batch_size=500)
+
+
+def rebuild_index(chunk_size=1000):
+    """全選手の索引を作り直し、処理した人数を返す"""
+    count = 0
+    batch = []
+    for player in Player.objects.order_by('id').iterator(chunk_size=chunk_size):
+        batch.append(player)
+        if len(batch) >= chunk_size:
+            index_players(batch)
+            count += len(batch)
+            batch = []
+    index_players(batch)
+    return count + len(batch)
+
+
+def matching_player_ids(q):
+    """検索語に部分一致する選手IDのクエリセット（サブクエリとして使う）"""
+    nq = normalize(q)
+    grams = query_grams(nq)
+    players = Player.objects.all()
+    if grams:
+        # 検索語の gram をすべて持つ選手だけに絞る（索引を使う）
+        candidates = (
+            PlayerSearchGram.objects.filter(gram__in=grams)
+            .values('player_id')
+            .annotate(n=Count('gram'))
+            .filter(n=len(grams))
+            .values('player_id')
+        )
+        players = players.filter(id__in=candidates)
+    # bigram が離れた位置にあるだけの候補はここで落とす
+    return players.filter(search_text__contains=nq).values('id')
@@ -0,0 +1,51 @@
+# draft/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Comment, Player
+from .ratings import RATING_FIELDS, apply_totals, comment_totals, negate_totals, subtract_totals
+from .search import index_players
+
+
+def _comment_values(comment):
+    values = {'rank': comment.rank}
+    values.update({field: getattr(comment, field) for field in RATING_FIELDS})
+    return values
+
+
+@receiver(pre_save, sender=Comment)
+def remember_old_comment(sender, instance, **kwargs):
+    """編集の場合は、保存前の値を覚えておいて差分を出せるようにする"""
+    instance._rating_before = None
+    if instance.pk:
+        old = Comment.objects.filter(pk=instance.pk).values('player_id', 'rank', *RATING_FIELDS).first()
+        if old:
+            instance._rating_before = (old.pop('player_id'), comment_totals(old))
+
+
+@receiver(post_save, sender=Comment)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    new_totals = comment_totals(_comment_values(instance))
+    before = getattr(instance, '_rating_before', None)
+
+    if before is None:
+        apply_totals(instance.player_id, new_totals)
+    elif before[0] == instance.player_id:
+        apply_totals(instance.player_id, subtract_totals(new_totals, before[1]))
+    else:
+        # 別の選手へのコメントに付け替えられた場合
+        apply_totals(before[0], negate_totals(before[1]))
+        apply_totals(instance.player_id, new_totals)
+
+
+@receiver(post_delete, sender=Comment)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_totals(instance.player_id, negate_totals(comment_totals(_comment_values(instance))))
+
+
+@receiver(post_save, sender=Player)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """選手名・所属・読みが変わったら検索索引を作り直す"""
+    if update_fields is not None and not {'name', 'team', 'reading'} & set(update_fields):
+        return
+    index_players([instance])
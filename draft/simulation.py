@@ -1,98 +1,320 @@
 # draft/simulation.py
 import random
-from .models import Player, Team
+from django.db import transaction
+from django.db.models import CharField, Value
+from .models import Draft, Pick, Player, Team
+from .adp import record_draft
+from .metrics import timed
+from .engine import DEFAULT_FORMAT, compile_format, draw_lottery, get_format, team_mask
+from .realtime import draft_channel, get_broadcaster
+
+class DraftError(Exception):
+    """受け付けられない操作（終了後の指名、指名済みの選手など）"""
+
 
 class DraftManager:
-    def __init__(self, session):
-        self.session = session
+    """Draft（進行状況）と Pick（指名ログ）を使ってドラフトを進める
+
+    submit() / skip() は、画面を差分だけ更新できるように変化分（delta）を辞書で返す。
+    同じ変化分はコミット後にブロードキャスタへも流すので、ドラフトルームの全員に届く。
+
+    team_id を渡すと「そのチームとしての操作」になる（ドラフトルーム用）。
+    1巡目は入札していないチームならどの順でも入札でき、2巡目以降は手番のチームだけが指名できる。
+    省略すると現在のチーム（1台の画面で全チームを操作する従来の使い方）。
+    """
+
+    def __init__(self, draft, rng=None):
+        self.draft = draft
+        # 抽選に使う乱数。シード付きの random.Random を渡せば結果を再現できる
+        self.rng = rng or random.Random()
+        # 形式ごとの指名枠は組み立て済みのものを使い回す
+        self.format = compile_format(get_format(draft.draft_format), len(draft.team_ids))
+
+    @classmethod
+    def start(cls, owner=None, draft_format=DEFAULT_FORMAT):
+        """新しいドラフトを作る（1巡目の入札から開始）"""
+        get_format(draft_format)
+        t_ids = list(Team.objects.order_by("-order").values_list("id", flat=True))
+        draft = Draft.objects.create(
+            owner=owner,
+            team_ids=t_ids,
+            pending_teams=t_ids,
+            draft_format=draft_format,
+        )
+        return cls(draft)
+
+    def _fetch_names(self, player_ids, team_ids):
+        """抽選に関わる選手名と球団名を1回のクエリでまとめて取得する"""
+        rows = Player.objects.filter(id__in=player_ids).annotate(
+            kind=Value("player", output_field=CharField())
+        ).values_list("kind", "id", "name").union(
+            Team.objects.filter(id__in=team_ids).annotate(
+                kind=Value("team", output_field=CharField())
+            ).values_list("kind", "id", "name"),
+            all=True,
+        )
+        names = {"player": {}, "team": {}}
+        for kind, obj_id, name in rows:
+            names[kind][obj_id] = name
+        return names["player"], names["team"]
+
+    def delta(self, event, team_id, picks=()):
+        """操作による変化分。picks はこの操作で確定した Pick"""
+        draft = self.draft
+        return {
+            "event": event,
+            "team_id": team_id,
+            "picks": [
+                {"round": p.round, "team_id": p.team_id, "player_id": p.player_id} for p in picks
+            ],
+            "phase": draft.phase,
+            "round": draft.current_round,
+            "round_label": self.format.round_label(draft.phase, draft.current_round),
+            "current_team_id": None if draft.is_finished else draft.current_team_id(),
+            "bids": len(draft.current_bids),
+            "bidders": len(draft.pending_teams),
+            "picks_remaining": self.picks_remaining(),
+            # 入札するチームと、そのうち入札済みのチーム（何を入札したかは抽選まで伏せる）
+            "pending_team_ids": draft.pending_teams,
+            "bid_team_ids": [int(t_id) for t_id in draft.current_bids],
+            "lottery_messages": draft.lottery_messages,
+        }
+
+    def describe(self, delta):
+        """変化分に選手名・球団名を付ける（名前はまとめて2クエリで引く）"""
+        players = Player.objects.in_bulk([p["player_id"] for p in delta["picks"]])
+        teams = Team.objects.in_bulk(
+            [delta["team_id"], delta["current_team_id"]] + [p["team_id"] for p in delta["picks"]]
+        )
+        for p in delta["picks"]:
+            p["player_name"] = players[p["player_id"]].name
+            p["team_name"] = teams[p["team_id"]].name
+        current = teams.get(delta["current_team_id"])
+        delta["current_team_name"] = current.name if current else None
+        return delta
+
+    def publish(self, delta):
+        """変化分をコミット後にドラフトの購読者全員へ流す"""
+        message = dict(self.describe(delta), draft_id=self.draft.id)
+        channel = draft_channel(self.draft.id)
+        transaction.on_commit(lambda: get_broadcaster().publish(channel, message))
+        return delta
+
+    def snapshot(self):
+        """途中から参加した画面向けの、現在の状態一式（指名済みの Pick をすべて含む）"""
+        draft = self.draft
+        team_id = None if draft.is_finished else draft.current_team_id()
+        return dict(self.describe(self.delta("snapshot", team_id, draft.picks.order_by("id"))), draft_id=draft.id)
+
+    def _lock(self):
+        """Draft の行をロックして読み直す（呼び出し元のトランザクションの中で使う）
+
+        同じドラフトへの同時の操作（二重送信など）が、同じ手番に2回指名したり、
+        カーソルを2回進めたりしないよう、手番の確認はロックを取った後の状態で行う。
+        """
+        self.draft.refresh_from_db(from_queryset=Draft.objects.select_for_update())
+
+    def submit(self, player_id, team_id=None):
+        """選手を指名（1巡目は入札）し、変化分を返す"""
+        draft = self.draft
+        with transaction.atomic():
+            self._lock()
+            if draft.is_finished:
+                raise DraftError("ドラフトはすでに終了しています。")
+            # 存在しない選手や、このドラフトで指名済みの選手は受け付けない
+            if not Player.objects.filter(id=player_id).exclude(pick__draft=draft).exists():
+                raise DraftError("この選手は指名できません。")
+            if draft.phase == "1st_round":
+                delta = self.bid(player_id, team_id)
+            else:
+                delta = self.pick(player_id, team_id)
+            return self.publish(delta)
+
+    def _turn_team(self, team_id):
+        """操作するチーム。手番でないチームの操作は DraftError"""
+        draft = self.draft
+        if team_id is None:
+            return draft.current_team_id()
+        if draft.phase == "1st_round":
+            if team_id not in draft.pending_teams:
+                raise DraftError("このチームは1巡目の入札対象ではありません。")
+            if str(team_id) in draft.current_bids:
+                raise DraftError("このチームはすでに入札しています。")
+        elif team_id != draft.current_team_id():
+            raise DraftError("このチームの手番ではありません。")
+        return team_id
 
+    def bid(self, player_id, team_id=None):
+        """1巡目の入札。全チームの入札がそろったら抽選まで行う"""
+        draft = self.draft
+        team_id = self._turn_team(team_id)
+        draft.current_bids[str(team_id)] = player_id
+        draft.lottery_messages = []
+
+        if len(draft.current_bids) == len(draft.pending_teams):
+            return self.delta("lottery", team_id, self.resolve_lottery())
+
+        # 次は、まだ入札していないチームのうち先頭のチーム
+        draft.current_team_index = next(
+            i for i, t_id in enumerate(draft.pending_teams) if str(t_id) not in draft.current_bids
+        )
+        draft.save(update_fields=["current_bids", "lottery_messages"] + Draft.CURSOR_FIELDS)
+        return self.delta("bid", team_id)
+
+    @timed("resolve_lottery")
     def resolve_lottery(self):
-        """1巡目の抽選を行い、結果を返す"""
-        current_bids = self.session.get("current_bids", {})
-        draft_picks = self.session.get("draft_picks", {})
-        team_ids = self.session.get("teams", [])
+        """1巡目の抽選を行い、当選・単独指名を Pick に書き込んで、その Pick のリストを返す
 
-        player_to_teams = {}
-        for t_id, p_id in current_bids.items():
-            player_to_teams.setdefault(str(p_id), []).append(int(t_id))
+        指名の追加と進行状況の更新は1つのトランザクションでまとめて反映する。
+        メッセージは draft.lottery_messages に入る。
+        """
+        draft = self.draft
+        results = draw_lottery(draft.current_bids, self.rng)
+        player_names, team_names = self._fetch_names(
+            [p_id for p_id, _, _ in results],
+            [t_id for _, t_ids, _ in results for t_id in t_ids],
+        )
 
+        new_picks = []
         new_pending_ids = []
         messages = []
 
-        for p_id, t_ids in player_to_teams.items():
-            player = Player.objects.get(id=p_id)
+        for p_id, t_ids, winner_id in results:
+            player_name = player_names[p_id]
+            new_picks.append(Pick(draft=draft, round=draft.current_round, team_id=winner_id, player_id=p_id))
             if len(t_ids) > 1:
-                winner_id = random.choice(t_ids)
                 for t_id in t_ids:
-                    team_obj = Team.objects.get(id=t_id)
                     if t_id == winner_id:
-                        draft_picks[str(t_id)].append(int(p_id))
-                        messages.append(f"【当選】{team_obj.name}が{player.name}の交渉権獲得！")
+                        messages.append(f"【当選】{team_names[t_id]}が{player_name}の交渉権獲得！")
                     else:
                         new_pending_ids.append(t_id)
-                        messages.append(f"【外れ】{team_obj.name}は抽選に外れました。")
+                        messages.append(f"【外れ】{team_names[t_id]}は抽選に外れました。")
             else:
-                t_id = t_ids[0]
-                team_obj = Team.objects.get(id=t_id)
-                draft_picks[str(t_id)].append(int(p_id))
-                messages.append(f"【確定】{team_obj.name}が{player.name}を単独指名！")
-
-        update_data = {
-            "draft_picks": draft_picks,
-            "pending_teams": new_pending_ids,
-            "current_bids": {},
-            "lottery_messages": messages,
-        }
+                messages.append(f"【確定】{team_names[winner_id]}が{player_name}を単独指名！")
+
+        draft.pending_teams = new_pending_ids
+        draft.current_bids = {}
+        draft.lottery_messages = messages
 
         # --- ここが重要：順序の制御 ---
+        draft.current_team_index = 0
+        draft.direction = 1
         if not new_pending_ids:
-            # 12チーム全員の1位が決まった瞬間
-            update_data.update({
-                "draft_phase": "waiver",
-                "current_round": 2,
-                "current_team_index": 0, # 再びリストの先頭（12位）から開始
-                "direction": 1          # 12位 -> 1位へ向かって進む
-            })
+            if draft.current_round < self.format.lottery_rounds:
+                # 全チームの指名が決まったが、次の巡目も入札で決める形式
+                draft.current_round += 1
+                draft.pending_teams = list(draft.team_ids)
+            else:
+                # 入札の巡目が終わった。抽選のない巡目へ
+                self._enter_stage()
+        # まだ決まっていないチームがある（外れ1位指名）ときは、そのチームだけで再入札
+
+        with transaction.atomic(savepoint=False):
+            Pick.objects.bulk_create(new_picks)
+            draft.save(update_fields=["pending_teams", "current_bids", "lottery_messages", "finished_teams"] + Draft.CURSOR_FIELDS)
+            self._record_if_finished()
+        return new_picks
+
+    def pick(self, player_id, team_id=None):
+        """2巡目以降の指名。Pick を1行追加してカーソルを進める"""
+        draft = self.draft
+        team_id = self._turn_team(team_id)
+        with transaction.atomic(savepoint=False):
+            pick = Pick.objects.create(
+                draft=draft, round=draft.current_round,
+                team_id=team_id, player_id=player_id,
+            )
+            self._advance()
+        return self.delta("pick", team_id, [pick])
+
+    def skip(self, team_id=None):
+        """手番のチームの指名を終了（パス）する"""
+        draft = self.draft
+        with transaction.atomic():
+            self._lock()
+            if draft.phase == "1st_round":
+                raise DraftError("入札の巡目は指名を終了できません。")
+            if draft.is_finished:
+                raise DraftError("ドラフトはすでに終了しています。")
+            team_id = self._turn_team(team_id)
+            if team_id not in draft.finished_teams:
+                draft.finished_teams.append(team_id)
+            self._advance()
+            return self.publish(self.delta("skip", team_id))
+
+    def auto_draft(self, **kwargs):
+        """残りの球団をすべて CPU にして最後まで指名する（autopick.auto_draft を参照）"""
+        # NumPy を使うので、使うときだけ読み込む
+        from .autopick import auto_draft
+        return auto_draft(self, **kwargs)
+
+    def _enter_stage(self, after=None):
+        """抽選のない次の段階（本指名 -> 育成指名）の先頭へ。残っていなければ終了
+
+        after を渡すと、その段階より後の段階へ進む。指名終了（パス）は段階ごとにリセットする。
+        """
+        draft = self.draft
+        stages = self.format.stages()
+        phases = [phase for phase, _ in stages]
+        start = phases.index(after) + 1 if after in phases else 0
+        for phase, schedule in stages[start:]:
+            rnd, idx = schedule.slots[0]
+            draft.phase = phase
+            draft.current_round = rnd
+            draft.current_team_index = idx
+            draft.direction = schedule.direction(rnd)
+            draft.finished_teams = []
+            return
+        draft.phase = "finished"
+
+    def _advance(self):
+        """カーソルを次の指名枠へ進め、指名終了の状況と一緒に保存する"""
+        draft = self.draft
+        next_state = self.get_next_state(draft.current_team_index, draft.direction, draft.current_round)
+        if next_state is None:
+            self._enter_stage(after=draft.phase)
         else:
-            # まだ決まっていないチームがある（外れ1位指名）
-            update_data.update({
-                "current_team_index": 0,
-                "direction": 1
-            })
-            
-        return update_data
+            for key, value in next_state.items():
+                setattr(draft, key, value)
+        draft.save(update_fields=Draft.CURSOR_FIELDS + ["finished_teams"])
+        self._record_if_finished()
+        return next_state
 
+    def _record_if_finished(self):
+        """終わったドラフトの指名順位を ADP の集計に足し込む（進行の保存と同じトランザクションで）"""
+        if self.draft.is_finished:
+            record_draft(self.draft)
+
+    def picks_remaining(self):
+        """この後の指名数（この先パスする球団がなければ、ちょうどこの数で終わる）"""
+        draft = self.draft
+        fmt = self.format
+        if draft.is_finished:
+            return 0
+        if draft.phase == "1st_round":
+            # 1位がまだ決まっていない球団の分 + 残りの入札の巡目 + 抽選のない巡目の全枠
+            return (
+                len(draft.pending_teams)
+                + (fmt.lottery_rounds - draft.current_round) * len(draft.team_ids)
+                + sum(len(schedule.slots) for _, schedule in fmt.stages())
+            )
+        finished_mask = team_mask(draft.team_ids, draft.finished_teams)
+        count = fmt.schedule(draft.phase).remaining(draft.current_round, draft.current_team_index, finished_mask)
+        if draft.phase == "waiver":
+            count += len(fmt.development.slots)
+        return count
+
+    @timed("get_next_state")
     def get_next_state(self, idx, direction, current_round):
-        """2巡目以降の蛇行指名（スネーク）制御"""
-        team_ids = self.session.get("teams", [])
-        finished_teams = self.session.get("finished_teams", [])
-        
-        if len(finished_teams) >= len(team_ids) or current_round > 12:
+        """いまの段階の次の指名枠（指名枠は形式ごとに engine.PickSchedule で組み立て済み）。段階の最後なら None"""
+        draft = self.draft
+        schedule = self.format.schedule(draft.phase)
+        slot = schedule.next_slot(current_round, idx, team_mask(draft.team_ids, draft.finished_teams))
+        if slot is None:
             return None
-
-        # 指名可能なチームを探すループ
-        for _ in range(len(team_ids) * 2): # 折り返しを考慮して多めに回す
-            idx += direction
-
-            # リストの右端（1位）を超えた場合
-            if idx >= len(team_ids):
-                current_round += 1
-                direction = -1      # 折り返して 1位 -> 12位へ
-                idx = len(team_ids) - 1
-            # リストの左端（12位）を超えた場合
-            elif idx < 0:
-                current_round += 1
-                direction = 1       # 折り返して 12位 -> 1位へ
-                idx = 0
-
-            if current_round > 12:
-                return None
-
-            # 指名終了していないチームが見つかったら即座に返す
-            if team_ids[idx] not in finished_teams:
-                return {
-                    "current_team_index": idx,
-                    "direction": direction,
-                    "current_round": current_round
-                }
-        return None
\ No newline at end of file
+        rnd, idx = slot
+        return {
+            "current_team_index": idx,
+            "direction": schedule.direction(rnd),
+            "current_round": rnd,
+        }
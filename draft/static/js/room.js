@@ -0,0 +1,137 @@
+// room.html 用
+// WebSocket でドラフトルームにつなぎ、サーバーから届いた変化分（delta）を画面に反映する。
+// 接続直後に届く snapshot には指名済みの選手がすべて入っているので、途中参加・再接続でも同じ処理で追いつける。
+// 席のない観戦者は WebSocket ではなく読み取り専用の SSE（draft_stream）で受け取る。
+(function () {
+    const root = document.querySelector('.room-container');
+    if (!root) return;
+
+    const seatTeamId = Number(root.dataset.seatTeamId) || null;
+    const status = document.getElementById('connectionStatus');
+    const pickForm = document.getElementById('roomPickForm');
+    const skipButton = document.getElementById('roomSkip');
+    let socket = null;
+    let retry = 1000;
+
+    function closeModal() {
+        const modal = document.getElementById('playerModal');
+        if (!modal) return;
+        modal.style.display = 'none';
+        document.body.style.overflow = 'auto';
+    }
+
+    function addPick(pick) {
+        // 接続直後は snapshot と delta が重なることがあるので、表示済みの指名は飛ばす
+        if (document.querySelector(`.pick-item[data-player-id="${pick.player_id}"]`)) return;
+        const list = document.querySelector(`#team-${pick.team_id} .picks-display`);
+        const empty = list.querySelector('.text-muted');
+        if (empty) empty.remove();
+
+        const item = document.createElement('div');
+        item.className = 'pick-item';
+        item.dataset.playerId = pick.player_id;
+        item.append(`${list.querySelectorAll('.pick-item').length + 1}位：`);
+        const name = document.createElement('strong');
+        name.textContent = pick.player_name;
+        item.append(name);
+        list.append(item);
+
+        const input = document.querySelector(`#playerList input[value="${pick.player_id}"]`);
+        if (input) input.closest('.player-card').remove();
+    }
+
+    function updateTurn(delta) {
+        document.querySelectorAll('.team-card').forEach(card => {
+            const teamId = Number(card.id.replace('team-', ''));
+            const firstRound = delta.phase === '1st_round';
+            const active = firstRound
+                ? delta.pending_team_ids.indexOf(teamId) >= 0 && delta.bid_team_ids.indexOf(teamId) < 0
+                : teamId === delta.current_team_id;
+            card.classList.toggle('active', delta.phase !== 'finished' && active);
+            card.querySelector('.bid-status').hidden = !(firstRound && delta.bid_team_ids.indexOf(teamId) >= 0);
+        });
+
+        const footer = document.querySelector('.card-footer');
+        if (!footer) return;
+        const myCard = document.getElementById(`team-${seatTeamId}`);
+        footer.hidden = !myCard.classList.contains('active');
+        skipButton.hidden = delta.phase === '1st_round';
+    }
+
+    function updateHeader(delta) {
+        const title = document.getElementById('draftTitle');
+        const progress = document.getElementById('draftProgress');
+        title.textContent = delta.round_label;
+        progress.hidden = delta.phase !== '1st_round';
+        progress.textContent = `進捗: ${delta.bids} / ${delta.bidders} 球団`;
+
+        const messages = document.getElementById('lotteryMessages');
+        messages.replaceChildren(...delta.lottery_messages.map(text => {
+            const li = document.createElement('li');
+            li.textContent = text;
+            return li;
+        }));
+    }
+
+    function applyDelta(delta) {
+        if (delta.event === 'error') {
+            alert(delta.error);
+            return;
+        }
+        delta.picks.forEach(addPick);
+        updateTurn(delta);
+        updateHeader(delta);
+    }
+
+    function send(message) {
+        if (socket && socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify(message));
+    }
+
+    function connect() {
+        const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+        socket = new WebSocket(`${scheme}://${location.host}${root.dataset.wsPath}`);
+        socket.onopen = () => {
+            retry = 1000;
+            status.textContent = '';
+        };
+        socket.onmessage = event => applyDelta(JSON.parse(event.data));
+        socket.onclose = () => {
+            // 切れたらつなぎ直す（つなぎ直すと snapshot から復帰する）
+            status.textContent = '（再接続中…）';
+            setTimeout(connect, retry);
+            retry = Math.min(retry * 2, 30000);
+        };
+    }
+
+    function watch() {
+        // EventSource は切れると自動でつなぎ直し、Last-Event-ID で続きから受け取る
+        const source = new EventSource(root.dataset.streamUrl);
+        source.onopen = () => { status.textContent = ''; };
+        source.onerror = () => { status.textContent = '（再接続中…）'; };
+        ['snapshot', 'bid', 'lottery', 'pick', 'skip'].forEach(name => {
+            source.addEventListener(name, event => applyDelta(JSON.parse(event.data)));
+        });
+    }
+
+    if (pickForm) {
+        pickForm.addEventListener('submit', event => {
+            event.preventDefault();
+            const checked = pickForm.querySelector('input[name="player_id"]:checked');
+            if (!checked) return;
+            send({ action: 'pick', player_id: Number(checked.value) });
+            pickForm.reset();
+            closeModal();
+        });
+    }
+    if (skipButton) {
+        skipButton.addEventListener('click', () => {
+            if (confirm('指名を終了（選択終了）しますか？')) send({ action: 'skip' });
+        });
+    }
+
+    if (seatTeamId && window.WebSocket) {
+        connect();
+    } else if (window.EventSource) {
+        watch();
+    }
+})();
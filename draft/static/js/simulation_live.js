@@ -0,0 +1,95 @@
+// simulation_play.html 用
+// 指名・パスを JSON API（api_pick / api_skip）で送り、返ってきた変化分だけを画面に反映する。
+// ページ全体の再読み込みはしない。
+(function () {
+    const root = document.querySelector('.simulation-container');
+    const pickForm = document.querySelector('#playerModal form');
+    if (!root || !pickForm || !window.fetch) return;
+
+    function closeModal() {
+        document.getElementById('playerModal').style.display = 'none';
+        document.body.style.overflow = 'auto';
+    }
+
+    function post(url, form) {
+        return fetch(url, { method: 'POST', body: new FormData(form) })
+            .then(res => res.json().then(data => {
+                if (!res.ok) throw new Error(data.error || '通信に失敗しました');
+                return data;
+            }));
+    }
+
+    function addPick(pick) {
+        const list = document.querySelector(`#team-${pick.team_id} .picks-display`);
+        const empty = list.querySelector('.text-muted');
+        if (empty) empty.remove();
+
+        const item = document.createElement('div');
+        item.className = 'pick-item';
+        item.append(`${list.querySelectorAll('.pick-item').length + 1}位：`);
+        const name = document.createElement('strong');
+        name.textContent = pick.player_name;
+        item.append(name);
+        list.append(item);
+
+        // 指名された選手は候補リストから外す
+        const input = document.querySelector(`#playerList input[value="${pick.player_id}"]`);
+        if (input) input.closest('.player-card').remove();
+    }
+
+    function moveTurn(delta) {
+        const footer = document.querySelector('.team-card .card-footer');
+        document.querySelectorAll('.team-card.active').forEach(card => card.classList.remove('active'));
+        const next = document.getElementById(`team-${delta.current_team_id}`);
+        next.classList.add('active');
+        next.insertBefore(footer, next.querySelector('.team-line-bottom'));
+        footer.querySelector('.skip-form').hidden = delta.phase === '1st_round';
+        document.getElementById('modalTeamName').textContent = delta.current_team_name;
+        // 送信する手番の球団（サーバーはこの球団の手番でなければ受け付けない）
+        document.querySelectorAll('.turn-team').forEach(input => { input.value = delta.current_team_id; });
+    }
+
+    function updateHeader(delta) {
+        const title = document.getElementById('draftTitle');
+        const progress = document.getElementById('draftProgress');
+        title.textContent = delta.round_label;
+        progress.hidden = delta.phase !== '1st_round';
+        progress.textContent = `進捗: ${delta.bids} / ${delta.bidders} 球団`;
+
+        const messages = document.getElementById('lotteryMessages');
+        messages.replaceChildren(...delta.lottery_messages.map(text => {
+            const li = document.createElement('li');
+            li.textContent = text;
+            return li;
+        }));
+    }
+
+    function applyDelta(delta) {
+        if (delta.result_url) {
+            location.href = delta.result_url;
+            return;
+        }
+        delta.picks.forEach(addPick);
+        moveTurn(delta);
+        updateHeader(delta);
+    }
+
+    pickForm.addEventListener('submit', event => {
+        event.preventDefault();
+        if (!pickForm.querySelector('input[name="player_id"]:checked')) return;
+        post(root.dataset.pickUrl, pickForm)
+            .then(delta => {
+                pickForm.reset();
+                closeModal();
+                applyDelta(delta);
+            })
+            .catch(err => alert(err.message));
+    });
+
+    document.querySelector('.draft-grid').addEventListener('submit', event => {
+        const form = event.target.closest('.skip-form');
+        if (!form) return;
+        event.preventDefault();
+        post(root.dataset.skipUrl, form).then(applyDelta).catch(err => alert(err.message));
+    });
+})();
@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from fractions import Fraction
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, Client, LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .adp import availability_by_round, likely_gone_round, record_drafts
+from .benchmark import CASES, Scale, compare, run_benchmarks
+from .consumers import apply_action, websocket_application
+from .engine import (
+    FIXED, BestAvailablePolicy, DraftEngine, DraftFormat, PoolPlayer, PoolTeam, compile_format, get_policy,
+    run_drafts,
+)
+from . import exports
+from .exports import stream_export
+from .imports import MAX_ATTEMPTS, claim_job, create_job, run_job
+from .loaders import diff_players, load_comments_csv, load_players
+from .loadtest import run_load
+from .metrics import DB_LATENCY, DB_QUERIES
+from .models import Comment, Draft, DraftSeat, ImportJob, Pick, Player, PlayerADP, PlayerRating, Team
+from .odds import OddsTooComplex, _odds, lottery_odds
+from .querybudget import QueryBudgetExceeded, enforce_query_budgets, query_budget
+from .ratings import rating_summary, rebuild_ratings
+from .realtime import InProcessBroadcaster
+from .results import ResultFileError, ResultReader, ResultWriter
+from .search import matching_player_ids
+from .simulation import DraftError, DraftManager
+from .views import PAGE_SIZE, draft_stream
+
+
+async def asgi_get(path, query_string=b"", cookies=None, on_body=None):
+    """draftproject.asgi.application に GET を1回送り、(ステータス, 本文) を返す
+
+    on_body を渡すと、本文のチャンクが届くたびに on_body(chunk) を呼ぶ。
+    """
+    from draftproject.asgi import application
+
+    headers = [(b"host", b"testserver")]
+    if cookies:
+        headers.append((b"cookie", "; ".join(f"{k}={v}" for k, v in cookies.items()).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query_string, "root_path": "",
+        "headers": headers, "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    requested = False
+    never = asyncio.Event()
+    status, body = None, []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await never.wait()  # 切断はしない
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message.get("body"):
+            body.append(message["body"])
+            if on_body:
+                await sync_to_async(on_body)(message["body"])
+
+    await application(scope, receive, send)
+    return status, b"".join(body)
+
+
+def make_pool(n_players=40, n_teams=4):
+    players = [PoolPlayer(i, f"選手{i:03d}", score=float(n_players - i)) for i in range(1, n_players + 1)]
+    teams = [PoolTeam(100 + i, f"球団{i}", order=i) for i in range(1, n_teams + 1)]
+    return players, teams
+
+
+class DraftEngineTests(TestCase):
+    def test_best_available_runs_snake_order(self):
+        players, teams = make_pool()
+        result = DraftEngine(players, teams, BestAvailablePolicy(max_picks=3)).run(random.Random(0))
+
+        # 1巡目は全球団が同じ選手に入札するので、外れ1位を含めて抽選が3回起きる
+        self.assertEqual([len(t_ids) for _, t_ids, _ in result.lotteries], [4, 3, 2])
+        self.assertEqual(sorted(p_ids[0] for p_ids in result.picks.values()), [1, 2, 3, 4])
+        # 2巡目は order 降順（104, 103, 102, 101）、3巡目で折り返す
+        self.assertEqual(
+            [t_id for rnd, t_id, _ in result.order if rnd > 1],
+            [104, 103, 102, 101] + [101, 102, 103, 104],
+        )
+        self.assertTrue(all(len(p_ids) == 3 for p_ids in result.picks.values()))
+
+    def test_run_drafts_is_reproducible_with_seed(self):
+        players, teams = make_pool()
+        a = run_drafts(players, teams, 60, seed=7, workers=1, chunk_size=20)
+        b = run_drafts(players, teams, 60, seed=7, workers=2, chunk_size=20)
+        self.assertEqual(a.drafts, 60)
+        self.assertEqual(a.to_dict(), b.to_dict())
+
+    def test_results_file_records_every_pick(self):
+        players, teams = make_pool()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.bin")
+            summary = run_drafts(players, teams, 30, seed=1, workers=2, chunk_size=10, results_path=path)
+            # 追記すると、ドラフト番号は続きから振られる
+            more = run_drafts(players, teams, 5, seed=2, workers=1, results_path=path)
+
+            with ResultReader(path) as reader:
+                self.assertEqual(len(reader), sum(summary.drafted.values()) + sum(more.drafted.values()))
+                self.assertEqual(reader.next_draft(), 35)
+                first = reader[0]
+                self.assertEqual((first.pick, first.round), (1, 1))
+                self.assertIn(first.team_id, [t.id for t in teams])
+                self.assertEqual(len(reader[10:20]), 10)
+
+                arr = reader.to_numpy()
+                self.assertEqual(sorted(set(arr["draft"].tolist())), list(range(35)))
+                counts = Counter(np.asarray(reader.player_ids)[arr["player"][arr["draft"] < 30]].tolist())
+                self.assertEqual(counts, summary.drafted)
+                del arr
+
+            # 選手が違うプールは同じファイルに追記できない
+            with self.assertRaises(ResultFileError):
+                run_drafts(players[:-1], teams, 1, workers=1, results_path=path)
+
+    def test_concurrent_runs_get_separate_draft_numbers(self):
+        players, teams = make_pool()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.bin")
+            # まだないファイルを、同時に作って追記する4つの実行
+            with ProcessPoolExecutor(max_workers=4) as pool:
+                futures = [
+                    pool.submit(run_drafts, players, teams, 6, seed=seed, workers=1, chunk_size=2, results_path=path)
+                    for seed in range(4)
+                ]
+                for future in futures:
+                    future.result()
+
+            with ResultReader(path) as reader:
+                self.assertEqual(reader.next_draft(), 24)
+                arr = reader.to_numpy()
+                self.assertEqual(sorted(set(arr["draft"].tolist())), list(range(24)))
+                # どのドラフト番号も1つの実行だけが使い、指名順は 1, 2, ... と1回ずつ
+                for draft in range(24):
+                    picks = sorted(arr["pick"][arr["draft"] == draft].tolist())
+                    self.assertEqual(picks, list(range(1, len(picks) + 1)))
+                del arr
+
+    def test_late_creator_does_not_truncate_the_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.bin")
+            first = ResultWriter.create(path, [1, 2], [10])
+            self.assertEqual(first.reserve(3), 0)
+            first.add(0, 1, 1, 10, 2)
+            first.close()
+            # 先に「ファイルはまだない」と見た別の実行が、あとから作りにくる
+            with mock.patch("os.path.exists", return_value=False):
+                second = ResultWriter.create(path, [1, 2], [10])
+            self.assertEqual(second.reserve(2), 3)
+            with ResultReader(path) as reader:
+                self.assertEqual((len(reader), reader.next_draft()), (1, 5))
+
+    def test_fixed_order_format_with_development_rounds(self):
+        players, teams = make_pool(n_players=60, n_teams=3)
+        fmt = DraftFormat(rounds=4, order=FIXED, development_rounds=2)
+        result = DraftEngine(players, teams, BestAvailablePolicy(), draft_format=fmt).run(random.Random(0))
+
+        rounds = [rnd for rnd, _, _ in result.order]
+        self.assertEqual(sorted(set(rounds)), [1, 2, 3, 4, 5, 6])
+        order = {rnd: [t for r, t, _ in result.order if r == rnd] for rnd in range(2, 7)}
+        # 本指名は毎巡 12位（order の大きい球団）から同じ順番、育成指名は折り返し
+        self.assertEqual([order[2], order[3], order[4]], [[103, 102, 101]] * 3)
+        self.assertEqual([order[5], order[6]], [[103, 102, 101], [101, 102, 103]])
+        # 組み立てた指名枠は形式・球団数ごとに使い回す
+        self.assertIs(compile_format(fmt, 3), compile_format(DraftFormat(rounds=4, order=FIXED, development_rounds=2), 3))
+
+    def test_auto_policy_fills_positional_needs(self):
+        # 評価は投手が上だが、投手ばかり続けば捕手・野手の不足分が上回る
+        players = [
+            PoolPlayer(i, f"選手{i:03d}", position="P" if i <= 20 else ["C", "IF", "OF"][i % 3],
+                       score=4.0 if i <= 20 else 3.5, ratings=(4.0,) * 9)
+            for i in range(1, 41)
+        ]
+        teams = [PoolTeam(100 + i, f"球団{i}", order=i) for i in range(1, 3)]
+        result = DraftEngine(players, teams, get_policy("auto", max_picks=6)).run(random.Random(0))
+
+        positions = {p.id: p.position for p in players}
+        for picks in result.picks.values():
+            self.assertEqual(len(picks), 6)
+            self.assertEqual(positions[picks[0]], "P")
+            self.assertGreater(len({positions[p] for p in picks}), 2)
+
+
+def reference_next_state(team_ids, finished_teams, idx, direction, current_round, max_rounds=12):
+    """PickSchedule 導入前の get_next_state（1つずつ進めて探すループ）。比較用"""
+    if len(finished_teams) >= len(team_ids) or current_round > max_rounds:
+        return None
+    for _ in range(len(team_ids) * 2):
+        idx += direction
+        if idx >= len(team_ids):
+            current_round += 1
+            direction = -1
+            idx = len(team_ids) - 1
+        elif idx < 0:
+            current_round += 1
+            direction = 1
+            idx = 0
+        if current_round > max_rounds:
+            return None
+        if team_ids[idx] not in finished_teams:
+            return {"current_team_index": idx, "direction": direction, "current_round": current_round}
+    return None
+
+
+class PickScheduleTests(TestCase):
+    def test_matches_reference_search_loop(self):
+        rng = random.Random(2024)
+        for _ in range(3000):
+            n = rng.randint(1, 12)
+            max_rounds = rng.randint(2, 14)
+            team_ids = rng.sample(range(1, 100), n)
+            finished = [t_id for t_id in team_ids if rng.random() < 0.3]
+            rnd = rng.randint(2, max_rounds + 1)
+            idx = rng.randrange(n)
+            direction = 1 if rnd % 2 == 0 else -1
+            args = (team_ids, finished, idx, direction, rnd, max_rounds)
+            # 画面の進行と同じ DraftManager.get_next_state を、その巡目数の形式で確かめる
+            manager = DraftManager(Draft(team_ids=team_ids, finished_teams=finished, phase="waiver"))
+            manager.format = compile_format(DraftFormat(rounds=max_rounds), n)
+            self.assertEqual(manager.get_next_state(idx, direction, rnd), reference_next_state(*args), args)
+
+    def test_remaining_counts_every_slot_left(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            n = rng.randint(1, 12)
+            schedule = compile_format(DraftFormat(), n).main
+            mask = rng.getrandbits(n) & ~(1 << rng.randrange(n))
+            rnd, idx = rng.choice(schedule.slots)
+            walked = 0
+            slot = (rnd, idx)
+            while slot is not None:
+                if not mask >> slot[1] & 1:
+                    walked += 1
+                slot = schedule.next_slot(*slot, mask)
+            self.assertEqual(schedule.remaining(rnd, idx, mask), walked)
+
+
+class SimulationQueryCountTests(TestCase):
+    """指名が進んでもページ表示のクエリ数が増えないこと（N+1 の再発防止）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            Team.objects.create(name=f"球団{i}", order=i + 1)
+        Player.objects.bulk_create(
+            Player(name=f"選手{i:03d}", category="HS", position="P", team="高校",
+                   bats_throws="R/R", height=180, weight=80)
+            for i in range(150)
+        )
+
+    def start_waiver(self, rounds):
+        """1巡目を終えて、各球団が rounds 人ずつ指名した状態のドラフトを作る"""
+        self.client.get(reverse("draft:simulation_start"))
+        draft = Draft.objects.get(id=self.client.session["draft_id"])
+        player_ids = iter(Player.objects.order_by("id").values_list("id", flat=True))
+        Pick.objects.bulk_create(
+            Pick(draft=draft, round=r, team_id=t_id, player_id=next(player_ids))
+            for r in range(1, rounds + 1) for t_id in draft.team_ids
+        )
+        Draft.objects.filter(id=draft.id).update(phase="waiver", current_round=rounds + 1, pending_teams=[])
+
+    def count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_picks(self):
+        for url_name in ("draft:simulation_play", "draft:simulation_result"):
+            self.start_waiver(rounds=1)
+            early = self.count_queries(url_name)
+            self.start_waiver(rounds=11)
+            late = self.count_queries(url_name)
+            self.assertEqual(early, late, url_name)
+            self.assertLessEqual(late, 6, url_name)
+
+
+class ResolveLotteryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teams = [Team.objects.create(name=f"球団{i}", order=i + 1) for i in range(4)]
+        cls.players = [
+            Player.objects.create(name=f"選手{i}", category="HS", position="P", team="高校",
+                                  bats_throws="R/R", height=180, weight=80)
+            for i in range(3)
+        ]
+
+    def make_draft(self):
+        t_ids = [t.id for t in self.teams]
+        a, b, c = (p.id for p in self.players)
+        return Draft.objects.create(
+            team_ids=t_ids,
+            pending_teams=t_ids,
+            current_bids={str(t_ids[0]): a, str(t_ids[1]): a, str(t_ids[2]): a, str(t_ids[3]): b},
+        )
+
+    def test_seeded_lottery_is_reproducible(self):
+        first, second = self.make_draft(), self.make_draft()
+        DraftManager(first, rng=random.Random(3)).resolve_lottery()
+        DraftManager(second, rng=random.Random(3)).resolve_lottery()
+        messages = first.lottery_messages
+        self.assertEqual(messages, second.lottery_messages)
+        self.assertEqual(
+            list(first.picks.order_by("id").values_list("team_id", "player_id")),
+            list(second.picks.order_by("id").values_list("team_id", "player_id")),
+        )
+
+        first.refresh_from_db()
+        self.assertEqual(len(first.pending_teams), 2)
+        self.assertEqual(first.current_bids, {})
+        self.assertEqual(first.picks.count(), 2)
+        self.assertIn(f"【確定】{self.teams[3].name}が{self.players[1].name}を単独指名！", messages)
+
+    def test_names_are_fetched_in_one_query(self):
+        manager = DraftManager(self.make_draft())
+        t_ids = [t.id for t in self.teams]
+        with self.assertNumQueries(1):
+            players, teams = manager._fetch_names([p.id for p in self.players], t_ids)
+        self.assertEqual(teams[t_ids[0]], "球団0")
+        self.assertEqual(players[self.players[2].id], "選手2")
+
+
+class LotteryOddsTests(TestCase):
+    def test_exact_odds_include_rebids(self):
+        # 球団1は選手10だけ、球団2は10と11に半々で入札する
+        odds = lottery_odds({1: {10: 1}, 2: {10: 1, 11: 1}}, exact=True)
+        self.assertEqual(odds[1]["players"], {10: Fraction(3, 4), None: Fraction(1, 4)})
+        self.assertEqual(odds[2]["players"], {11: Fraction(3, 4), 10: Fraction(1, 4)})
+        self.assertEqual(odds[2]["attempts"], {1: Fraction(3, 4), 2: Fraction(1, 4)})
+
+        # 3球団が同じ希望順なら、1回目・外れ1位・外れ外れ1位がそれぞれ 1/3
+        odds = lottery_odds({t: [1, 2] for t in (1, 2, 3)}, exact=True)
+        for t in (1, 2, 3):
+            self.assertEqual(odds[t]["attempts"], {n: Fraction(1, 3) for n in (1, 2, 3)})
+
+    def test_repeated_query_is_memoized(self):
+        bids = {t: list(range(1, 21)) for t in range(1, 13)}
+        lottery_odds(bids)
+        hits = _odds.cache_info().hits
+        odds = lottery_odds({str(t): ranking for t, ranking in bids.items()})
+        self.assertEqual(_odds.cache_info().hits, hits + 1)
+        self.assertAlmostEqual(odds[5]["attempts"][12], 1 / 12)
+
+    def test_api(self):
+        url = reverse("draft:api_lottery_odds")
+        response = self.client.post(url, {"bids": {"1": [7], "2": [7]}}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["odds"]["1"]["players"], {"7": 0.5, "null": 0.5})
+        response = self.client.post(url, {"bids": {"1": "7"}}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_oversized_weighted_model_is_rejected_quickly(self):
+        bids = {t: {p: 1 + (t * p) % 5 for p in range(1, 13)} for t in range(1, 13)}
+        started = time.perf_counter()
+        with self.assertRaises(OddsTooComplex):
+            lottery_odds(bids)
+        response = self.client.post(reverse("draft:api_lottery_odds"), {"bids": bids}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertLess(time.perf_counter() - started, 2)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = Player.objects.create(name="選手", category="HS", position="P", team="高校",
+                                           bats_throws="R/R", height=180, weight=80)
+
+    @enforce_query_budgets({"draft:detail": 0})
+    def test_over_budget_fails_with_stack(self):
+        with self.assertRaises(QueryBudgetExceeded) as cm:
+            self.client.get(reverse("draft:detail", args=[self.player.id]))
+        self.assertIn("draft:detail", str(cm.exception))
+        # どこから発行されたかが分かる
+        self.assertIn("draft/views.py", str(cm.exception))
+
+    @override_settings(DRAFT_QUERY_BUDGETS={"draft:detail": 0},
+                       MIDDLEWARE=[*settings.MIDDLEWARE, "draft.querybudget.QueryBudgetMiddleware"])
+    def test_over_budget_is_logged_outside_tests(self):
+        with self.assertLogs("draft.querybudget", "WARNING") as logs:
+            response = self.client.get(reverse("draft:detail", args=[self.player.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("クエリ予算超過", logs.output[0])
+
+    def test_query_budget_block(self):
+        with query_budget(queries=1) as recorder:
+            Player.objects.count()
+        self.assertEqual(recorder.count, 1)
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(queries=1):
+                for _ in range(2):
+                    Player.objects.get(id=self.player.id)
+
+
+class PlayerADPTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teams = [Team.objects.create(name=f"球団{i}", order=i + 1) for i in range(2)]
+        cls.players = [
+            Player.objects.create(name=f"選手{i}", category="HS", position="P", team="高校",
+                                  bats_throws="R/R", height=180, weight=80)
+            for i in range(3)
+        ]
+
+    def test_summaries_are_accumulated(self):
+        a, b, c = (p.id for p in self.players)
+        record_drafts("npb", 10, {a: {(1, 1): 8, (1, 2): 2}, b: {(1, 2): 2, (2, 3): 4}})
+        record_drafts("npb", 10, {a: {(1, 2): 10}})
+
+        row = PlayerADP.objects.get(player_id=a, draft_format="npb")
+        self.assertEqual((row.drafts, row.picked), (20, 20))
+        self.assertAlmostEqual(row.adp, 32 / 20)
+        self.assertEqual((row.p10, row.p50, row.p90), (1, 2, 2))
+
+        row = PlayerADP.objects.get(player_id=b, draft_format="npb")
+        self.assertEqual((row.drafts, row.picked, row.p90), (20, 6, 3))
+        # 巡目は記録した巡目で数える：2巡目の前に 20 回中 2 回、3巡目の前に 6 回指名されている
+        availability = availability_by_round(row)
+        self.assertEqual(len(availability), 12)
+        self.assertEqual(availability[:3], [("1巡目", 1.0), ("2巡目", 0.9), ("3巡目", 0.7)])
+        self.assertIsNone(likely_gone_round(row))
+        self.assertEqual(PlayerADP.objects.get(player_id=c, draft_format="npb").drafts, 20)
+
+    def test_formats_are_kept_apart(self):
+        a, b, c = (p.id for p in self.players)
+        record_drafts("npb", 4, {a: {(1, 1): 4}})
+        # 育成指名のある形式：本指名12巡の後の13巡目は「育成1巡目」
+        record_drafts("npb_development", 2, {c: {(13, 25): 2}})
+
+        self.assertEqual(PlayerADP.objects.get(player_id=c, draft_format="npb").picked, 0)
+        row = PlayerADP.objects.get(player_id=c, draft_format="npb_development")
+        self.assertEqual((row.drafts, row.picked), (2, 2))
+        availability = availability_by_round(row)
+        self.assertEqual(len(availability), 20)
+        self.assertEqual(availability[12], ("育成1巡目", 1.0))
+        self.assertEqual(likely_gone_round(row), "育成1巡目")
+
+        response = self.client.get(reverse("draft:detail", args=[c]))
+        self.assertContains(response, "予想指名順位", count=2)
+        self.assertContains(response, "育成1巡目のうちに")
+
+class DraftFlowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teams = [Team.objects.create(name=f"球団{i}", order=i + 1) for i in range(3)]
+        cls.players = [
+            Player.objects.create(name=f"選手{i}", category="HS", position="P", team="高校",
+                                  bats_throws="R/R", height=180, weight=80)
+            for i in range(12)
+        ]
+
+    def post(self, url_name, **data):
+        return self.client.post(reverse(url_name), data)
+
+    @enforce_query_budgets()
+    def test_full_draft_is_logged_as_picks(self):
+        self.client.get(reverse("draft:simulation_start"))
+        # セッションにはドラフトのIDだけを持つ
+        self.assertEqual([k for k in self.client.session.keys()], ["draft_id"])
+        draft = Draft.objects.get(id=self.client.session["draft_id"])
+
+        # 1巡目：3球団とも同じ選手に入札 → 外れた2球団は別々の選手に入札
+        for _ in range(3):
+            self.post("draft:pick_player", player_id=self.players[0].id)
+        for i in (1, 2):
+            self.post("draft:pick_player", player_id=self.players[i].id)
+        draft.refresh_from_db()
+        self.assertEqual(draft.phase, "waiver")
+        self.assertEqual(draft.picks.filter(round=1).count(), 3)
+
+        # 指名済みの選手は指名できない
+        self.post("draft:pick_player", player_id=self.players[0].id)
+        self.assertEqual(draft.picks.count(), 3)
+
+        self.post("draft:pick_player", player_id=self.players[3].id)
+        for _ in range(3):
+            self.post("draft:skip_team")
+        draft.refresh_from_db()
+        self.assertTrue(draft.is_finished)
+        self.assertEqual(draft.picks.count(), 4)
+
+        # 終わったドラフトは ADP の集計に足し込まれる（指名されなかった選手も drafts は増える）
+        adp = {row.player_id: row for row in PlayerADP.objects.all()}
+        self.assertEqual(len(adp), len(self.players))
+        self.assertEqual(adp[self.players[3].id].histogram, {"4": 1})
+        self.assertEqual(adp[self.players[3].id].rounds, {"2": 1})
+        self.assertEqual({row.draft_format for row in adp.values()}, {draft.draft_format})
+        self.assertEqual((adp[self.players[11].id].drafts, adp[self.players[11].id].picked), (1, 0))
+
+        response = self.client.get(reverse("draft:simulation_result"))
+        self.assertContains(response, "選手3")
+
+    def test_json_api_returns_only_the_delta(self):
+        self.client.get(reverse("draft:simulation_start"))
+        t_ids = [t.id for t in sorted(self.teams, key=lambda t: -t.order)]
+
+        data = self.post("draft:api_pick", player_id=self.players[0].id).json()
+        self.assertEqual((data["event"], data["bids"], data["picks"]), ("bid", 1, []))
+        self.assertEqual(data["current_team_id"], t_ids[1])
+
+        self.post("draft:api_pick", player_id=self.players[1].id)
+        data = self.post("draft:api_pick", player_id=self.players[2].id).json()
+        self.assertEqual(data["event"], "lottery")
+        self.assertEqual(data["phase"], "waiver")
+        self.assertEqual(len(data["lottery_messages"]), 3)
+        self.assertEqual({p["player_name"] for p in data["picks"]}, {"選手0", "選手1", "選手2"})
+
+        data = self.post("draft:api_pick", player_id=self.players[3].id).json()
+        self.assertEqual(data["picks"], [{
+            "round": 2, "team_id": t_ids[0], "player_id": self.players[3].id,
+            "player_name": "選手3", "team_name": self.teams[2].name,
+        }])
+        self.assertEqual(self.post("draft:api_pick", player_id=self.players[3].id).status_code, 409)
+
+        for _ in range(3):
+            data = self.post("draft:api_skip").json()
+        self.assertEqual(data["phase"], "finished")
+        self.assertEqual(data["result_url"], reverse("draft:simulation_result"))
+
+    def test_stale_double_submit_is_rejected_after_locking(self):
+        manager = DraftManager.start()
+        for i in range(3):
+            manager.submit(self.players[i].id)
+        team_id = manager.draft.current_team_id()
+
+        # 同じ手番の画面から2回送られた（どちらも指名前の状態を読んでいる）
+        first = DraftManager(Draft.objects.get(id=manager.draft.id))
+        second = DraftManager(Draft.objects.get(id=manager.draft.id))
+        first.submit(self.players[3].id, team_id=team_id)
+        with self.assertRaises(DraftError):
+            second.submit(self.players[4].id, team_id=team_id)
+        self.assertEqual(manager.draft.picks.filter(round=2).count(), 1)
+
+        # 最後のパスが2回届いても、終了して ADP に足し込むのは1回だけ
+        for _ in range(2):
+            DraftManager(Draft.objects.get(id=manager.draft.id)).skip()
+        stale = DraftManager(Draft.objects.get(id=manager.draft.id))
+        DraftManager(Draft.objects.get(id=manager.draft.id)).skip()
+        with self.assertRaises(DraftError):
+            stale.skip()
+        self.assertEqual(PlayerADP.objects.get(player=self.players[0]).drafts, 1)
+
+    def test_api_rejects_a_pick_for_a_team_whose_turn_has_passed(self):
+        self.client.get(reverse("draft:simulation_start"))
+        for i in range(3):
+            self.post("draft:api_pick", player_id=self.players[i].id)
+        team_id = Draft.objects.get().current_team_id()
+        self.assertEqual(self.post("draft:api_pick", player_id=self.players[3].id, team_id=team_id).status_code, 200)
+        response = self.post("draft:api_pick", player_id=self.players[4].id, team_id=team_id)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Draft.objects.get().picks.count(), 4)
+
+    def test_repeated_lottery_and_development_phase(self):
+        manager = DraftManager.start(draft_format="double_lottery")
+        draft = manager.draft
+        for i in range(3):
+            manager.submit(self.players[i].id)
+        # 2巡目も入札で決める
+        self.assertEqual((draft.phase, draft.current_round), ("1st_round", 2))
+        self.assertEqual(draft.pending_teams, draft.team_ids)
+        for i in range(3, 6):
+            manager.submit(self.players[i].id)
+        self.assertEqual((draft.phase, draft.current_round), ("waiver", 3))
+        self.assertEqual(draft.picks.filter(round=2).count(), 3)
+
+        manager = DraftManager.start(draft_format="npb_development")
+        draft = manager.draft
+        for i in range(3):
+            manager.submit(self.players[i].id)
+        # 本指名を全球団が終えると育成指名へ（指名終了はリセット）
+        for _ in range(3):
+            manager.skip()
+        self.assertEqual((draft.phase, draft.current_round, draft.finished_teams), ("development", 13, []))
+        delta = manager.submit(self.players[3].id)
+        self.assertEqual(delta["round_label"], "育成 第 1 巡目 指名開始")
+        self.assertEqual(delta["picks"][0]["round"], 13)
+        self.assertEqual(delta["picks_remaining"], 8 * 3 - 1)
+
+    def test_auto_draft_finishes_remaining_teams(self):
+        self.client.get(reverse("draft:simulation_start"))
+        self.post("draft:pick_player", player_id=self.players[5].id)
+        response = self.post("draft:auto_draft")
+        self.assertRedirects(response, reverse("draft:simulation_result"))
+
+        draft = Draft.objects.get(id=self.client.session["draft_id"])
+        self.assertTrue(draft.is_finished)
+        # 選手がいなくなるまで指名し、手動で入札した選手もそのまま残る
+        self.assertEqual(draft.picks.count(), len(self.players))
+        self.assertTrue(draft.picks.filter(round=1, player=self.players[5]).exists())
+
+    def test_draft_survives_logout(self):
+        user = User.objects.create_user("scout", password="pw")
+        self.client.force_login(user)
+        self.client.get(reverse("draft:simulation_start"))
+        draft_id = self.client.session["draft_id"]
+
+        self.client.logout()
+        self.client.force_login(user)
+        response = self.client.get(reverse("draft:simulation_play"))
+        self.assertEqual(response.context["draft"].id, draft_id)
+
+
+class FakeSocket:
+    """ASGI の websocket 接続を真似るテスト用のクライアント"""
+
+    def __init__(self, draft_id, session_key=None):
+        headers = [(b"host", b"testserver"), (b"origin", b"http://testserver")]
+        if session_key:
+            headers.append((b"cookie", f"sessionid={session_key}".encode()))
+        self.scope = {"type": "websocket", "path": f"/ws/draft/{draft_id}/", "headers": headers}
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.ensure_future(websocket_application(self.scope, self.incoming.get, self.outgoing.put))
+
+    async def accept(self):
+        await self.outgoing.get()  # websocket.accept
+        return await self.receive()
+
+    async def receive(self):
+        event = await asyncio.wait_for(self.outgoing.get(), 5)
+        return json.loads(event["text"])
+
+    def send(self, data):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect"})
+        await asyncio.wait_for(self.task, 5)
+
+
+class DraftRoomTests(TransactionTestCase):
+    """ドラフトルーム：席ごとの手番の確認と、WebSocket での配信"""
+
+    def setUp(self):
+        self.teams = [Team.objects.create(name=f"球団{i}", order=i + 1) for i in range(3)]
+        self.players = [
+            Player.objects.create(name=f"選手{i}", category="HS", position="P", team="高校",
+                                  bats_throws="R/R", height=180, weight=80)
+            for i in range(6)
+        ]
+        self.client.get(reverse("draft:room_start"))
+        self.draft = Draft.objects.latest("id")
+
+    def join(self, team):
+        seat = DraftSeat.objects.get(draft=self.draft, team=team)
+        self.client.get(reverse("draft:room_join", args=[seat.token]))
+        return self.client.session.session_key
+
+    def test_seats_bid_in_any_order_and_wait_for_their_turn(self):
+        first, second, last = self.draft.team_ids
+        apply_action(self.draft.id, last, {"action": "pick", "player_id": self.players[0].id})
+        with self.assertRaisesMessage(DraftError, "すでに入札"):
+            apply_action(self.draft.id, last, {"action": "pick", "player_id": self.players[1].id})
+        apply_action(self.draft.id, first, {"action": "pick", "player_id": self.players[1].id})
+        self.draft.refresh_from_db()
+        # 1台で操作する画面向けの「現在のチーム」は、まだ入札していない球団を指す
+        self.assertEqual(self.draft.current_team_id(), second)
+
+        apply_action(self.draft.id, second, {"action": "pick", "player_id": self.players[2].id})
+        self.draft.refresh_from_db()
+        self.assertEqual(self.draft.phase, "waiver")
+        # 2巡目以降は手番の球団だけ。席のない接続は観戦のみ
+        with self.assertRaisesMessage(DraftError, "手番ではありません"):
+            apply_action(self.draft.id, last, {"action": "skip"})
+        with self.assertRaisesMessage(DraftError, "観戦中"):
+            apply_action(self.draft.id, None, {"action": "skip"})
+
+    def test_bad_player_ids_and_deleted_drafts_are_draft_errors(self):
+        team = self.draft.team_ids[0]
+        for player_id in (1e30, -1, "x", None):
+            with self.assertRaisesMessage(DraftError, "player_id"):
+                apply_action(self.draft.id, team, {"action": "pick", "player_id": player_id})
+        with self.assertRaisesMessage(DraftError, "ドラフトが見つかりません"):
+            apply_action(self.draft.id + 1000, team, {"action": "skip"})
+
+    def test_unexpected_errors_are_reported_without_closing_the_socket(self):
+        session_key = self.join(Team.objects.get(id=self.draft.team_ids[0]))
+
+        async def scenario():
+            socket = FakeSocket(self.draft.id, session_key)
+            await socket.accept()
+            with mock.patch("draft.consumers.apply_action", side_effect=RuntimeError("boom")), \
+                    self.assertLogs("draft.consumers", "ERROR"):
+                socket.send({"action": "skip"})
+                self.assertEqual((await socket.receive())["event"], "error")
+            # 接続はそのまま使える
+            socket.send({"action": "pick", "player_id": self.players[0].id})
+            self.assertEqual((await socket.receive())["event"], "bid")
+            await socket.close()
+
+        async_to_sync(scenario)()
+
+    def test_changes_are_broadcast_to_everyone_in_the_room(self):
+        first = Team.objects.get(id=self.draft.team_ids[0])
+        session_key = self.join(first)
+
+        async def scenario():
+            player = FakeSocket(self.draft.id, session_key)
+            spectator = FakeSocket(self.draft.id)
+            hello = await player.accept()
+            self.assertEqual(hello["event"], "snapshot")
+            self.assertEqual(hello["seat_team_id"], first.id)
+            self.assertIsNone((await spectator.accept())["seat_team_id"])
+
+            # 観戦者の操作はエラーが本人にだけ返る
+            spectator.send({"action": "pick", "player_id": self.players[0].id})
+            self.assertEqual((await spectator.receive())["event"], "error")
+
+            player.send({"action": "pick", "player_id": self.players[0].id})
+            for socket in (player, spectator):
+                delta = await socket.receive()
+                self.assertEqual(delta["event"], "bid")
+                self.assertEqual(delta["bid_team_ids"], [first.id])
+            self.assertTrue(player.outgoing.empty())
+            await player.close()
+            await spectator.close()
+
+        async_to_sync(scenario)()
+
+    def test_cross_origin_connection_is_refused(self):
+        async def scenario():
+            socket = FakeSocket(self.draft.id)
+            socket.scope["headers"][1] = (b"origin", b"http://evil.example")
+            event = await asyncio.wait_for(socket.outgoing.get(), 5)
+            self.assertEqual(event, {"type": "websocket.close", "code": 4403})
+
+        async_to_sync(scenario)()
+
+
+class DraftStreamTests(TransactionTestCase):
+    """観戦用 SSE：全員で同じイベントを共有し、Last-Event-ID から再開できる"""
+
+    def test_resume_from_last_event_id(self):
+        async def scenario():
+            broadcaster = InProcessBroadcaster(history=3)
+            first = broadcaster.publish("c", {"event": "pick", "n": 1})
+            for n in range(2, 5):
+                broadcaster.publish("c", {"event": "pick", "n": n})
+
+            # 履歴に残っている分は続きから
+            sub = broadcaster.subscribe("c", f"{broadcaster.epoch}-2")
+            self.assertTrue(sub.resumed)
+            self.assertEqual([(await sub.get()).data["n"] for _ in range(2)], [3, 4])
+            # 古すぎる ID・別の起動の ID では再開できない（snapshot からやり直す）
+            self.assertFalse(broadcaster.subscribe("c", f"{broadcaster.epoch}-0").resumed)
+            self.assertTrue(broadcaster.subscribe("c", first.id).resumed)
+            self.assertFalse(broadcaster.subscribe("c", "other-4").resumed)
+
+            # 購読者が何人いても、同じイベントを同じバイト列で受け取る
+            event = broadcaster.publish("c", {"event": "pick", "n": 5})
+            self.assertIs(await sub.get(), event)
+            self.assertEqual(sub.last_event_id, f"{broadcaster.epoch}-4")
+
+        async_to_sync(scenario)()
+
+    def test_stream_sends_snapshot_then_events(self):
+        for i in range(2):
+            Team.objects.create(name=f"球団{i}", order=i + 1)
+        player = Player.objects.create(name="選手", category="HS", position="P", team="高校",
+                                       bats_throws="R/R", height=180, weight=80)
+        manager = DraftManager.start()
+
+        async def scenario():
+            request = AsyncRequestFactory().get(f"/room/{manager.draft.id}/stream/")
+            response = await draft_stream(request, manager.draft.id)
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            chunks = response.streaming_content
+            self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+            snapshot = (await anext(chunks)).decode()
+            self.assertIn("event: snapshot", snapshot)
+            last_id = snapshot.split("\n")[0].removeprefix("id: ")
+
+            await sync_to_async(manager.submit)(player.id)
+            event = (await anext(chunks)).decode()
+            self.assertIn("event: bid", event)
+            await chunks.aclose()
+
+            # 続きから再開すると snapshot は送らない
+            request = AsyncRequestFactory().get("/", headers={"Last-Event-ID": last_id})
+            chunks = (await draft_stream(request, manager.draft.id)).streaming_content
+            await anext(chunks)
+            self.assertIn("event: bid", (await anext(chunks)).decode())
+            await chunks.aclose()
+
+        async_to_sync(scenario)()
+
+
+class PlayerRatingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.player = Player.objects.create(name="投手A", category="HS", position="P", team="高校",
+                                            bats_throws="R/R", height=180, weight=80)
+
+    def snapshot(self):
+        return PlayerRating.objects.filter(player=self.player).values().first()
+
+    def test_incremental_updates_match_rebuild(self):
+        a = Comment.objects.create(player=self.player, text="a", rank="S", velocity=5, command=3)
+        b = Comment.objects.create(player=self.player, text="b", rank="B", velocity=4)
+        self.assertEqual(self.snapshot()["avg_rank"], 4.0)
+
+        b.rank = "D"
+        b.command = 2
+        b.save()
+        a.delete()
+        incremental = self.snapshot()
+        self.assertEqual(incremental["comment_count"], 1)
+        self.assertEqual(incremental["avg_rank"], 1.0)
+
+        rebuild_ratings()
+        rebuilt = self.snapshot()
+        # 作り直しても version は戻らない（古いキャッシュのキーを使わない）
+        self.assertGreater(rebuilt.pop("version"), incremental.pop("version"))
+        self.assertEqual(rebuilt, incremental)
+
+        b.delete()
+        self.assertEqual(self.snapshot()["comment_count"], 0)
+        self.assertIsNone(self.snapshot()["avg_rank"])
+
+    def load(self):
+        # detail と同じく、集計行は選手と一緒に読む
+        return Player.objects.select_related("rating").get(pk=self.player.pk)
+
+    def test_detail_summary_is_cached_per_version(self):
+        Comment.objects.create(player=self.player, text="a", rank="A", velocity=4)
+        self.assertEqual(rating_summary(self.load())["avg_rank"], "A")
+        player = self.load()
+        with self.assertNumQueries(0):
+            rating_summary(player)
+
+        # コミット時の後始末（キャッシュの削除）に頼らない：別のプロセスが書いた場合と同じ
+        Comment.objects.create(player=self.player, text="b", rank="S", velocity=5)
+        summary = rating_summary(self.load())
+        # 4.5 は simulation_play と同じく S 扱い
+        self.assertEqual(summary["avg_rank"], "S")
+        self.assertEqual(summary["averages"]["avg_velocity"], 4.5)
+        self.assertEqual(summary["comment_count"], 2)
+
+    def test_rebuild_keeps_the_version_of_players_without_comments(self):
+        comment = Comment.objects.create(player=self.player, text="a", rank="A", velocity=4)
+        self.assertEqual(rating_summary(self.load())["avg_rank"], "A")
+        comment.delete()
+        rebuild_ratings()
+        # コメントがなくなっても行は残り、version は戻らない
+        self.assertEqual((self.snapshot()["comment_count"], self.snapshot()["version"]), (0, 3))
+
+        Comment.objects.create(player=self.player, text="b", rank="D", velocity=1)
+        summary = rating_summary(self.load())
+        self.assertEqual((summary["avg_rank"], summary["comment_count"]), ("D", 1))
+
+    def test_summary_aggregates_comments_without_rating_row(self):
+        Comment.objects.create(player=self.player, text="a", rank="C", velocity=2)
+        Comment.objects.create(player=self.player, text="b", rank="B")
+        PlayerRating.objects.all().delete()
+        cache.clear()
+        with self.assertNumQueries(2):
+            summary = rating_summary(self.player)
+        self.assertEqual(summary["avg_rank"], "B")
+        self.assertEqual(summary["averages"]["avg_velocity"], 2.0)
+
+
+class LoadPlayersTests(TestCase):
+    CSV = (
+        "name,category,position,team,bats_throws,height,weight,introduction,scout_comment\n"
+        "投手A,HS,P,高校A,R/R,180,80,,\n"
+        "捕手B,UNIV,C,大学B,R/L,,75,紹介,\n"
+        "野手C,XX,OF,高校C,R/R,170,70,,\n"
+    )
+
+    def test_reload_updates_instead_of_duplicating(self):
+        stats = load_players(io.StringIO(self.CSV), chunk_size=2)
+        self.assertEqual((stats.created, stats.updated, stats.rejected), (2, 0, 1))
+        self.assertEqual(stats.errors[0][0], 4)
+
+        stats = load_players(io.StringIO(self.CSV.replace("180", "185")))
+        self.assertEqual((stats.created, stats.updated), (0, 2))
+        self.assertEqual(Player.objects.count(), 2)
+        self.assertEqual(Player.objects.get(name="投手A").height, 185)
+        self.assertEqual(Player.objects.get(name="捕手B").height, 0)
+
+    def test_reading_column_is_loaded_and_searchable(self):
+        csv_text = (
+            "name,category,position,team,bats_throws,height,weight,reading\n"
+            "佐藤幻瑛,UNIV,P,仙台大学,R/R,187,80,さとうげんえい\n"
+        )
+        load_players(io.StringIO(csv_text))
+        player = Player.objects.get(name="佐藤幻瑛")
+        self.assertEqual(player.reading, "さとうげんえい")
+        self.assertEqual([row["id"] for row in matching_player_ids("ゲンエイ")], [player.id])
+        # 読みだけを直した CSV は差分にも出る
+        diff = diff_players(io.StringIO(csv_text.replace("さとうげんえい", "さとう げんえい")))
+        self.assertEqual(diff.changed, [(("佐藤幻瑛", "仙台大学"), {"reading": ("さとうげんえい", "さとう げんえい")})])
+
+
+class ImportJobTests(TestCase):
+    CSV = LoadPlayersTests.CSV + "新人D,IND,IF,独立D,R/R,176,72,,\n"
+
+    def setUp(self):
+        load_players(io.StringIO(LoadPlayersTests.CSV))
+
+    def test_dry_run_diff_uses_one_query(self):
+        with self.assertNumQueries(1):
+            diff = diff_players(io.StringIO(self.CSV.replace("180", "185")))
+        self.assertEqual((diff.rows, diff.rejected, diff.unchanged), (4, 1, 1))
+        self.assertEqual(diff.new, [("新人D", "独立D")])
+        self.assertEqual(diff.changed, [(("投手A", "高校A"), {"height": (180, 185)})])
+        self.assertEqual(diff.missing, [])
+
+    @override_settings(DRAFT_IMPORT_SPAWN_WORKER=False)
+    def test_admin_upload_is_processed_by_worker(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        upload = io.BytesIO(self.CSV.encode())
+        upload.name = "players.csv"
+        response = self.client.post(reverse("admin:draft_player_background_import"), {"csv_file": upload, "dry_run": "on"})
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse("admin:draft_player_import_job", args=[job.pk]))
+        self.assertEqual((job.status, job.total_rows), ("pending", 4))
+
+        call_command("run_import_jobs", stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.diff["counts"]["new"]), ("done", 1))
+        self.assertEqual(Player.objects.count(), 2)
+        self.assertContains(self.client.get(reverse("admin:draft_player_import_job", args=[job.pk])), "新人D")
+
+        # 確認した CSV をそのまま取り込む
+        self.client.post(reverse("admin:draft_player_import_job_apply", args=[job.pk]))
+        applied = run_job(claim_job())
+        self.assertEqual((applied.status, applied.progress), ("done", 100))
+        self.assertEqual((applied.created_count, applied.updated_count, applied.rejected_count), (1, 2, 1))
+        self.assertEqual(applied.errors, [[4, "category の値が不正です: 'XX'"]])
+        self.assertIsNone(claim_job())
+
+    def test_stalled_job_is_reclaimed(self):
+        job = create_job(self.CSV, spawn=False)
+        lost = claim_job()
+        self.assertIsNone(claim_job())
+        # ワーカーが止まって、進捗が DRAFT_IMPORT_STALE_SECONDS より長く更新されていない
+        stalled_at = timezone.now() - timedelta(seconds=settings.DRAFT_IMPORT_STALE_SECONDS + 1)
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=stalled_at)
+
+        retry = claim_job()
+        self.assertEqual((retry.pk, retry.attempts), (job.pk, 2))
+        # 止まっていたワーカーが動き出しても、取り直された後は何も書かない
+        run_job(lost)
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, "running")
+        self.assertEqual(run_job(retry).status, "done")
+
+        # 何度取り直しても止まるジョブは失敗にする
+        ImportJob.objects.filter(pk=job.pk).update(status="running", attempts=MAX_ATTEMPTS, heartbeat_at=stalled_at)
+        self.assertIsNone(claim_job())
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, "failed")
+
+    @override_settings(DRAFT_IMPORT_SPAWN_WORKER=False)
+    def test_apply_requires_a_finished_dry_run_and_change_permission(self):
+        job = run_job(claim_job(create_job(self.CSV, dry_run=True, spawn=False).pk))
+        page = reverse("admin:draft_player_import_job", args=[job.pk])
+        staff = User.objects.create_user("staff", is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename="add_player"))
+        self.client.force_login(staff)
+        # 追加の権限だけでは、既存の選手を上書きする取り込みはできない
+        self.assertNotContains(self.client.get(page), "このCSVを取り込む")
+        self.client.post(reverse("admin:draft_player_import_job_apply", args=[job.pk]))
+        self.assertEqual(ImportJob.objects.count(), 1)
+
+        staff.user_permissions.add(Permission.objects.get(codename="change_player"))
+        self.assertContains(self.client.get(page), "このCSVを取り込む")
+        # 差分の確認がまだ終わっていないジョブからは取り込めない
+        pending = create_job(self.CSV, dry_run=True, spawn=False)
+        self.client.post(reverse("admin:draft_player_import_job_apply", args=[pending.pk]))
+        self.assertEqual(ImportJob.objects.count(), 2)
+
+        self.client.post(reverse("admin:draft_player_import_job_apply", args=[job.pk]))
+        self.assertEqual(ImportJob.objects.filter(dry_run=False).count(), 1)
+
+
+class LoadCommentsTests(TestCase):
+    CSV = (
+        "player_id,name,team,text,rank,velocity,command,power\n"
+        "{p},,,速い,A,4.5,3,5\n"
+        ",野手B,大学B,長打,S,,,4.5\n"
+        "{p},,,制球難,B,6,,\n"
+        ",投手X,高校X,不明,A,,,\n"
+        "{p},,,まとまり,C,3,4,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pitcher = Player.objects.create(name="投手A", category="HS", position="P", team="高校A",
+                                            bats_throws="R/R", height=180, weight=80)
+        cls.batter = Player.objects.create(name="野手B", category="UNIV", position="OF", team="大学B",
+                                           bats_throws="L/L", height=175, weight=75)
+
+    def test_rows_are_validated_and_ratings_updated_once_per_player(self):
+        with CaptureQueriesContext(connection) as ctx:
+            stats = load_comments_csv(io.StringIO(self.CSV.format(p=self.pitcher.id)))
+        self.assertEqual((stats.created, stats.rejected), (3, 2))
+        self.assertEqual([line for line, _ in stats.errors], [4, 5])
+        # 投手の power・野手の velocity は画面のフォームと同じく無視される
+        self.assertIsNone(Comment.objects.get(text="速い").power)
+        self.assertEqual(Comment.objects.get(text="長打").power, Decimal("4.5"))
+        rating_updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "draft_playerrating"')]
+        self.assertEqual(len(rating_updates), 2)
+
+        # version は作り直すと増えるので比べない
+        totals = PlayerRating.objects.order_by("player_id").values(
+            *(f.attname for f in PlayerRating._meta.concrete_fields if f.name != "version")
+        )
+        incremental = list(totals)
+        rebuild_ratings()
+        self.assertEqual(list(totals.all()), incremental)
+        self.assertEqual(PlayerRating.objects.get(player=self.pitcher).comment_count, 2)
+
+    def test_api_requires_staff(self):
+        url = reverse("draft:api_comments_bulk")
+        body = {"comments": [{"player_id": self.batter.id, "text": "守備", "rank": "B", "defense": 5},
+                             {"player_id": self.batter.id, "text": "", "rank": "B"}]}
+        self.assertEqual(self.client.post(url, body, content_type="application/json").status_code, 403)
+
+        self.client.force_login(User.objects.create_user("scout", is_staff=True))
+        data = self.client.post(url, body, content_type="application/json").json()
+        self.assertEqual((data["created"], data["rejected"]), (1, 1))
+        self.assertEqual(data["errors"][0]["index"], 1)
+        self.assertEqual(PlayerRating.objects.get(player=self.batter).defense_sum, 5)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teams = [Team.objects.create(name=f"球団{i}", order=i + 1) for i in range(2)]
+        cls.players = [
+            Player.objects.create(name=f"選手{i}", category="HS", position="P", team="高校",
+                                  bats_throws="R/R", height=180, weight=80)
+            for i in range(3)
+        ]
+        Comment.objects.create(player=cls.players[0], text="速い, 重い", rank="A", velocity=4.5)
+        Comment.objects.create(player=cls.players[0], text="粗い", rank="C", velocity=3.5)
+        draft = Draft.objects.create(team_ids=[t.id for t in cls.teams], phase="finished")
+        Pick.objects.create(draft=draft, round=1, team=cls.teams[0], player=cls.players[1])
+        Pick.objects.create(draft=draft, round=1, team=cls.teams[1], player=cls.players[0])
+        Draft.objects.create(team_ids=[t.id for t in cls.teams])  # 進行中のドラフトは書き出さない
+
+    def rows(self, dataset, fmt="csv", compress=False):
+        data = b"".join(stream_export(dataset, fmt, compress))
+        if compress:
+            data = gzip.decompress(data)
+        text = data.decode()
+        return json.loads(text) if fmt == "json" else list(csv.DictReader(io.StringIO(text)))
+
+    def test_datasets(self):
+        comments = self.rows("comments")
+        self.assertEqual([c["text"] for c in comments], ["速い, 重い", "粗い"])
+        self.assertEqual(self.rows("comments", "json", compress=True)[0]["velocity"], 4.5)
+
+        players = {p["name"]: p for p in self.rows("players", "json")}
+        self.assertEqual(players["選手0"]["avg_velocity"], 4.0)
+        self.assertEqual((players["選手0"]["comment_count"], players["選手0"]["rank_label"]), (2, "B"))
+        self.assertEqual((players["選手2"]["comment_count"], players["選手2"]["rank_label"]), (0, "-"))
+
+        picks = self.rows("drafts", compress=True)
+        self.assertEqual([(p["overall_pick"], p["player_name"]) for p in picks], [("1", "選手1"), ("2", "選手0")])
+
+    def test_header_is_sent_before_rows_are_read(self):
+        chunks = stream_export("comments", compress=True)
+        with self.assertNumQueries(0):
+            first = next(chunks)
+        self.assertTrue(gzip.GzipFile(fileobj=io.BytesIO(first)).read1().startswith(b"id,player_id"))
+
+    def test_view_streams_for_staff_only(self):
+        url = reverse("draft:export_data", args=["players"])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        response = self.client.get(url, {"format": "json", "gzip": "1"})
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="players.json.gz"', response["Content-Disposition"])
+        self.assertEqual(len(json.loads(gzip.decompress(b"".join(response.streaming_content)))), 3)
+        self.assertEqual(self.client.get(url, {"format": "xml"}).status_code, 404)
+
+
+class ExportASGITests(TransactionTestCase):
+    def test_first_chunk_is_sent_before_rows_are_read(self):
+        player = Player.objects.create(name="選手", category="HS", position="P", team="高校",
+                                       bats_throws="R/R", height=180, weight=80)
+        Comment.objects.bulk_create(Comment(player=player, text=f"c{i}", rank="B") for i in range(50))
+        client = Client()
+        client.force_login(User.objects.create_user("staff", is_staff=True))
+
+        rows_read = []
+        comment_rows = exports.DATASETS["comments"][1]
+
+        def counting_rows():
+            for row in comment_rows():
+                rows_read.append(row[0])
+                yield row
+
+        first_chunk = []
+
+        def on_body(chunk):
+            if not first_chunk:
+                first_chunk.append((chunk, len(rows_read)))
+
+        with mock.patch.dict(exports.DATASETS, {"comments": (exports.DATASETS["comments"][0], counting_rows)}), \
+                mock.patch.object(exports, "BUFFER_BYTES", 64):
+            status, body = async_to_sync(asgi_get)(
+                "/export/comments/", cookies={"sessionid": client.cookies["sessionid"].value}, on_body=on_body,
+            )
+        self.assertEqual(status, 200)
+        # 同期のイテレータを list() にしてから送る場合は、ここで 50 行とも読み終わっている
+        self.assertTrue(first_chunk[0][0].startswith(b"id,player_id"))
+        self.assertEqual(first_chunk[0][1], 0)
+        self.assertEqual(len(rows_read), 50)
+        self.assertEqual(len(list(csv.reader(io.StringIO(body.decode())))), 51)
+
+
+class PlayerSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = Player.objects.create(name="佐藤幻瑛", category="UNIV", position="P", team="仙台大学",
+                                      bats_throws="R/R", height=187, weight=80, reading="さとうげんえい")
+        cls.b = Player.objects.create(name="山田太郎", category="HS", position="OF", team="横浜高校",
+                                      bats_throws="L/L", height=175, weight=70)
+
+    def search(self, q):
+        ids = set()
+        for tab in ("HS", "UNIV", "IND"):
+            response = self.client.get(reverse("draft:index"), {"q": q, "tab": tab})
+            ids |= {p.id for cat in response.context["categories"]
+                    for pos in cat["positions"] for p in pos["players"]}
+        return ids
+
+    def test_partial_and_kana_matches(self):
+        self.assertEqual(self.search("幻瑛"), {self.a.id})
+        self.assertEqual(self.search("横浜"), {self.b.id})
+        self.assertEqual(self.search("サトウ"), {self.a.id})
+        self.assertEqual(self.search("外野手"), {self.b.id})
+        self.assertEqual(self.search("大"), {self.a.id})
+        self.assertEqual(self.search("学大"), set())
+
+    def test_single_character_query_uses_the_index(self):
+        # 1文字の検索も索引（gram の一致）で絞り、選手テーブルを全件なめない
+        self.assertEqual(set(Player.objects.filter(id__in=matching_player_ids("瑛")).values_list("id", flat=True)),
+                         {self.a.id})
+        if connection.vendor != "sqlite":
+            return
+        sql, params = Player.objects.filter(id__in=matching_player_ids("大")).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = "\n".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("(gram=?)", plan)
+        self.assertNotIn("SCAN draft_player", plan)
+
+    def test_index_follows_player_updates(self):
+        self.b.team = "大阪桐蔭高校"
+        self.b.save()
+        self.assertEqual(self.search("横浜"), set())
+        self.assertEqual(self.search("桐蔭"), {self.b.id})
+
+
+class IndexPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Player.objects.bulk_create(
+            Player(name=f"選手{i:03d}", category="HS", position=pos, team="高校",
+                   bats_throws="R/R", height=180, weight=80)
+            for pos in ("OF", "P") for i in range(PAGE_SIZE + 5)
+        )
+        Player.objects.create(name="大学投手", category="UNIV", position="P", team="大学",
+                              bats_throws="R/R", height=180, weight=80)
+
+    def test_first_page_is_grouped_in_position_order(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("draft:index"))
+        hs, univ, ind = response.context["categories"]
+        self.assertEqual([pos["id"] for pos in hs["positions"]], ["P", "OF"])
+        self.assertEqual(len(hs["positions"][0]["players"]), PAGE_SIZE)
+        # 開いていないタブは読み込まない
+        self.assertFalse(univ["loaded"])
+        self.assertEqual(univ["positions"], [])
+
+    def test_keyset_pages_cover_every_player_once(self):
+        first = self.client.get(reverse("draft:index")).context["categories"][0]["positions"][0]
+        response = self.client.get(reverse("draft:index_players"), {
+            "category": "HS", "position": "P", "after": first["next_cursor"],
+        })
+        rest = response.context["pos_data"]
+        names = [p.name for p in first["players"]] + [p.name for p in rest["players"]]
+        self.assertEqual(names, [f"選手{i:03d}" for i in range(PAGE_SIZE + 5)])
+        self.assertIsNone(rest["next_cursor"])
+
+    def test_lazy_tab_and_bad_cursor(self):
+        response = self.client.get(reverse("draft:index_players"), {"category": "UNIV"})
+        self.assertContains(response, "大学投手")
+        response = self.client.get(reverse("draft:index_players"), {
+            "category": "HS", "position": "P", "after": "broken",
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class BenchmarkTests(TestCase):
+    def test_small_run_records_every_case(self):
+        result = run_benchmarks(Scale(players=60, comments=2, teams=4), repeat=1)
+        self.assertEqual(set(result["results"]), set(CASES))
+        self.assertEqual(Player.objects.count(), 60)
+        self.assertEqual(PlayerRating.objects.count(), 60)
+        self.assertGreater(result["results"]["pick_player"]["queries"], 0)
+        rows = compare(result, result)
+        self.assertEqual(len(rows), len(CASES))
+        self.assertTrue(all(queries == 0 for *_, queries in rows))
+
+
+class MetricsTests(TestCase):
+    def test_metrics_endpoint(self):
+        teams = [Team.objects.create(name=f"球団{i}", order=i + 1) for i in range(2)]
+        player = Player.objects.create(name="選手", category="HS", position="P", team="高校",
+                                       bats_throws="R/R", height=180, weight=80)
+        draft = Draft.objects.create(team_ids=[t.id for t in teams], pending_teams=[t.id for t in teams],
+                                     current_bids={str(t.id): player.id for t in teams})
+        DraftManager(draft).resolve_lottery()
+        self.client.get(reverse("draft:index"))
+
+        response = self.client.get(reverse("draft:metrics"))
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        body = response.content.decode()
+        self.assertIn('draft_http_requests_total{view="draft:index",method="GET",status="200"}', body)
+        self.assertIn('draft_template_render_seconds_count{template="draft/index.html"}', body)
+        self.assertIn('draft_operation_duration_seconds_count{operation="resolve_lottery"}', body)
+        self.assertIn("draft_active_drafts 1", body)
+
+        # ローカル以外からは読めない
+        self.assertEqual(self.client.get(reverse("draft:metrics"), REMOTE_ADDR="203.0.113.5").status_code, 403)
+
+
+class MetricsASGITests(TransactionTestCase):
+    def test_db_time_is_recorded_for_sync_views(self):
+        def db_queries():
+            return dict(DB_QUERIES._values).get(("draft:index",), 0)
+
+        def db_observations():
+            state = DB_LATENCY._values.get(("draft:index",))
+            return state[2] if state else 0
+
+        queries, observations = db_queries(), db_observations()
+        status, _ = async_to_sync(asgi_get)("/")
+        self.assertEqual(status, 200)
+        self.assertGreater(db_queries(), queries)
+        self.assertEqual(db_observations(), observations + 1)
+
+
+class LoadTestDriverTests(LiveServerTestCase):
+    def setUp(self):
+        for i in range(3):
+            Team.objects.create(name=f"球団{i}", order=i + 1)
+        for i in range(15):
+            Player.objects.create(name=f"選手{i}", category="HS", position="P", team="高校",
+                                  bats_throws="R/R", height=180, weight=80)
+
+    def test_users_finish_their_drafts(self):
+        # テスト用のインメモリDBはサーバーのスレッド間で接続を共有するので、同時アクセスはさせない
+        result = run_load(self.live_server_url, users=1, drafts_per_user=2, seed=0, max_rounds=3, hot=3)
+        self.assertEqual(result["errors"], 0, result["error_samples"])
+        self.assertEqual(result["drafts_completed"], 2)
+        self.assertEqual(Draft.objects.filter(phase="finished").count(), 2)
+        self.assertEqual(result["steps"]["simulation_result"]["requests"], 2)
+        self.assertGreaterEqual(result["steps"]["bid"]["requests"], 6)
+
+    def test_default_run_follows_the_draft_format_to_the_end(self):
+        for i in range(15, 40):
+            Player.objects.create(name=f"選手{i}", category="HS", position="P", team="高校",
+                                  bats_throws="R/R", height=180, weight=80)
+        result = run_load(self.live_server_url, users=1, seed=0, skip_rate=0, hot=3)
+        self.assertEqual(result["errors"], 0, result["error_samples"])
+        # 標準の形式は12巡：3球団 × 12巡 = 36人を指名してから終わる
+        draft = Draft.objects.get(phase="finished")
+        self.assertEqual(draft.picks.count(), 36)
+        self.assertEqual(draft.picks.order_by("-round").first().round, 12)
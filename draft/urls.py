@@ -5,12 +5,24 @@ app_name = 'draft'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('players/', views.index_players, name='index_players'),
     path('<int:pk>/', views.detail, name='detail'),
+    path('api/comments/bulk/', views.api_comments_bulk, name='api_comments_bulk'),
     path('simulation/', views.simulation_play, name='simulation_play'),
     path('simulation/start/', views.simulation_start, name='simulation_start'),
     path('simulation/pick/', views.pick_player, name='pick_player'),
     path('simulation/skip/', views.skip_team, name='skip_team'),
+    path('simulation/auto/', views.auto_draft, name='auto_draft'),
+    path('simulation/api/pick/', views.api_pick, name='api_pick'),
+    path('simulation/api/skip/', views.api_skip, name='api_skip'),
+    path('simulation/api/odds/', views.api_lottery_odds, name='api_lottery_odds'),
     path('simulation/result/', views.simulation_result, name='simulation_result'),
+    path('room/start/', views.room_start, name='room_start'),
+    path('room/<int:draft_id>/', views.draft_room, name='draft_room'),
+    path('room/join/<str:token>/', views.room_join, name='room_join'),
+    path('room/<int:draft_id>/stream/', views.draft_stream, name='draft_stream'),
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
+    path('metrics', views.metrics, name='metrics'),
    
 
 
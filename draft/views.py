@@ -1,13 +1,39 @@
+import asyncio
+import json
+from itertools import groupby
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Player, Team, Pick, Comment
-from django.db.models import Q, Avg, Case, When, IntegerField, Value, CharField, FloatField
-from .simulation import DraftManager
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from .models import Draft, DraftSeat, Player, Team
+from .odds import OddsTooComplex, lottery_odds
+from .adp import availability_by_round, likely_gone_round, with_adp
+from django.db.models import Q, F, Case, When, Value, IntegerField, Window
+from django.db.models.functions import RowNumber
+from .engine import DEFAULT_FORMAT, FORMATS
+from .simulation import DraftError, DraftManager
 from .forms import CommentForm
+from .loaders import load_comments
+from . import exports, metrics as draft_metrics
+from .ratings import display_rank, rating_summary
+from .realtime import SubscriptionClosed, draft_channel, get_broadcaster
+from .search import matching_player_ids
 
 # --- 1. 基本機能（一覧・詳細） ---
 
-def index(request):
-    q = request.GET.get('q', '')
+CATEGORY_ORDER = ['HS', 'UNIV', 'IND']
+POSITION_ORDER = ['P', 'C', 'IF', 'OF']
+PAGE_SIZE = 30
+
+
+def _search_players(q):
+    """検索語で絞り込んだ選手のクエリセット"""
     players = Player.objects.all()
 
     if q:
@@ -22,78 +48,140 @@ def index(request):
         pos_code = pos_map.get(q)
 
         # 2. クエリの組み立て
-        # 名前か所属にキーワードが含まれているか
-        query = Q(name__icontains=q) | Q(team__icontains=q)
+        # 名前・所属・読みにキーワードが含まれているか（n-gram 索引で引く）
+        query = Q(id__in=matching_player_ids(q))
 
         if pos_code:
             # 「外野手」と打たれたら、DBの「OF」を直接狙い撃ち
             query |= Q(position__iexact=pos_code)
         else:
-            # それ以外（"P"や"捕手"以外の文字など）は部分一致で検索
-            query |= Q(position__icontains=q)
+            # それ以外（"P"や"捕手"以外の文字など）はポジションのコードと部分一致で比べる
+            pos_codes = [code for code, _ in Player.POSITION_CHOICES if q.lower() in code.lower()]
+            if pos_codes:
+                query |= Q(position__in=pos_codes)
 
         # 3. 最後に一回だけフィルターをかける（上書きしない！）
         players = players.filter(query)
+    return players
+
+
+def _encode_cursor(player):
+    return urlsafe_base64_encode(json.dumps([player.name, player.id]).encode())
+
+
+def _decode_cursor(cursor):
+    """次ページの目印（名前, id）。壊れていれば ValueError"""
+    try:
+        name, player_id = json.loads(urlsafe_base64_decode(cursor))
+        return str(name), int(player_id)
+    except (TypeError, ValueError):
+        raise ValueError('不正なカーソルです')
+
+
+def _group_players(players, category):
+    """カテゴリ内をポジション順に並べ、各ポジションの先頭 PAGE_SIZE 人だけを1クエリで取る"""
+    rows = players.filter(category=category).annotate(
+        # ポジションごとに名前順で連番を振り、1ページ + 1人（次があるかの判定用）までに絞る
+        row_number=Window(
+            RowNumber(),
+            partition_by=[F('position')],
+            order_by=[F('name').asc(), F('id').asc()],
+        ),
+        position_rank=Case(
+            *[When(position=pos, then=Value(i)) for i, pos in enumerate(POSITION_ORDER)],
+            output_field=IntegerField(),
+        ),
+    ).filter(row_number__lte=PAGE_SIZE + 1).order_by('position_rank', 'name', 'id')
 
-    # 1. 表示したいカテゴリとポジションの順序を定義
-    category_order = ['HS', 'UNIV', 'IND']
-    position_order = ['P', 'C', 'IF', 'OF']
-
-    # 2. 辞書を初期化（これ自体には順序がないが、ループで使う際に制御する）
-    raw_data = {}
-    for p in players:
-        raw_data.setdefault(p.category, {})
-        raw_data[p.category].setdefault(p.position, [])
-        raw_data[p.category][p.position].append(p)
-
-    # 3. 定義した順序に従って、整理されたリストを作成する
-    grouped_list = []
-    for cat in category_order:
-        if cat in raw_data:
-            cat_data = {'id': cat, 'positions': []}
-            for pos in position_order:
-                if pos in raw_data[cat]:
-                    cat_data['positions'].append({
-                        'id': pos,
-                        'players': raw_data[cat][pos]
-                    })
-            grouped_list.append(cat_data)
+    positions = []
+    for pos, group in groupby(rows, key=lambda p: p.position):
+        positions.append(_page(pos, list(group)))
+    return positions
+
+
+def _page(position, players):
+    """PAGE_SIZE + 1 人まで取ったリストから、表示分と次ページのカーソルを作る"""
+    has_next = len(players) > PAGE_SIZE
+    players = players[:PAGE_SIZE]
+    return {
+        'id': position,
+        'players': players,
+        'next_cursor': _encode_cursor(players[-1]) if has_next else None,
+    }
+
+
+def index(request):
+    q = request.GET.get('q', '')
+    active = request.GET.get('tab', CATEGORY_ORDER[0])
+    if active not in CATEGORY_ORDER:
+        active = CATEGORY_ORDER[0]
+
+    # 最初に表示するタブだけを描画し、他のタブは開いたときに index_players で読み込む
+    categories = []
+    for cat in CATEGORY_ORDER:
+        categories.append({
+            'id': cat,
+            'loaded': cat == active,
+            'positions': _group_players(_search_players(q), cat) if cat == active else [],
+        })
 
     return render(request, 'draft/index.html', {
-        'grouped_list': grouped_list
+        'categories': categories,
+        'active': active,
+        'q': q,
     })
 
 
-def detail(request, pk):
-    player = get_object_or_404(Player, pk=pk)
-    all_comments = player.comments.all()
-
-    # 投稿された全コメントの平均値を計算
-    averages = all_comments.aggregate(
-        avg_velocity=Avg('velocity'),
-        avg_command=Avg('command'),
-        avg_breakingball=Avg('breakingball'),
-        avg_mechanics=Avg('mechanics'),
-        avg_batcontroll=Avg('batcontroll'),
-        avg_power=Avg('power'),
-        avg_speed=Avg('speed'),
-        avg_defense=Avg('defense'),
-        avg_potential=Avg('potential'),
-    )
+def index_players(request):
+    """一覧のタブ・「もっと見る」用の部分HTML
 
-    # --- 2. ランク（文字列）の平均計算 ---
-    rank_map = {'S': 5, 'A': 4, 'B': 3, 'C': 2, 'D': 1}
-    inv_rank_map = {v: k for k, v in rank_map.items()} # {5: 'S', 4: 'A', ...}
-    
-    avg_rank_display = "-" # コメントがない場合の初期値
-    
-    if all_comments.exists():
-        # 全コメントのランクを数値に変換して合計を出す
-        rank_values = [rank_map.get(c.rank, 0) for c in all_comments if c.rank in rank_map]
-        if rank_values:
-            avg_rank_num = sum(rank_values) / len(rank_values)
-            # 四捨五入して、一番近いランク文字に戻す（例: 4.2 -> 4 -> 'A'）
-            avg_rank_display = inv_rank_map.get(round(avg_rank_num), "-")
+    position なし: そのカテゴリの各ポジションの1ページ目
+    position あり: after（カーソル）より後の1ページ分の行
+    """
+    q = request.GET.get('q', '')
+    category = request.GET.get('category')
+    position = request.GET.get('position')
+    if category not in CATEGORY_ORDER or (position and position not in POSITION_ORDER):
+        return HttpResponseBadRequest('category または position が不正です')
+
+    players = _search_players(q)
+    if not position:
+        return render(request, 'draft/index_category.html', {
+            'category': {'id': category, 'positions': _group_players(players, category)},
+            'q': q,
+        })
+
+    players = players.filter(category=category, position=position)
+    if request.GET.get('after'):
+        try:
+            name, player_id = _decode_cursor(request.GET['after'])
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        # キーセット方式：（名前, id）がカーソルより後の選手
+        players = players.filter(Q(name__gt=name) | Q(name=name, id__gt=player_id))
+    page = _page(position, list(players.order_by('name', 'id')[:PAGE_SIZE + 1]))
+
+    return render(request, 'draft/index_rows.html', {
+        'category': {'id': category},
+        'pos_data': page,
+        'q': q,
+    })
+
+
+def detail(request, pk):
+    player = get_object_or_404(Player.objects.select_related('rating'), pk=pk)
+    # 評価の平均値と平均ランク（集計行の version ごとにキャッシュ。コメントが変わるとキーが変わる）
+    summary = rating_summary(player)
+    # 予想指名順位（ドラフト形式ごと。集計したドラフトが多い形式から）
+    adp_cards = [
+        {
+            'adp': adp,
+            'format_label': FORMATS[adp.draft_format].label,
+            'availability': availability_by_round(adp),
+            'gone_round': likely_gone_round(adp),
+        }
+        for adp in player.adp_rows.filter(drafts__gt=0, draft_format__in=FORMATS).order_by('-drafts')
+    ]
     
     if request.method == 'POST':
         form = CommentForm(request.POST, player=player)
@@ -108,171 +196,377 @@ def detail(request, pk):
     return render(request, 'draft/detail.html', {
         'player': player,
         'form': form, # テンプレートにフォームを渡す
-        'averages':averages, #平均データをテンプレートへ
-        'avg_rank': avg_rank_display, # 平均ランクを渡す
+        'averages': summary['averages'], #平均データをテンプレートへ
+        'avg_rank': summary['avg_rank'], # 平均ランクを渡す
+        'adp_cards': adp_cards,
     })
 
 # --- 2. シミュレーション制御（交通整理） ---
 
+def _current_draft(request):
+    """セッションの draft_id から進行中のドラフトを取得する
+
+    セッションが切れても、ログインしていれば自分の未完了のドラフトを再開できる。
+    """
+    draft_id = request.session.get("draft_id")
+    draft = Draft.objects.filter(id=draft_id).first() if draft_id else None
+    if draft is None and request.user.is_authenticated:
+        draft = request.user.drafts.exclude(phase="finished").order_by("-updated_at").first()
+        if draft is not None:
+            request.session["draft_id"] = draft.id
+    return draft
+
+def _picks_by_team(draft):
+    """{team_id: [Player, ...]}（指名順）を1クエリで作る"""
+    picks = {t_id: [] for t_id in draft.team_ids}
+    for pick in draft.picks.select_related("player").order_by("id"):
+        picks.setdefault(pick.team_id, []).append(pick.player)
+    return picks
+
+def _requested_format(request):
+    """?format= のドラフト形式（不明なら既定の形式）"""
+    name = request.GET.get("format", DEFAULT_FORMAT)
+    return name if name in FORMATS else DEFAULT_FORMAT
+
 def simulation_start(request):
     """初期化して1巡目から開始"""
-    request.session.flush()
-    teams = list(Team.objects.order_by("-order"))
-    t_ids = [t.id for t in teams]
-    
-    request.session.update({
-        "teams": t_ids,
-        "draft_picks": {str(tid): [] for tid in t_ids},
-        "finished_teams": [],
-        "draft_phase": "1st_round",
-        "pending_teams": t_ids,
-        "current_team_index": 0,
-        "current_bids": {},
-        "current_round": 1,
-        "direction": 1,
-        "lottery_messages": []
-    })
+    owner = request.user if request.user.is_authenticated else None
+    manager = DraftManager.start(owner=owner, draft_format=_requested_format(request))
+    # セッションにはドラフトのIDだけを持つ
+    request.session["draft_id"] = manager.draft.id
     return redirect("draft:simulation_play")
 
 def simulation_play(request):
     """指名画面の表示"""
-    if "teams" not in request.session:
+    draft = _current_draft(request)
+    if draft is None:
         return redirect("draft:simulation_start")
+    if draft.is_finished:
+        return redirect("draft:simulation_result")
+
+    # 球団と指名済み選手はまとめて取得し、id -> オブジェクトの辞書で引く
+    team_map = Team.objects.in_bulk(draft.team_ids)
+    picks_by_team = _picks_by_team(draft)
+    current_team = team_map[draft.current_team_id()]
 
-    phase = request.session.get("draft_phase")
-    draft_picks = request.session.get("draft_picks", {})
     # すでに指名が確定している選手を除外（1巡目の入札中の選手は除外しない）
-    picked_ids = [int(pid) for pids in draft_picks.values() for pid in pids]
-    
-    if phase == "1st_round":
-        pending_ids = request.session.get("pending_teams", [])
-        idx = request.session.get("current_team_index", 0)
-        current_team = Team.objects.get(id=pending_ids[idx])
-    else:
-        team_ids = request.session["teams"]
-        idx = request.session["current_team_index"]
-        current_team = Team.objects.get(id=team_ids[idx])
-
-    players = Player.objects.exclude(id__in=picked_ids).annotate(
-        # ランクを数値に置換して平均を出す
-        avg_rank_num=Avg(
-            Case(
-                When(comments__rank='S', then=Value(5.0)),
-                When(comments__rank='A', then=Value(4.0)),
-                When(comments__rank='B', then=Value(3.0)),
-                When(comments__rank='C', then=Value(2.0)),
-                When(comments__rank='D', then=Value(1.0)),
-                output_field=FloatField(),
-            )
-        )
+    # 予想指名順位はこのドラフトと同じ形式の集計を付ける
+    players = with_adp(Player.objects.exclude(id__in=draft.picks.values("player_id")), draft.draft_format).annotate(
+        # ランクの平均は集計テーブルの列をそのまま使う（Comment との JOIN はしない）
+        avg_rank_num=F('rating__avg_rank'),
     ).annotate(
         # 平均値に基づいてランク文字を決める
-        display_rank=Case(
-            When(avg_rank_num__gte=4.5, then=Value('S')),
-            When(avg_rank_num__gte=3.5, then=Value('A')),
-            When(avg_rank_num__gte=2.5, then=Value('B')),
-            When(avg_rank_num__gte=1.5, then=Value('C')),
-            When(avg_rank_num__gt=0, then=Value('D')),
-            default=Value('-'),
-            output_field=CharField(),
-        )
-    ).order_by('-avg_rank_num', 'name') # 高い順
+        display_rank=display_rank('avg_rank_num')
+    ).order_by(F('avg_rank_num').desc(nulls_last=True), 'name') # 高い順
 
     # 画面右側の指名リスト作成
     teams_with_picks = []
-    for tid in request.session["teams"]:
-        team_obj = Team.objects.get(id=tid)
-        p_ids = draft_picks.get(str(tid), [])
-        ordered_players = [Player.objects.get(id=pid) for pid in p_ids]
-        teams_with_picks.append({"name": team_obj.name, "first_color": team_obj.first_color, "second_color": team_obj.second_color, "picks": ordered_players})
+    for tid in draft.team_ids:
+        team_obj = team_map[tid]
+        teams_with_picks.append({"id": tid, "name": team_obj.name, "first_color": team_obj.first_color, "second_color": team_obj.second_color, "picks": picks_by_team[tid]})
 
     return render(request, "draft/simulation_play.html", {
+        "draft": draft,
+        "round_label": DraftManager(draft).format.round_label(draft.phase, draft.current_round),
         "team": current_team,
         "players": players,
         "teams": teams_with_picks,
-        "round": request.session.get("current_round"),
-        "lottery_messages": request.session.get("lottery_messages", [])
+        "round": draft.current_round,
+        "lottery_messages": draft.lottery_messages,
     })
 
 def resolve_lottery(request):
     """マネージャーを呼んで抽選を実行"""
-    manager = DraftManager(request.session)
-    results = manager.resolve_lottery()
-    for key, value in results.items():
-        request.session[key] = value
+    draft = _current_draft(request)
+    if draft is not None and draft.phase == "1st_round" and draft.current_bids:
+        manager = DraftManager(draft)
+        manager.publish(manager.delta("lottery", None, manager.resolve_lottery()))
     return redirect("draft:simulation_play")
 
+def _posted_team_id(request):
+    """画面が送ってきた「手番のはずの球団」（なければ None）。二重送信で次の球団の手番を使わないように、
+    DraftManager はロックを取った後でこの球団の手番かを確かめる"""
+    team_id = request.POST.get("team_id")
+    return int(team_id) if team_id else None
+
 def pick_player(request):
     """指名実行"""
     if request.method == "POST":
+        draft = _current_draft(request)
         player_id_raw = request.POST.get("player_id")
-        if not player_id_raw:
+        if draft is None or not player_id_raw:
             return redirect("draft:simulation_play")
-            
-        player_id = int(player_id_raw)
-        phase = request.session.get("draft_phase")
-        manager = DraftManager(request.session)
-
-        if phase == "1st_round":
-            pending_ids = request.session["pending_teams"]
-            idx = request.session["current_team_index"]
-            current_bids = request.session.get("current_bids", {})
-            current_bids[str(pending_ids[idx])] = player_id
-            request.session["current_bids"] = current_bids
-            request.session["lottery_messages"] = []
-
-            if len(current_bids) == len(pending_ids):
-                return resolve_lottery(request)
-            else:
-                request.session["current_team_index"] = idx + request.session.get("direction", 1)
-        else:
-            draft_picks = request.session["draft_picks"]
-            team_ids = request.session["teams"]
-            idx = request.session["current_team_index"]
-            draft_picks[str(team_ids[idx])].append(player_id)
-            request.session["draft_picks"] = draft_picks
-            
-            next_state = manager.get_next_state(idx, request.session["direction"], request.session["current_round"])
-            if next_state is None:
-                return redirect("draft:simulation_result")
-            request.session.update(next_state)
+
+        try:
+            delta = DraftManager(draft).submit(int(player_id_raw), team_id=_posted_team_id(request))
+        except (DraftError, ValueError):
+            return redirect("draft:simulation_play")
+        if delta["phase"] == "finished":
+            return redirect("draft:simulation_result")
 
     return redirect("draft:simulation_play")
 
 def skip_team(request):
     """指名終了（パス）"""
     if request.method == "POST":
-        if request.session.get("draft_phase") == "1st_round":
+        draft = _current_draft(request)
+        if draft is None:
             return redirect("draft:simulation_play")
-            
-        finished_teams = request.session.get("finished_teams", [])
-        current_team_id = request.session["teams"][request.session["current_team_index"]]
-        if current_team_id not in finished_teams:
-            finished_teams.append(current_team_id)
-            request.session["finished_teams"] = finished_teams
-        
-        manager = DraftManager(request.session)
-        next_state = manager.get_next_state(request.session["current_team_index"], request.session["direction"], request.session["current_round"])
-        
-        if next_state is None:
+
+        try:
+            delta = DraftManager(draft).skip(team_id=_posted_team_id(request))
+        except (DraftError, ValueError):
+            return redirect("draft:simulation_play")
+        if delta["phase"] == "finished":
             return redirect("draft:simulation_result")
-        request.session.update(next_state)
         
     return redirect("draft:simulation_play")
 
+def auto_draft(request):
+    """残りの球団をすべて CPU にして最後まで指名し、結果画面へ"""
+    if request.method == "POST":
+        draft = _current_draft(request)
+        if draft is None:
+            return redirect("draft:simulation_start")
+        if not draft.is_finished:
+            DraftManager(draft).auto_draft()
+        return redirect("draft:simulation_result")
+    return redirect("draft:simulation_play")
+
+def _delta_json(delta):
+    """変化分（選手名・球団名は DraftManager が付けてある）を JSON で返す"""
+    if delta["phase"] == "finished":
+        delta["result_url"] = reverse("draft:simulation_result")
+    return JsonResponse(delta)
+
+@require_POST
+def api_pick(request):
+    """指名（1巡目は入札）して、変化分だけを JSON で返す"""
+    draft = _current_draft(request)
+    if draft is None:
+        return JsonResponse({"error": "ドラフトが開始されていません。"}, status=404)
+    try:
+        delta = DraftManager(draft).submit(int(request.POST.get("player_id", "")), team_id=_posted_team_id(request))
+    except ValueError:
+        return JsonResponse({"error": "player_id・team_id が不正です。"}, status=400)
+    except DraftError as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    return _delta_json(delta)
+
+@require_POST
+def api_skip(request):
+    """指名終了（パス）して、変化分だけを JSON で返す"""
+    draft = _current_draft(request)
+    if draft is None:
+        return JsonResponse({"error": "ドラフトが開始されていません。"}, status=404)
+    try:
+        delta = DraftManager(draft).skip(team_id=_posted_team_id(request))
+    except ValueError:
+        return JsonResponse({"error": "team_id が不正です。"}, status=400)
+    except DraftError as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    return _delta_json(delta)
+
+@require_POST
+def api_lottery_odds(request):
+    """1巡目の入札モデルから、各球団が誰を何回目の入札で獲得するかの確率を JSON で返す
+
+    本文は {"bids": {球団ID: [選手ID, ...] または {選手ID: 重み, ...}}}。
+    """
+    try:
+        bids = json.loads(request.body)["bids"]
+        if not isinstance(bids, dict) or not bids:
+            raise ValueError
+        for model in bids.values():
+            if isinstance(model, dict):
+                if not all(isinstance(w, (int, float)) and w >= 0 for w in model.values()):
+                    raise ValueError
+            elif not isinstance(model, list):
+                raise ValueError
+        odds = lottery_odds(bids)
+    except OddsTooComplex:
+        return JsonResponse({"error": "入札モデルの組み合わせが多すぎて計算できません。"}, status=400)
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "bids の形式が不正です。"}, status=400)
+    return JsonResponse({"odds": odds})
+
+@require_POST
+def api_comments_bulk(request):
+    """スカウトコメントの一括登録（スタッフのみ）
+
+    本文は {"comments": [{"player_id": 1, "text": ..., "rank": "A", "velocity": 4.5, ...}, ...]}
+    （player_id の代わりに name・team でもよい）。不正な行は除外し、番号（0から）とエラーを返す。
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    try:
+        rows = json.loads(request.body)["comments"]
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "comments の形式が不正です。"}, status=400)
+    stats = load_comments(enumerate(rows))
+    return JsonResponse({
+        "created": stats.created,
+        "rejected": stats.rejected,
+        "errors": [{"index": i, "error": message} for i, message in stats.errors],
+    })
+
+def room_start(request):
+    """ドラフトルームを作り、全球団の席（招待リンク）を用意する"""
+    owner = request.user if request.user.is_authenticated else None
+    draft = DraftManager.start(owner=owner, draft_format=_requested_format(request)).draft
+    DraftSeat.objects.bulk_create(DraftSeat(draft=draft, team_id=t_id) for t_id in draft.team_ids)
+    # 作った人だけが招待リンクを見られる
+    request.session["room_hosts"] = request.session.get("room_hosts", []) + [draft.id]
+    return redirect("draft:draft_room", draft_id=draft.id)
+
+def room_join(request, token):
+    """招待リンクから席に着く（セッションに担当球団を記録する）"""
+    seat = get_object_or_404(DraftSeat, token=token)
+    seats = request.session.get("room_seats", {})
+    seats[str(seat.draft_id)] = seat.team_id
+    request.session["room_seats"] = seats
+    return redirect("draft:draft_room", draft_id=seat.draft_id)
+
+def draft_room(request, draft_id):
+    """ドラフトルームの画面（以降の更新は WebSocket で受け取る）"""
+    draft = get_object_or_404(Draft, id=draft_id)
+    team_map = Team.objects.in_bulk(draft.team_ids)
+    picks_by_team = _picks_by_team(draft)
+    teams = [
+        {"id": tid, "name": team_map[tid].name, "first_color": team_map[tid].first_color,
+         "second_color": team_map[tid].second_color, "picks": picks_by_team[tid]}
+        for tid in draft.team_ids
+    ]
+    players = with_adp(Player.objects.exclude(id__in=draft.picks.values("player_id")), draft.draft_format).annotate(
+        avg_rank_num=F('rating__avg_rank'),
+    ).annotate(
+        display_rank=display_rank('avg_rank_num')
+    ).order_by(F('avg_rank_num').desc(nulls_last=True), 'name')
+
+    seat_team_id = request.session.get("room_seats", {}).get(str(draft.id))
+    seats = None
+    if draft.id in request.session.get("room_hosts", []):
+        seats = [
+            {"team": team_map.get(seat.team_id),
+             "url": request.build_absolute_uri(reverse("draft:room_join", args=[seat.token]))}
+            for seat in draft.seats.order_by("-team__order")
+        ]
+
+    return render(request, "draft/room.html", {
+        "draft": draft,
+        "round_label": DraftManager(draft).format.round_label(draft.phase, draft.current_round),
+        "teams": teams,
+        "players": players,
+        "seat_team": team_map.get(seat_team_id),
+        "seats": seats,
+    })
+
+SSE_KEEPALIVE = 15  # 秒。プロキシに切られないよう、何もなければコメント行を送る
+SSE_RETRY_MS = 3000
+
+def _stream_snapshot(draft_id, event_id):
+    """観戦開始時の状態（SSE の1件分）。同じ時点に接続した観戦者どうしで使い回す"""
+    key = f"draft-stream:{draft_id}:{event_id}"
+    body = cache.get(key)
+    if body is None:
+        draft = Draft.objects.filter(id=draft_id).first()
+        if draft is None:
+            return None
+        data = json.dumps(DraftManager(draft).snapshot(), ensure_ascii=False)
+        body = f"id: {event_id}\nevent: snapshot\ndata: {data}\n\n".encode()
+        cache.set(key, body, 60)
+    return body
+
+async def _sse_events(subscription, snapshot):
+    async with subscription:
+        yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+        if snapshot is not None:
+            yield snapshot
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            except SubscriptionClosed:
+                return
+            # SSE への変換はイベントごとに1回だけ（全観戦者で同じバイト列を送る）
+            yield event.sse
+
+async def draft_stream(request, draft_id):
+    """観戦用の読み取り専用ストリーム（Server-Sent Events。ASGI で動かすこと）
+
+    最初に snapshot（現在の状態）を送り、以降は指名・入札・抽選の変化分を流す。
+    再接続時に Last-Event-ID（または ?last_event_id=）を送れば、その後の分から再開する
+    （古すぎて再開できないときは snapshot からやり直す）。
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    subscription = get_broadcaster().subscribe(draft_channel(draft_id), last_event_id)
+    snapshot = None
+    if not subscription.resumed:
+        snapshot = await sync_to_async(_stream_snapshot)(draft_id, subscription.last_event_id)
+        if snapshot is None:
+            subscription.close()
+            raise Http404("ドラフトが見つかりません。")
+    return StreamingHttpResponse(
+        _sse_events(subscription, snapshot),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 def simulation_result(request):
     """結果画面の表示"""
-    draft_picks = request.session.get("draft_picks", {})
+    draft = _current_draft(request)
+    if draft is None:
+        return redirect("draft:simulation_start")
+
+    picks_by_team = _picks_by_team(draft)
     teams = Team.objects.order_by("order")
     result_data = []
     max_picks = 0
     for team_obj in teams:
-        p_ids = draft_picks.get(str(team_obj.id), [])
-        players = [Player.objects.get(id=pid) for pid in p_ids]
+        players = picks_by_team.get(team_obj.id, [])
         result_data.append({"team": team_obj, "players": players})
         max_picks = max(max_picks, len(players))
     
     return render(request, "draft/simulation_result.html", {
         "result_data": result_data,
-        "range_max": range(1, max_picks + 1)
-    })
\ No newline at end of file
+        "range_max": range(1, max_picks + 1),
+        "formats": [(name, f.label) for name, f in FORMATS.items()],
+        "current_format": draft.draft_format,
+    })
+
+
+# --- 書き出し ---
+
+def export_data(request, dataset):
+    """終わったドラフト・選手（集計つき）・コメントを CSV / JSON で書き出す（スタッフのみ）
+
+    ?format=csv|json、?gzip=1 で gzip 圧縮。行を読みながら送るので、件数が多くてもすぐに始まる。
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    fmt = request.GET.get("format", "csv")
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        raise Http404
+    compress = request.GET.get("gzip") in ("1", "true")
+    # ASGI では非同期のイテレータでないと、Django が全体をメモリに読んでから送ってしまう
+    stream = exports.astream_export if isinstance(request, ASGIRequest) else exports.stream_export
+    response = StreamingHttpResponse(
+        stream(dataset, fmt, compress),
+        content_type="application/gzip" if compress else exports.FORMATS[fmt],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{exports.export_filename(dataset, fmt, compress)}"'
+    return response
+
+
+# --- 計測 ---
+
+def metrics(request):
+    """処理時間などの計測値（Prometheus のテキスト形式）。ローカルからだけ読める"""
+    allowed = getattr(settings, "DRAFT_METRICS_ALLOWED_IPS", draft_metrics.DEFAULT_ALLOWED_IPS)
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(draft_metrics.REGISTRY.expose(), content_type=draft_metrics.CONTENT_TYPE)
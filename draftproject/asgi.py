@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "draftproject.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Django の初期化後に読み込む（モデルを使うため）
+from draft.consumers import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """HTTP は Django に、WebSocket（ドラフトルーム）は draft.consumers に振り分ける
+
+    ドラフトルームの配信は既定でプロセス内のブロードキャスタを使うので、
+    ワーカーを複数立てる場合は settings.DRAFT_BROADCASTER を差し替えること。
+    """
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
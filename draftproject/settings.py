@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "draft.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -55,7 +56,7 @@ ROOT_URLCONF = "draftproject.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "draft.metrics.DjangoTemplates",  # 描画時間を /metrics に記録する
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -69,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "draftproject.wsgi.application"
+ASGI_APPLICATION = "draftproject.asgi.application"
 
 
 # Database
@@ -121,3 +123,32 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+
+# 管理画面の選手CSVの取り込み（draft/imports.py）。True ならジョブごとに run_import_jobs を起動する。
+# False にする場合は run_import_jobs --loop を常駐させる
+DRAFT_IMPORT_SPAWN_WORKER = True
+# 処理中のジョブの進捗がこの秒数更新されなければ、ワーカーが止まったものとして取り直す
+DRAFT_IMPORT_STALE_SECONDS = 300
+
+# ドラフトルーム（WebSocket）の配信先。既定はプロセス内だけで配信する
+DRAFT_BROADCASTER = "draft.realtime.InProcessBroadcaster"
+
+# URL 名ごとのクエリ予算（draft/querybudget.py）。計測するときは MIDDLEWARE に
+# "draft.querybudget.QueryBudgetMiddleware" を追加する。超過はログに出る（テストでは失敗になる）
+# 指名・パスは Draft の行ロック（1回）と、ドラフトが終わるリクエストで ADP の集計
+# （draft/adp.py、件数によらず6回まで）が加わる
+DRAFT_QUERY_BUDGETS = {
+    "draft:index": 3,
+    "draft:index_players": 3,
+    "draft:detail": 4,
+    "draft:simulation_start": 8,
+    "draft:simulation_play": 7,
+    "draft:pick_player": 16,
+    "draft:skip_team": 13,
+    "draft:api_pick": 16,
+    "draft:api_skip": 13,
+    "draft:api_lottery_odds": 0,
+    "draft:simulation_result": 6,
+    "draft:room_start": 10,
+    "draft:draft_room": 6,
+}